@@ -0,0 +1,93 @@
+import os
+
+from utils.ffmpeg_utils import FFmpegUtils
+
+# Green is keyed out of the avatar and the mask, like in real brand kits
+KEY_COLOR = '00FF00'
+
+
+def generate_clip(output_file: str, duration: float, size: str = '1280x720', fps: int = 25,
+                  pattern: str = 'testsrc2') -> str:
+    """Generates a source clip with moving test video and a tone"""
+    return _run([
+        'ffmpeg',
+        '-f', 'lavfi', '-i', f'{pattern}=s={size}:d={duration}:r={fps}',
+        '-f', 'lavfi', '-i', f'sine=frequency=330:duration={duration}',
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        '-c:a', 'aac', '-shortest',
+        '-y', output_file
+    ], output_file)
+
+
+def generate_tone(output_file: str, duration: float, frequency: int) -> str:
+    """Generates an MP3 tone, used as narration and background music"""
+    return _run([
+        'ffmpeg',
+        '-f', 'lavfi', '-i', f'sine=frequency={frequency}:duration={duration}',
+        '-c:a', 'libmp3lame', '-b:a', '128k',
+        '-y', output_file
+    ], output_file)
+
+
+def generate_image(output_file: str, size: str, color: str = 'white@0.6') -> str:
+    """Generates a semi-transparent PNG, used as watermark and CTA"""
+    return _run([
+        'ffmpeg',
+        '-f', 'lavfi', '-i', f'color=c={color}:s={size},format=rgba',
+        '-frames:v', '1',
+        '-y', output_file
+    ], output_file)
+
+
+def generate_keyed_clip(output_file: str, duration: float, size: str) -> str:
+    """Generates a clip with a moving box on the key color background, used as avatar and mask"""
+    return _run([
+        'ffmpeg',
+        '-f', 'lavfi', '-i', f'color=c=0x{KEY_COLOR}:s={size}:d={duration}:r=25',
+        '-vf', "drawbox=x='mod(t*80,iw)':y=ih/3:w=iw/4:h=ih/3:color=red:t=fill",
+        '-c:v', 'libx264', '-preset', 'ultrafast', '-pix_fmt', 'yuv420p',
+        '-y', output_file
+    ], output_file)
+
+
+def generate_lut(output_file: str, size: int = 17) -> str:
+    """Writes a warm color grading .cube LUT"""
+    lines = ['TITLE "benchmark"', f'LUT_3D_SIZE {size}']
+    # .cube files are ordered with red changing fastest
+    for b in range(size):
+        for g in range(size):
+            for r in range(size):
+                lines.append(f'{min(1.0, r / (size - 1) * 1.05):.6f} {g / (size - 1):.6f} '
+                             f'{b / (size - 1) * 0.92:.6f}')
+    with open(output_file, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+    return output_file
+
+
+def generate_media_set(folder: str, clip_count: int, clip_duration: float, narration_duration: float,
+                       clip_size: str = '1280x720') -> dict:
+    """
+    Generates every file a fully featured brand kit needs.
+
+    Returns:
+        Dictionary with the paths of the generated files
+    """
+    os.makedirs(folder, exist_ok=True)
+    patterns = ('testsrc2', 'smptebars', 'testsrc', 'rgbtestsrc')
+    return {
+        'clips': [generate_clip(os.path.join(folder, f'clip_{i}.mp4'), clip_duration, clip_size,
+                                pattern=patterns[i % len(patterns)])
+                  for i in range(clip_count)],
+        'narration': generate_tone(os.path.join(folder, 'narration.mp3'), narration_duration, 220),
+        'music': generate_tone(os.path.join(folder, 'music.mp3'), narration_duration / 2, 440),
+        'watermark': generate_image(os.path.join(folder, 'watermark.png'), '400x120'),
+        'cta': generate_image(os.path.join(folder, 'cta.png'), '400x120', 'red@0.8'),
+        'avatar': generate_keyed_clip(os.path.join(folder, 'avatar.mp4'), 2, '320x320'),
+        'mask': generate_keyed_clip(os.path.join(folder, 'mask.mp4'), 2, '640x360'),
+        'lut': generate_lut(os.path.join(folder, 'grade.cube')),
+    }
+
+
+def _run(cmd: list, output_file: str) -> str:
+    FFmpegUtils.run_command(cmd)
+    return output_file
@@ -0,0 +1,290 @@
+"""
+End-to-end render benchmark on synthetic media.
+
+Every source file is generated with FFmpeg lavfi sources and the brand kit lives in an
+in-memory database, so the benchmark needs neither the project database nor real footage.
+
+    python -m benchmarks.render_benchmark run --clips 2 4 --durations 3 6 --output results.json
+    python -m benchmarks.render_benchmark compare baseline.json results.json --threshold 0.15
+"""
+import argparse
+import datetime
+import json
+import logging
+import os
+import platform
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+from contextlib import contextmanager
+
+import peewee as pw
+from tabulate import tabulate
+
+from benchmarks.media import KEY_COLOR, generate_media_set
+from core.config import Config
+from core.workspace import JobWorkspace
+from database.models import (AssemblyAiApiKey, AutoIntroSetting, BrandKit, BrandKitTransition, Caption,
+                             SourceClipAsset, SourceVideos, Transition, Voice, VoiceOverApiKey)
+from database.snapshot import BrandKitSnapshot, load_brand_kit_snapshot
+from processors.audio_processor import AudioProcessor
+from processors.caption_processor import CaptionProcessor
+from processors.intro_processor import IntroProcessor
+from processors.video_processor import VideoProcessor
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.metrics import collect_metrics
+
+logger = logging.getLogger(__name__)
+
+MODELS = [Voice, BrandKit, AutoIntroSetting, Caption, Transition, BrandKitTransition,
+          VoiceOverApiKey, AssemblyAiApiKey, SourceVideos, SourceClipAsset]
+BENCHMARK_TRANSITIONS = ('fade', 'wipeleft', 'slideup')
+TRANSITION_DURATION = 0.5
+NARRATION_WORDS = ('synthetic narration for the render benchmark with several words per caption line '
+                   'so the subtitles look like real ones').split()
+
+
+@contextmanager
+def in_memory_brand_kit(media: dict, aspect_ratio: str):
+    """
+    Creates a brand kit using every feature of the pipeline in an in-memory database
+    and yields its snapshot, the same way VideoEditor loads it.
+    The models are bound to that database only inside the `with` block.
+    """
+    memory_db = pw.SqliteDatabase(':memory:', pragmas={'foreign_keys': 1})
+    with memory_db.bind_ctx(MODELS):
+        memory_db.create_tables(MODELS)
+        brand_kit = BrandKit.create(
+            name='benchmark',
+            watermark_path=media['watermark'],
+            watermark_width_persent=20,
+            avatar_path=media['avatar'],
+            avatar_background_color=KEY_COLOR,
+            avatar_width_persent=20,
+            cta_path=media['cta'],
+            cta_position='bottom_right',
+            cta_width_persent=25,
+            cta_interval=4,
+            cta_duration=2,
+            aspect_ratio=aspect_ratio,
+            music_path=media['music'],
+            lut_path=media['lut'],
+            mask_effect_path=media['mask'],
+            mask_effect_background_color=KEY_COLOR,
+            transition_duration=TRANSITION_DURATION,
+            script_to_voice_over=' '.join(NARRATION_WORDS),
+        )
+        AutoIntroSetting.create(brand_kit=brand_kit, text='Render benchmark', duration=3,
+                                background_type='color', background_value='203040')
+        Caption.create(brand_kit=brand_kit, font_size=48)
+        for name in BENCHMARK_TRANSITIONS:
+            BrandKitTransition.create(brand_kit=brand_kit, transition=Transition.create(name=name))
+        for clip in media['clips']:
+            SourceVideos.create(brand_kit=brand_kit, path=clip)
+        try:
+            yield load_brand_kit_snapshot(brand_kit.name)
+        finally:
+            memory_db.close()
+
+
+def narration_segments(duration: float, segment_duration: float = 1.5) -> list:
+    """Splits the narration into caption segments like a transcription would"""
+    segments = []
+    start = 0.0
+    word_index = 0
+    while start < duration:
+        end = min(duration, start + segment_duration)
+        words = [NARRATION_WORDS[(word_index + i) % len(NARRATION_WORDS)] for i in range(4)]
+        segments.append({'start': start, 'end': end, 'text': ' '.join(words)})
+        word_index += 4
+        start = end
+    return segments
+
+
+def measure(stage: str, func, *args) -> tuple:
+    """
+    Runs one pipeline stage and returns its output with the measurements.
+    The peak RSS is the one of the largest FFmpeg process of the stage and the bytes written
+    are the sizes of the files its FFmpeg processes wrote.
+    """
+    start = time.perf_counter()
+    with collect_metrics(stage) as metrics:
+        output_file = func(*args)
+    wall_time = time.perf_counter() - start
+    peak_rss = [record['peak_rss_bytes'] for record in metrics.ffmpeg_records() if record['peak_rss_bytes']]
+
+    duration = FFmpegUtils.get_video_duration(output_file)
+    # The frames really written, stages keep the frame rate of the 25 fps source clips
+    frames = FFmpegUtils.count_frames(output_file)
+    result = {
+        'stage': stage,
+        'wall_time': round(wall_time, 3),
+        'encode_fps': round(frames / wall_time, 2),
+        'frames': frames,
+        'output_duration': round(duration, 3),
+        'peak_rss_mb': round(max(peak_rss) / (1024 * 1024), 1) if peak_rss else None,
+        'bytes_written': sum(record['output_bytes'] for record in metrics.ffmpeg_records()),
+    }
+    logger.info(f"{stage}: {result['wall_time']}s, {result['encode_fps']} fps")
+    return output_file, result
+
+
+def run_case(brand_kit: BrandKitSnapshot, narration: str, narration_duration: float) -> list:
+    """Renders one video stage by stage, the same way VideoEditor does"""
+    with JobWorkspace('benchmark') as workspace:
+        video_processor = VideoProcessor(brand_kit, workspace)
+        audio_processor = AudioProcessor(brand_kit, workspace)
+        caption_processor = CaptionProcessor(brand_kit, workspace)
+        intro_processor = IntroProcessor(brand_kit, workspace)
+
+        def burn_captions(video_path):
+            # Transcription is a network call, the benchmark starts from ready segments
+            ass_file = caption_processor.create_subtitles_file_from_segments(narration_segments(narration_duration))
+            output_file = workspace.file('captioned.mp4')
+            FFmpegUtils.run_command(caption_processor.build_captions_command(video_path, ass_file, output_file))
+            return output_file
+
+        results = []
+        video, result = measure('video.transitions', video_processor.join_clips_with_transitions)
+        results.append(result)
+        video, result = measure('video.effects', video_processor.apply_effects, video)
+        results.append(result)
+        video, result = measure('video.overlays', video_processor.add_overlays, video)
+        results.append(result)
+        video, result = measure('captions.burn_in', burn_captions, video)
+        results.append(result)
+        video, result = measure('audio.add_audio', audio_processor.add_audio_in_video, video, narration)
+        results.append(result)
+        intro, result = measure('intro.create_intro', intro_processor.create_intro, 'Render benchmark')
+        results.append(result)
+        _, result = measure('video.join_intro', video_processor.join_intro_with_main_parts, intro, video)
+        results.append(result)
+        return results
+
+
+def run_benchmark(clip_counts: list, clip_durations: list, aspect_ratio: str = '16:9',
+                  clip_size: str = '1280x720', repeat: int = 1) -> dict:
+    """
+    Benchmarks every combination of clip count and clip duration.
+    With repeat > 1 the fastest run of every stage is kept.
+    """
+    cases = []
+    media_root = tempfile.mkdtemp(prefix='render_benchmark_')
+    try:
+        for clip_count in clip_counts:
+            for clip_duration in clip_durations:
+                narration_duration = clip_count * clip_duration - TRANSITION_DURATION * (clip_count - 1)
+                media = generate_media_set(os.path.join(media_root, f'{clip_count}x{clip_duration}'),
+                                           clip_count, clip_duration, narration_duration, clip_size)
+                best = {}
+                with in_memory_brand_kit(media, aspect_ratio) as brand_kit:
+                    for _ in range(repeat):
+                        for result in run_case(brand_kit, media['narration'], narration_duration):
+                            if result['stage'] not in best or result['wall_time'] < best[result['stage']]['wall_time']:
+                                best[result['stage']] = result
+                stages = list(best.values())
+                cases.append({
+                    'clip_count': clip_count,
+                    'clip_duration': clip_duration,
+                    'total_wall_time': round(sum(stage['wall_time'] for stage in stages), 3),
+                    'stages': stages,
+                })
+    finally:
+        shutil.rmtree(media_root, ignore_errors=True)
+
+    return {
+        'environment': environment_info(aspect_ratio, clip_size, repeat),
+        'cases': cases,
+    }
+
+
+def environment_info(aspect_ratio: str, clip_size: str, repeat: int) -> dict:
+    version = subprocess.run(['ffmpeg', '-version'], capture_output=True, text=True).stdout.splitlines()
+    return {
+        'created_at': datetime.datetime.now().isoformat(timespec='seconds'),
+        'platform': platform.platform(),
+        'python': platform.python_version(),
+        'ffmpeg': version[0] if version else None,
+        'cpu_count': os.cpu_count(),
+        'video_codec': Config.VIDEO_CODEC,
+        'aspect_ratio': aspect_ratio,
+        'clip_size': clip_size,
+        'repeat': repeat,
+    }
+
+
+def flatten(report: dict) -> dict:
+    """Maps "<clips>x<duration>s/<stage>" to the stage results"""
+    return {f"{case['clip_count']}x{case['clip_duration']}s/{stage['stage']}": stage
+            for case in report['cases'] for stage in case['stages']}
+
+
+def compare(baseline: dict, current: dict, threshold: float = 0.1) -> list:
+    """
+    Compares two benchmark reports.
+
+    Returns:
+        Rows of (key, baseline time, current time, change, regressed) for stages present in both
+    """
+    baseline_stages = flatten(baseline)
+    current_stages = flatten(current)
+    rows = []
+    for key, current_result in current_stages.items():
+        baseline_result = baseline_stages.get(key)
+        if not baseline_result:
+            continue
+        change = current_result['wall_time'] / baseline_result['wall_time'] - 1
+        rows.append((key, baseline_result['wall_time'], current_result['wall_time'], change, change > threshold))
+    return rows
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='End-to-end render benchmark on synthetic media')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    run_parser = subparsers.add_parser('run', help='Run the benchmark')
+    run_parser.add_argument('--clips', type=int, nargs='+', default=[2, 4], help='Clip counts')
+    run_parser.add_argument('--durations', type=float, nargs='+', default=[3.0], help='Clip durations in seconds')
+    run_parser.add_argument('--aspect-ratio', default='16:9', choices=['16:9', '9:16'])
+    run_parser.add_argument('--clip-size', default='1280x720', help='Resolution of the generated source clips')
+    run_parser.add_argument('--repeat', type=int, default=1, help='Runs per case, the fastest one is kept')
+    run_parser.add_argument('--output', default='benchmark_results.json')
+
+    compare_parser = subparsers.add_parser('compare', help='Compare two benchmark results')
+    compare_parser.add_argument('baseline')
+    compare_parser.add_argument('current')
+    compare_parser.add_argument('--threshold', type=float, default=0.1,
+                                help='Relative slowdown reported as a regression')
+
+    args = parser.parse_args(argv)
+    logging.basicConfig(level=logging.INFO, format='%(message)s')
+
+    if args.command == 'run':
+        report = run_benchmark(args.clips, args.durations, args.aspect_ratio, args.clip_size, args.repeat)
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(tabulate([(key, result['wall_time'], result['encode_fps'], result['peak_rss_mb'], result['bytes_written'])
+                        for key, result in flatten(report).items()],
+                       headers=['stage', 'wall time, s', 'fps', 'peak RSS, MB', 'bytes']))
+        print(f'Results saved to {args.output}')
+        return 0
+
+    with open(args.baseline) as f:
+        baseline = json.load(f)
+    with open(args.current) as f:
+        current = json.load(f)
+    rows = compare(baseline, current, args.threshold)
+    print(tabulate([(key, old, new, f'{change:+.1%}', 'REGRESSION' if regressed else '')
+                    for key, old, new, change, regressed in rows],
+                   headers=['stage', 'baseline, s', 'current, s', 'change', '']))
+    regressions = [row for row in rows if row[4]]
+    if regressions:
+        print(f'{len(regressions)} stage(s) slower than the baseline by more than {args.threshold:.0%}')
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
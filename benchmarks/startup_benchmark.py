@@ -0,0 +1,81 @@
+"""
+Startup benchmark based on `python -X importtime`.
+
+Every entry point is imported in a fresh interpreter, the cumulative import time of the
+module and the heavy third-party modules it loaded are reported.
+
+    python -m benchmarks.startup_benchmark
+    python -m benchmarks.startup_benchmark --repeat 5 --output startup.json
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Entry point -> import time budget in milliseconds
+STARTUP_BUDGETS_MS = {
+    'videomaker.cli': 80,
+    'core.editor': 250,
+    'ui.brand_kit_manager': 80,
+}
+
+# Modules that must be imported on first use only
+HEAVY_MODULES = ('assemblyai', 'aiohttp', 'requests', 'httpx', 'tkmacosx')
+
+
+def measure_import(module: str) -> dict:
+    """Imports the module in a fresh interpreter with -X importtime"""
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        cwd=PROJECT_ROOT, capture_output=True, text=True, check=True
+    )
+    cumulative_us = {}
+    for line in result.stderr.splitlines():
+        # import time: self [us] | cumulative | imported package
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        cumulative_us[name.strip()] = int(cumulative)
+
+    return {
+        'module': module,
+        'import_ms': round(cumulative_us[module] / 1000, 1),
+        'heavy_modules': sorted(name for name in cumulative_us if name in HEAVY_MODULES),
+    }
+
+
+def run_benchmark(modules=None, repeat: int = 3) -> list:
+    """Measures every entry point `repeat` times and keeps the fastest run"""
+    results = []
+    for module in modules or STARTUP_BUDGETS_MS:
+        runs = [measure_import(module) for _ in range(repeat)]
+        best = min(runs, key=lambda run: run['import_ms'])
+        best['budget_ms'] = STARTUP_BUDGETS_MS.get(module)
+        best['within_budget'] = best['budget_ms'] is None or best['import_ms'] <= best['budget_ms']
+        results.append(best)
+    return results
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(description='Import time of the app entry points')
+    parser.add_argument('modules', nargs='*', help='Modules to measure, all entry points by default')
+    parser.add_argument('--repeat', type=int, default=3, help='Runs per module, the fastest one is kept')
+    parser.add_argument('--output', help='Save the results to a JSON file')
+    args = parser.parse_args(argv)
+
+    results = run_benchmark(args.modules, args.repeat)
+    for result in results:
+        budget = f"/ {result['budget_ms']} ms" if result['budget_ms'] else ''
+        heavy = f"  heavy: {', '.join(result['heavy_modules'])}" if result['heavy_modules'] else ''
+        print(f"{result['module']:<25} {result['import_ms']:>8} ms {budget}{heavy}")
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(results, f, indent=2)
+    return 0 if all(result['within_budget'] for result in results) else 1
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,60 @@
+import re
+import shutil
+import subprocess
+
+import pytest
+
+from core.config import Config
+from database.models import BrandKit, Caption, Voice
+from database.snapshot import BrandKitSnapshot, CaptionSnapshot, VoiceSnapshot
+from processors.caption_processor import CaptionProcessor
+from processors.tts_processor import TTSProcessor
+from utils.ffmpeg_utils import FFmpegUtils
+
+requires_ffmpeg = pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='FFmpeg is not installed')
+
+NARRATION_SECONDS = 3
+
+
+def video_size_and_duration(path: str) -> tuple:
+    # Read with ffmpeg itself, the decoded frames are what the viewer gets
+    stderr = subprocess.run(['ffmpeg', '-i', path, '-map', '0:v', '-vf', 'showinfo', '-f', 'null', '-'],
+                            capture_output=True, text=True).stderr
+    width, height = stderr.split(' s:')[1].split()[0].split('x')
+    return (int(width), int(height)), FFmpegUtils.get_video_duration(path)
+
+
+def count_frames(path: str) -> int:
+    stderr = subprocess.run(['ffmpeg', '-i', path, '-map', '0:v', '-f', 'null', '-'],
+                            capture_output=True, text=True).stderr
+    return int(re.findall(r'frame=\s*(\d+)', stderr)[-1])
+
+
+def make_clip(path: str, seconds: float, size: str = '320x180') -> str:
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f'testsrc=size={size}:rate=30',
+                    '-f', 'lavfi', '-i', 'sine', '-t', str(seconds), '-pix_fmt', 'yuv420p', '-c:a', 'aac',
+                    '-y', path], check=True)
+    return path
+
+
+@pytest.fixture
+def brand_kit(tmp_path, monkeypatch):
+    """Brand kit with two source clips, crossfades and captions. TTS and transcription are stubbed"""
+    narration = str(tmp_path / 'narration.wav')
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f'sine=d={NARRATION_SECONDS}', '-y', narration],
+                   check=True)
+    monkeypatch.setattr(TTSProcessor, 'generate_audio', lambda self, script=None: narration)
+    monkeypatch.setattr(CaptionProcessor, 'transcribe',
+                        lambda self, audio_path: [{'start': 0.0, 'end': NARRATION_SECONDS, 'text': 'narration'}])
+    monkeypatch.setattr(Config, 'METRICS_FOLDER', '')
+    monkeypatch.setattr(Config, 'TEMP_FOLDER', str(tmp_path))
+    monkeypatch.setattr(Config, 'SCRATCH_FOLDER', '')
+
+    clips = tuple(make_clip(str(tmp_path / f'clip_{i}.mp4'), 2) for i in range(2))
+    defaults = {field.name: field.default for field in BrandKit._meta.sorted_fields if not callable(field.default)}
+    voice = VoiceSnapshot(**dict({field.name: field.default for field in Voice._meta.sorted_fields},
+                                 provider='minimax'))
+    return BrandKitSnapshot(**dict(defaults, name='aspects', voice=voice), transition_names=('fade',),
+                            source_videos_paths=clips,
+                            caption_config=CaptionSnapshot(**{field.name: field.default
+                                                              for field in Caption._meta.sorted_fields}))
@@ -1,4 +1,6 @@
+import os
 import sys
+import tempfile
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -8,8 +10,82 @@ class Config:
     RESULT_FOLDER = 'result'
     TEMP_FOLDER = 'temp'
 
+    # Per-job workspaces are created on a fast scratch volume when one is configured
+    # (or on tmpfs when USE_RAM_DISK=1) and fall back to TEMP_FOLDER if it lacks free space
+    SCRATCH_FOLDER = os.getenv('SCRATCH_FOLDER') or ('/dev/shm' if os.getenv('USE_RAM_DISK') == '1' else None)
+    SCRATCH_MIN_FREE_MB = int(os.getenv('SCRATCH_MIN_FREE_MB', 4096))
+
+    # Runs transitions -> effects -> overlays -> captions concurrently, connected with named pipes
+    STREAMING_PIPELINE = os.getenv('STREAMING_PIPELINE') == '1'
+
+    # SEGMENTED_ENCODE=1 burns the captions of long videos in time segments encoded at the same time,
+    # by SEGMENT_WORKERS local processes (all cores by default) and, with SEGMENT_SHARED_FOLDER,
+    # by `videomaker segment-worker` processes on other nodes
+    SEGMENTED_ENCODE = os.getenv('SEGMENTED_ENCODE') == '1'
+    SEGMENT_SECONDS = float(os.getenv('SEGMENT_SECONDS', 60))
+    SEGMENT_GOP_SECONDS = float(os.getenv('SEGMENT_GOP_SECONDS', 2))
+    SEGMENT_WORKERS = int(os.getenv('SEGMENT_WORKERS', 0))
+    SEGMENT_SHARED_FOLDER = os.getenv('SEGMENT_SHARED_FOLDER')
+    # Seconds after which a segment claimed by another node is encoded by the job itself
+    SEGMENT_TIMEOUT = float(os.getenv('SEGMENT_TIMEOUT', 1800))
+
+    # Number of cores shared between concurrently running FFmpeg processes, all available cores by default
+    FFMPEG_CORES = int(os.getenv('FFMPEG_CORES', 0))
+    # Processes of the app on this machine (render workers, CLI runs, the UI) publish the weight of their
+    # running FFmpeg processes here and share the cores between them. THREAD_BUDGET_FOLDER= (empty) disables it
+    THREAD_BUDGET_FOLDER = os.getenv('THREAD_BUDGET_FOLDER',
+                                     os.path.join(tempfile.gettempdir(), 'videomaker_thread_budget'))
+
+    # METRICS_FOLDER=metrics saves the metrics of every job (stages and FFmpeg runs) there
+    # as JSON lines or Prometheus text, nothing is saved by default
+    METRICS_FOLDER = os.getenv('METRICS_FOLDER', '')
+    METRICS_FORMAT = os.getenv('METRICS_FORMAT', 'jsonl')
+
+    # TRACE_RENDERS=1 writes a Chrome trace-event timeline of every job to TRACE_FOLDER/<job id>/trace.json
+    TRACE_RENDERS = os.getenv('TRACE_RENDERS') == '1'
+    TRACE_FOLDER = os.getenv('TRACE_FOLDER', 'traces')
+
+    # PROFILE_RENDERS=cprofile|sampling|all profiles the Python side of every job into PROFILE_FOLDER/<job id>
+    # and adds -benchmark to every FFmpeg run
+    PROFILE_RENDERS = os.getenv('PROFILE_RENDERS')
+    PROFILE_FOLDER = os.getenv('PROFILE_FOLDER', 'profiles')
+    PROFILE_SAMPLING_INTERVAL_MS = float(os.getenv('PROFILE_SAMPLING_INTERVAL_MS', 5))
+
+    # Number of brand kits and lists of voices and transitions kept in the BrandKitService cache
+    BRAND_KIT_CACHE_SIZE = int(os.getenv('BRAND_KIT_CACHE_SIZE', 64))
+
+    # How long a database write waits for another writer before failing with "database is locked"
+    DATABASE_BUSY_TIMEOUT_MS = int(os.getenv('DATABASE_BUSY_TIMEOUT_MS', 10000))
+    # Progress of render jobs is written in one transaction at most every PROGRESS_FLUSH_INTERVAL seconds
+    PROGRESS_FLUSH_INTERVAL = float(os.getenv('PROGRESS_FLUSH_INTERVAL', 1.0))
+    # Render workers lease queued jobs for JOB_LEASE_SECONDS and renew the lease while rendering,
+    # a job whose worker stopped renewing it is queued again, up to JOB_MAX_ATTEMPTS times
+    JOB_LEASE_SECONDS = float(os.getenv('JOB_LEASE_SECONDS', 60))
+    JOB_MAX_ATTEMPTS = int(os.getenv('JOB_MAX_ATTEMPTS', 3))
+    # Seconds an idle worker waits before looking for queued jobs again
+    WORKER_POLL_INTERVAL = float(os.getenv('WORKER_POLL_INTERVAL', 2.0))
+    # Workers on other machines lease jobs from `videomaker coordinator` running on the machine holding
+    # the database at JOB_COORDINATOR_URL, e.g. http://db-host:8765. Requests carry JOB_COORDINATOR_TOKEN
+    JOB_COORDINATOR_URL = os.getenv('JOB_COORDINATOR_URL')
+    JOB_COORDINATOR_TOKEN = os.getenv('JOB_COORDINATOR_TOKEN')
+
+    # Seconds between two scans of the source clips by the background asset scanner
+    ASSET_SCAN_INTERVAL = float(os.getenv('ASSET_SCAN_INTERVAL', 300))
+
+    # Longest part of one source clip used in a video, 0 uses as much of every clip as the narration needs
+    TIMELINE_MAX_CLIP_SECONDS = float(os.getenv('TIMELINE_MAX_CLIP_SECONDS', 0))
+
     OUTPUT_PTS = 30
 
+    # Preview renders run the same stages at a proxy resolution (short side in pixels), frame rate and x264 preset
+    PREVIEW_HEIGHT = int(os.getenv('PREVIEW_HEIGHT', 480))
+    PREVIEW_FPS = int(os.getenv('PREVIEW_FPS', 15))
+    PREVIEW_PRESET = os.getenv('PREVIEW_PRESET', 'ultrafast')
+    PREVIEW_CRF = int(os.getenv('PREVIEW_CRF', 30))
+    # Proxies of normalized source clips are kept between previews, the least recently used are removed
+    PROXY_CACHE_FOLDER = os.getenv('PROXY_CACHE_FOLDER', 'proxy_cache')
+    PROXY_CACHE_MAX_MB = int(os.getenv('PROXY_CACHE_MAX_MB', 2048))
+
     # Improves rendering
     if sys.platform == 'darwin':
         VIDEO_CODEC = 'h264_videotoolbox'
@@ -18,6 +94,14 @@ class Config:
         VIDEO_CODEC = 'h264_amf'
     else:
         VIDEO_CODEC = 'libx264'
+    # Codec and pixel format written by every VIDEO_CODEC encoder
+    OUTPUT_CODEC_NAME = 'h264'
+    OUTPUT_PIX_FMT = 'yuv420p'
+    # MP4 time scale of every normalized or cut clip. The concat demuxer joins cuts without re-encoding
+    # only when all clips share it, 90 kHz is exact for 24, 25, 30, 50, 60 and 29.97 fps
+    VIDEO_TIMESCALE = int(os.getenv('VIDEO_TIMESCALE', 90000))
+    # Source clips already in the output resolution, frame rate, codec and pixel format are not re-encoded
+    SKIP_CONFORMING_CLIPS = os.getenv('SKIP_CONFORMING_CLIPS', '1') == '1'
 
     SUPPORTED_TRANSITIONS = (
             'fade', 'dissolve', 'pixelize', 'radial', 'hblur', 'distance',
@@ -29,4 +113,7 @@ class Config:
             'fadeblack', 'fadewhite', 'fadegrays'
         )
 
+    # Plain cuts between clips: a brand kit with only these (or no transitions) joins clips without re-encoding
+    CUT_TRANSITIONS = ('cut', 'none')
+
     MINIMAX_MODEL = 'speech-02-turbo'
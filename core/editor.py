@@ -1,88 +1,334 @@
-from services.brand_kit_service import BrandKitService
-from processors.video_processor import VideoProcessor
+import logging
+import os
+import time
+from contextlib import ExitStack, contextmanager
+
+from core.config import Config
+from core.segmented_encode import SegmentedEncoder
+from core.timeline import RenderPlan
+from core.workspace import JobWorkspace
+from processors.video_processor import VideoProcessor, transition_overlap, uses_cuts
 from processors.audio_processor import AudioProcessor
 from processors.caption_processor import CaptionProcessor
-from database.models import BrandKit
+from processors.intro_processor import IntroProcessor
+from processors.tts_processor import TTSProcessor
+from utils.artifacts import promote_artifact
+from utils.audio_utils import get_audio_duration
+from utils.cache import pin_cached_files
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.metrics import collect_metrics, measure_stage
+from utils.profiling import profile_job
+from utils.render_profile import PREVIEW_PROFILE, use_render_profile
+from utils.tracing import start_tracing
+from database.snapshot import BrandKitSnapshot, load_brand_kit_snapshot
+
+logger = logging.getLogger(__name__)
+
+ASPECT_RATIOS = ('16:9', '9:16')
+
+
+@contextmanager
+def render_job(title):
+    """
+    Job workspace with metrics, and the trace and profile when they are enabled.
+    They are saved when the job finishes, also when it fails.
+    Cached proxies looked up by the job are pinned until it finishes.
+    """
+    with ExitStack() as stack:
+        workspace = stack.enter_context(JobWorkspace(title))
+        stack.enter_context(pin_cached_files())
+        metrics = stack.enter_context(collect_metrics(workspace.job_id))
+        tracer = stack.enter_context(start_tracing(workspace.job_id)) if Config.TRACE_RENDERS else None
+        if Config.PROFILE_RENDERS:
+            stack.enter_context(profile_job(Config.PROFILE_RENDERS,
+                                            os.path.join(Config.PROFILE_FOLDER, workspace.job_id),
+                                            Config.PROFILE_SAMPLING_INTERVAL_MS / 1000))
+        try:
+            yield workspace
+        finally:
+            bytes_saved = sum(record['bytes_saved'] for record in metrics.promotion_records())
+            if bytes_saved:
+                logger.info(f"Promoted files by rename or link instead of copying {bytes_saved // (1024 * 1024)} MB")
+            if Config.METRICS_FOLDER:
+                metrics.save(Config.METRICS_FOLDER, Config.METRICS_FORMAT)
+            if tracer:
+                tracer.save(os.path.join(Config.TRACE_FOLDER, workspace.job_id, 'trace.json'))
+
+
+def has_intro(brand_kit) -> bool:
+    return bool(brand_kit.intro_clip_path or brand_kit.auto_intro_settings)
+
+
+def content_duration(brand_kit, voice_path: str) -> float:
+    """
+    Length of footage the content needs: the narration, plus the part hidden
+    under the crossfade from the intro
+    """
+    duration = get_audio_duration(voice_path)
+    if has_intro(brand_kit):
+        duration += transition_overlap(brand_kit)
+    return duration
+
+
+def compose_video(brand_kit, workspace: JobWorkspace, normalized_clips: list, ass_file: str, voice_path: str,
+                  audio_path: str, title: str, callback=None) -> str:
+    """
+    Runs the stages that depend on the brand look and the resolution on already prepared
+    clips, captions and soundtrack: transitions, effects, overlays, caption burn-in, audio and intro.
+
+    Returns:
+        Path to the final video inside the workspace
+    """
+    report = callback or (lambda stage, progress: None)
+    video_processor = VideoProcessor(brand_kit, workspace)
+    report('transitions', 20)
+    content_video = video_processor.join_clips_with_transitions(normalized_clips=normalized_clips)
+    report('effects', 35)
+    content_video = video_processor.apply_effects(content_video)
+    report('overlays', 50)
+    content_video = video_processor.add_overlays(content_video)
+
+    report('captions', 65)
+    captioned_video = workspace.file('content_captioned.mp4')
+    with measure_stage('captions.add_captions'):
+        # Long videos only matter with segmented encoding, the duration is not probed without it
+        if Config.SEGMENTED_ENCODE and SegmentedEncoder.enabled(FFmpegUtils.get_video_duration(content_video)):
+            # The last full encode of a long video, split across cores and nodes
+            SegmentedEncoder(workspace).encode(content_video, captioned_video, ass_file)
+        else:
+            FFmpegUtils.run_command(CaptionProcessor.build_captions_command(content_video, ass_file, captioned_video))
+
+    report('audio', 80)
+    final_video = AudioProcessor(brand_kit, workspace).add_audio_in_video(captioned_video, voice_path, audio_path)
+    if has_intro(brand_kit):
+        report('intro', 85)
+        intro_path = IntroProcessor(brand_kit, workspace).create_intro(title)
+        final_video = video_processor.join_intro_with_main_parts(intro_path, final_video)
+    return final_video
+
+
+def deliver_video(final_video: str, output_file: str, workspace: JobWorkspace, suffix: str = '') -> str:
+    """Moves the final video out of the workspace before it is removed, copied only to another filesystem"""
+    os.makedirs(Config.RESULT_FOLDER, exist_ok=True)
+    output_file = output_file or os.path.join(Config.RESULT_FOLDER,
+                                              f'{int(time.time())}_{workspace.job_name}{suffix}.mp4')
+    promote_artifact(final_video, output_file, move=True)
+    return output_file
+
+
+def plan_path(video_path: str) -> str:
+    """The plan of a preview is saved next to it"""
+    return f'{os.path.splitext(video_path)[0]}.plan.json'
+
 
 class VideoEditor:
     def __init__(self, brandkit_name):
-        self.brandkit = BrandKit.get(BrandKit.name == brandkit_name)
-        self.video_processor = VideoProcessor(self.brandkit)
-        self.audio_processor = AudioProcessor(self.brandkit)
-        self.caption_processor = CaptionProcessor(self.brandkit)
-
-    def create_video(self, title, script, callback=None):
-        intro_clip = self.brandkit.intro_clip_path
-        watermark = self.brandkit.watermark_path
-        watermark_pos = self.brandkit.watermark_position
-        avatar = self.brandkit.avatar_clip_path
-        avatar_pos = self.brandkit.avatar_position
-        avatar_bg = self.brandkit.avatar_background_color
-        cta = self.brandkit.cta_path
-        cta_pos = self.brandkit.cta_position
-        cta_interval = self.brandkit.cta_interval
-        music = self.brandkit.music_path
-        music_vol = self.brandkit.music_volume
-        lut = self.brandkit.lut_path
-        mask = self.brandkit.mask_effect_path
-        aspect = self.brandkit.aspect_ratio
-        transition_duration = self.brandkit.transition_duration
-        randomize = self.brandkit.randomize_clips
-
-        auto_intro = self.brandkit.auto_intro_settings
-        caption = self.brandkit.caption_config
-        voice = self.brandkit.voice
-        transitions = [bt.transition for bt in self.brandkit.brandkittransition_set]
-
-        tts_audio = self.audio_processor.generate_tts(script, voice)
-        tts_audio_duration = self.audio_processor.get_audio_length(tts_audio)
-
-        if intro_clip:
-            intro_path = intro_clip
-        elif auto_intro and auto_intro.enabled:
-            intro_path = self.video_processor.create_intro(title, auto_intro)
+        # Processors read the brand kit many times per render, the snapshot answers without queries.
+        # A snapshot is used as it is, e.g. one sent by the job coordinator to a worker on another machine
+        self.brandkit = brandkit_name if isinstance(brandkit_name, BrandKitSnapshot) \
+            else load_brand_kit_snapshot(brandkit_name)
+
+    def create_video(self, title, script=None, output_file=None, callback=None, plan: RenderPlan = None) -> str:
+        """
+        Renders the full video for a title and script.
+        All intermediates are kept in an isolated job workspace which is removed afterwards,
+        so several jobs can run at the same time.
+
+        Args:
+            title: Title used in the auto intro
+            script: Script to voice over, defaults to the brand kit script
+            output_file: Path of the final video, defaults to a file in the result folder
+            callback: Optional callable(stage, progress) for progress reporting
+            plan: Plan of a preview, the video is rendered from its narration, captions and clips
+
+        Returns:
+            Path to the final video
+        """
+        if plan and plan.brand_kit != self.brandkit.name:
+            raise ValueError(f"The plan was made for the brand kit: {plan.brand_kit}, not {self.brandkit.name}")
+
+        with render_job(title) as workspace:
+            plan = plan or self._plan(title, script, callback, workspace)
+            output_file = self._render(title, plan, output_file, callback, workspace)
+
+        self._report(callback, 'done', 100)
+        logger.info(f"Video '{title}' rendered: {output_file}")
+        return output_file
+
+    def create_preview(self, title, script=None, output_file=None, callback=None) -> tuple:
+        """
+        Renders a quick low resolution preview to check pacing, overlays and captions.
+        The stages are the same as in create_video, but with PREVIEW_PROFILE: proxy resolution,
+        low frame rate, fast encoder preset, and normalized clips cached between previews.
+
+        The plan is saved next to the preview with the narration, pass it to create_video
+        to render the final video of exactly what was previewed.
+
+        Returns:
+            Path to the preview and its plan
+        """
+        with use_render_profile(PREVIEW_PROFILE), render_job(title) as workspace:
+            plan = self._plan(title, script, callback, workspace)
+            output_file = self._render(title, plan, output_file, callback, workspace, suffix='_preview')
+
+            # The narration is kept with the plan, the workspace is removed
+            voice_path = f'{os.path.splitext(output_file)[0]}.voice{os.path.splitext(plan.voice_path)[1]}'
+            promote_artifact(plan.voice_path, voice_path)
+            plan = plan._replace(voice_path=voice_path)
+            plan.save(plan_path(output_file))
+
+        self._report(callback, 'done', 100)
+        logger.info(f"Preview of '{title}' rendered: {output_file}")
+        return output_file, plan
+
+    def create_videos(self, title, aspect_ratios, script=None, output_files=None, callback=None) -> dict:
+        """
+        Renders the video in several aspect ratios at once, e.g. landscape and portrait.
+        Narration, captions and the music mix are made once, every source clip window is decoded once
+        and split into one scaled branch per aspect ratio. Transitions, effects, overlays, caption
+        burn-in and the intro depend on the frame size and are still encoded per aspect ratio.
+
+        Args:
+            title: Title used in the auto intro
+            aspect_ratios: Aspect ratios to render, e.g. ['16:9', '9:16']
+            script: Script to voice over, defaults to the brand kit script
+            output_files: Optional {aspect ratio: path} of the final videos
+            callback: Optional callable(stage, progress) for progress reporting
+
+        Returns:
+            Paths to the final videos per aspect ratio
+        """
+        aspect_ratios = list(dict.fromkeys(aspect_ratios))
+        unsupported = [aspect_ratio for aspect_ratio in aspect_ratios if aspect_ratio not in ASPECT_RATIOS]
+        if not aspect_ratios or unsupported:
+            raise ValueError(f"Unsupported aspect ratios: {unsupported}. Available: {', '.join(ASPECT_RATIOS)}")
+
+        with render_job(title) as workspace:
+            output_files = self._render_aspects(title, script, aspect_ratios, output_files or {}, callback,
+                                                workspace)
+
+        self._report(callback, 'done', 100)
+        logger.info(f"Video '{title}' rendered: {', '.join(output_files.values())}")
+        return output_files
+
+    def _plan(self, title, script, callback, workspace: JobWorkspace) -> RenderPlan:
+        """Generates the narration, transcribes it and picks the clip windows covering it"""
+        self._report(callback, 'tts', 0)
+        voice_path = TTSProcessor(self.brandkit, workspace).generate_audio(script)
+
+        self._report(callback, 'transcribe', 5)
+        segments = CaptionProcessor(self.brandkit, workspace).transcribe(voice_path)
+        windows = VideoProcessor(self.brandkit, workspace).plan_source_clips(
+            content_duration(self.brandkit, voice_path))
+        return RenderPlan(self.brandkit.name, title, voice_path, segments, windows)
+
+    def _render(self, title, plan: RenderPlan, output_file, callback, workspace: JobWorkspace,
+                suffix: str = '') -> str:
+        """Runs every stage of the render of a plan inside the job workspace"""
+        video_processor = VideoProcessor(self.brandkit, workspace)
+        audio_processor = AudioProcessor(self.brandkit, workspace)
+        caption_processor = CaptionProcessor(self.brandkit, workspace)
+
+        ass_file = caption_processor.create_subtitles_file_from_segments(plan.segments)
+        self._report(callback, 'normalize', 10)
+        normalized_clips = video_processor.normalize_clip_windows(plan.windows)
+
+        if Config.STREAMING_PIPELINE and FFmpegUtils.streaming_supported():
+            self._report(callback, 'content', 20)
+            content_video = self._render_content_streaming(video_processor, caption_processor, ass_file,
+                                                           normalized_clips, workspace)
+
+            self._report(callback, 'audio', 80)
+            final_video = audio_processor.add_audio_in_video(content_video, plan.voice_path)
+
+            if has_intro(self.brandkit):
+                self._report(callback, 'intro', 85)
+                intro_path = IntroProcessor(self.brandkit, workspace).create_intro(title)
+                final_video = video_processor.join_intro_with_main_parts(intro_path, final_video)
         else:
-            intro_path = None
-
-        content_clips = self._get_content_clips(randomize)
-        transition_types = [t.name for t in transitions]
-        content_video = self.video_processor.prepare_content_clips(content_clips, transition_types, transition_duration, duration=tts_audio_duration)
-
-        # Apply LUT and mask only to content video (not intro)
-        processed_content = content_video
-        if lut:
-            processed_content = self.video_processor.apply_lut(processed_content, lut)
-        if mask:
-            processed_content = self.video_processor.apply_mask(processed_content, mask)
-
-        # Concatenate intro and processed content
-        if intro_path:
-            full_video = self.video_processor.concat_videos([intro_path, processed_content])
+            audio_path = audio_processor.prepare_audio(plan.voice_path)
+            final_video = compose_video(self.brandkit, workspace, normalized_clips, ass_file, plan.voice_path,
+                                        audio_path, title, callback)
+
+        return deliver_video(final_video, output_file, workspace, suffix)
+
+    def _render_aspects(self, title, script, aspect_ratios, output_files, callback, workspace: JobWorkspace) -> dict:
+        """Runs the shared stages once and the resolution dependent ones per aspect ratio"""
+        video_processor = VideoProcessor(self.brandkit, workspace)
+        audio_processor = AudioProcessor(self.brandkit, workspace)
+        caption_processor = CaptionProcessor(self.brandkit, workspace)
+        tts_processor = TTSProcessor(self.brandkit, workspace)
+
+        self._report(callback, 'tts', 0)
+        voice_path = tts_processor.generate_audio(script)
+        target_duration = content_duration(self.brandkit, voice_path)
+
+        self._report(callback, 'captions', 5)
+        ass_file = caption_processor.create_subtitles_file(voice_path)
+        audio_path = audio_processor.prepare_audio(voice_path)
+
+        self._report(callback, 'normalize', 10)
+        normalized_clips = video_processor.normalize_source_clips_for_aspects(aspect_ratios, target_duration)
+
+        results = {}
+        for i, aspect_ratio in enumerate(aspect_ratios):
+            self._report(callback, f'render {aspect_ratio}', 20 + 75 * i // len(aspect_ratios))
+
+            # Processors read the aspect ratio from the brand kit, every aspect ratio
+            # gets its own copy of it and its own folder for intermediate files
+            suffix = aspect_ratio.replace(':', 'x')
+            with JobWorkspace(suffix, base_folder=workspace.path) as aspect_workspace:
+                final_video = compose_video(self.brandkit.replace(aspect_ratio=aspect_ratio), aspect_workspace,
+                                            normalized_clips[aspect_ratio], ass_file, voice_path, audio_path, title)
+                results[aspect_ratio] = deliver_video(final_video, output_files.get(aspect_ratio), workspace,
+                                                      suffix=f'_{suffix}')
+        return results
+
+    @staticmethod
+    def _render_content_streaming(video_processor: VideoProcessor, caption_processor: CaptionProcessor,
+                                  ass_file: str, normalized_clips: list, workspace: JobWorkspace) -> str:
+        """
+        Runs transitions -> effects -> overlays -> captions as concurrent FFmpeg processes.
+        Stages pass raw video in NUT through named pipes, only the captioned content is written to disk.
+        Everything that needs the network or probing has to be done before, the clips are already normalized.
+        """
+        ffmpeg = video_processor.ffmpeg
+        stream_args = FFmpegUtils.stream_output_args()
+        video_size = video_processor._get_resolution_from_aspect_ratio()
+
+        commands = []
+        if len(normalized_clips) > 1 and uses_cuts(video_processor.brand_kit):
+            # Cuts are joined at disk speed before the pipeline starts
+            current_video = video_processor.join_clips_with_cuts(normalized_clips, workspace.file('content_cuts.mp4'))
+            duration = ffmpeg.get_video_duration(current_video)
+        elif len(normalized_clips) > 1:
+            current_video = ffmpeg.create_fifo(workspace.file('transitions.nut'))
+            transition_commands, _, duration = video_processor.build_transition_commands(
+                normalized_clips, current_video, stream_args, streaming=True)
+            commands.extend(transition_commands)
         else:
-            full_video = processed_content
-
-        captioned_video = self.caption_processor.add_captions(full_video, tts_audio)
-        audio_video = self.audio_processor.mix_audio_with_music(tts_audio, music, music_vol)
-        final_audio_video = self.audio_processor.replace_audio_in_video(captioned_video, audio_video)
-        finalized_video = self.video_processor.finalize_video(final_audio_video, aspect)
-
-        overlays = {
-            'avatar': avatar,
-            'avatar_position': avatar_pos,
-            'avatar_bg_color': avatar_bg,
-            'watermark': watermark,
-            'watermark_position': watermark_pos,
-            'cta': cta,
-            'cta_position': cta_pos,
-            'cta_interval': cta_interval,
-        }
-        final_video = self.video_processor.add_overlays(finalized_video, overlays)
-        return final_video
-
-    def _get_content_clips(self, randomize):
-        # Example: get all content clips from BrandKit, optionally shuffle
-        clips = [clip.file_path for clip in self.brandkit.content_clips]
-        if randomize:
-            import random
-            random.shuffle(clips)
-        return clips
+            current_video = normalized_clips[0]
+            duration = ffmpeg.get_video_duration(current_video)
+
+        for stage, build_command in (('effects', video_processor.build_effects_command),
+                                     ('overlays', video_processor.build_overlays_command)):
+            stage_output = workspace.file(f'{stage}.nut')
+            cmd = build_command(current_video, stage_output, stream_args, video_size, duration)
+            if cmd:
+                ffmpeg.create_fifo(stage_output)
+                commands.append(cmd)
+                current_video = stage_output
+
+        output_file = workspace.file('content_captioned.mp4')
+        commands.append(caption_processor.build_captions_command(current_video, ass_file, output_file))
+
+        # Only the last stage encodes, the others pass raw frames on
+        stages = ['filter'] * (len(commands) - 1) + ['encode']
+        with measure_stage('content.streaming'):
+            ffmpeg.run_pipeline(commands, stages)
+        return output_file
+
+    @staticmethod
+    def _report(callback, stage: str, progress: int):
+        if callback:
+            callback(stage, progress)
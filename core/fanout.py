@@ -0,0 +1,89 @@
+import logging
+import re
+from typing import Dict, List
+
+from core.editor import compose_video, content_duration, deliver_video, render_job
+from core.workspace import JobWorkspace
+from database.snapshot import load_brand_kit_snapshot
+from processors.audio_processor import AudioProcessor
+from processors.caption_processor import CaptionProcessor
+from processors.tts_processor import TTSProcessor
+from processors.video_processor import VideoProcessor
+
+logger = logging.getLogger(__name__)
+
+
+class FanOutRenderer:
+    """
+    Renders one script for several brand kits, e.g. the same story for several channels.
+
+    Work that does not depend on the brand look is done once and shared:
+    - TTS once per voice (and script), transcription once per narration and language
+    - music mix once per narration and music settings
+    - every source clip window is normalized once per resolution
+    Only transitions, effects, overlays, caption burn-in and the intro run per brand kit.
+    """
+
+    def __init__(self, brand_kit_names: List[str]):
+        if not brand_kit_names:
+            raise ValueError("brand kits list is empty")
+        self.brand_kits = [load_brand_kit_snapshot(name) for name in dict.fromkeys(brand_kit_names)]
+
+    def render(self, title: str, script: str = None, output_files: Dict[str, str] = None,
+               callback=None) -> Dict[str, str]:
+        """
+        Args:
+            title: Title used in the auto intros
+            script: Script to voice over, defaults to the script of every brand kit
+            output_files: Optional {brand kit name: path} of the final videos
+            callback: Optional callable(stage, progress) for progress reporting
+
+        Returns:
+            Paths to the final videos per brand kit name
+        """
+        output_files = output_files or {}
+        with render_job(title) as workspace:
+            voices, transcripts, soundtracks, normalized_clips = {}, {}, {}, {}
+            results = {}
+            for i, brand_kit in enumerate(self.brand_kits):
+                self._report(callback, f'render {brand_kit.name}', 95 * i // len(self.brand_kits))
+
+                # Shared artifacts live in their own folders, the processors name files by timestamp
+                voice_key = (brand_kit.voice, script or brand_kit.script_to_voice_over)
+                if voice_key not in voices:
+                    voice_workspace = JobWorkspace(f'voice_{len(voices)}', base_folder=workspace.path)
+                    voices[voice_key] = TTSProcessor(brand_kit, voice_workspace).generate_audio(script)
+                voice_path = voices[voice_key]
+
+                transcript_key = (voice_path, brand_kit.language_code)
+                if transcript_key not in transcripts:
+                    transcripts[transcript_key] = CaptionProcessor(brand_kit, workspace).transcribe(voice_path)
+
+                soundtrack_key = (voice_path, brand_kit.music_path, brand_kit.music_volume if brand_kit.music_path else None)
+                if soundtrack_key not in soundtracks:
+                    soundtrack_workspace = JobWorkspace(f'soundtrack_{len(soundtracks)}', base_folder=workspace.path)
+                    soundtracks[soundtrack_key] = AudioProcessor(brand_kit, soundtrack_workspace).prepare_audio(voice_path)
+
+                video_processor = VideoProcessor(brand_kit, workspace)
+                windows = video_processor.plan_source_clips(content_duration(brand_kit, voice_path))
+                clips = video_processor.normalize_clip_windows(windows, normalized_clips)
+
+                slug = re.sub(r'[^\w-]+', '_', brand_kit.name).strip('_') or str(brand_kit.id)
+                with JobWorkspace(slug, base_folder=workspace.path) as brand_workspace:
+                    ass_file = CaptionProcessor(brand_kit, brand_workspace).create_subtitles_file_from_segments(
+                        transcripts[transcript_key])
+                    final_video = compose_video(brand_kit, brand_workspace, clips, ass_file, voice_path,
+                                                soundtracks[soundtrack_key], title)
+                    results[brand_kit.name] = deliver_video(final_video, output_files.get(brand_kit.name),
+                                                            workspace, suffix=f'_{slug}')
+
+            logger.info(f"Fan-out of '{title}' to {len(self.brand_kits)} brand kits: {len(voices)} narrations, "
+                        f"{len(transcripts)} transcriptions, {len(normalized_clips)} normalized clips")
+
+        self._report(callback, 'done', 100)
+        return results
+
+    @staticmethod
+    def _report(callback, stage: str, progress: int):
+        if callback:
+            callback(stage, progress)
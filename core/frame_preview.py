@@ -0,0 +1,117 @@
+import logging
+import os
+
+from core.config import Config
+from core.workspace import JobWorkspace
+from database.assets import lookup_clip_metadata
+from processors.caption_processor import CaptionProcessor
+from processors.video_processor import VideoProcessor
+from utils.cache import DiskCache, file_key
+from utils.ffmpeg_utils import FFmpegUtils
+
+logger = logging.getLogger(__name__)
+
+# Brand kit attributes read by the overlays and the captions, the cached frames are keyed by them
+OVERLAY_FIELDS = (
+    'aspect_ratio',
+    'watermark_path', 'watermark_position', 'watermark_width_persent',
+    'avatar_path', 'avatar_position', 'avatar_background_color', 'avatar_width_persent',
+    'cta_path', 'cta_position', 'cta_width_persent',
+)
+CAPTION_FIELDS = ('font', 'font_size', 'font_color', 'stroke_width', 'stroke_color', 'position', 'max_words_per_line')
+SAMPLE_CAPTION = 'Sample caption text'
+
+
+class FramePreviewer:
+    """
+    Renders one frame of a brand kit with its watermark, avatar, CTA and a caption line,
+    to check their positions without rendering a video.
+
+    The frame goes through the same overlay and caption commands as a render, limited to
+    `-frames:v 1`. The background frame and every rendered frame are cached on disk by
+    their settings, so going back to a setting already seen is instant.
+    """
+
+    def __init__(self, cache: DiskCache = None):
+        self.cache = cache or DiskCache(Config.PROXY_CACHE_FOLDER, Config.PROXY_CACHE_MAX_MB)
+        self.ffmpeg = FFmpegUtils()
+
+    def render(self, brand_kit, caption_text: str = None) -> str:
+        """
+        Args:
+            brand_kit: Brand kit or its snapshot, e.g. with the unsaved settings of the editor
+            caption_text: Text of the caption line, a sample text by default
+
+        Returns:
+            Path to the PNG image of the frame
+        """
+        caption_text = caption_text or SAMPLE_CAPTION
+        width, height = VideoProcessor(brand_kit)._get_resolution_from_aspect_ratio()
+        background_key, background = self._background_frame(brand_kit, width, height)
+
+        key = ('frame', background_key, caption_text,
+               tuple((name, self._setting(getattr(brand_kit, name, None))) for name in OVERLAY_FIELDS),
+               tuple((name, getattr(brand_kit.caption_config, name, None)) for name in CAPTION_FIELDS)
+               if brand_kit.caption_config else None)
+        return self.cache.get_or_create(
+            key, lambda path: self._render_frame(brand_kit, background, path, (width, height), caption_text), '.png')
+
+    def _background_frame(self, brand_kit, width: int, height: int) -> tuple:
+        """
+        A frame from the middle of the first source clip, a plain gray one when the brand kit has none.
+
+        Returns:
+            Cache key and path of the frame
+        """
+        target_resolution = f'{width}:{height}'
+        source_videos = [path for path in brand_kit.source_videos_paths or () if os.path.exists(path)]
+        if not source_videos:
+            key = ('background', 'gray', target_resolution)
+            return key, self.cache.get_or_create(
+                key,
+                lambda path: self.ffmpeg.run_command(
+                    ['ffmpeg', '-f', 'lavfi', '-i', f'color=c=gray:s={width}x{height}', '-frames:v', '1',
+                     '-update', '1', '-y', path], stage='filter'),
+                '.png')
+
+        source = source_videos[0]
+        key = ('background', file_key(source), target_resolution)
+        metadata = lookup_clip_metadata([source]).get(source)
+        return key, self.cache.get_or_create(
+            key,
+            lambda path: self.ffmpeg.extract_frame(
+                source, path, target_resolution,
+                (metadata.duration if metadata else self.ffmpeg.get_video_duration(source)) / 2),
+            '.png')
+
+    def _render_frame(self, brand_kit, background: str, output_file: str, video_size: tuple, caption_text: str):
+        frame_args = ['-frames:v', '1', '-update', '1']
+        with JobWorkspace('frame_preview') as workspace:
+            video_processor = VideoProcessor(brand_kit, workspace)
+            current_frame = background
+
+            overlaid_frame = workspace.file('overlays.png')
+            cmd = video_processor.build_overlays_command(current_frame, overlaid_frame, frame_args, video_size,
+                                                         duration=1, still=True)
+            if cmd:
+                self.ffmpeg.run_command(cmd, stage='filter')
+                current_frame = overlaid_frame
+
+            if brand_kit.caption_config:
+                caption_processor = CaptionProcessor(brand_kit, workspace)
+                ass_file = caption_processor.create_subtitles_file_from_segments(
+                    [{'start': 0.0, 'end': 10.0, 'text': caption_text}])
+                cmd = caption_processor.build_captions_command(current_frame, ass_file, workspace.file('captions.png'),
+                                                               frame_args)
+                self.ffmpeg.run_command(cmd, stage='filter')
+                current_frame = workspace.file('captions.png')
+
+            self.ffmpeg.copy_file(current_frame, output_file)
+        logger.debug(f"Rendered the frame preview: {output_file}")
+
+    @staticmethod
+    def _setting(value):
+        # An overlay file replaced under the same name changes the frame too
+        if isinstance(value, str) and os.path.isfile(value):
+            return file_key(value)
+        return value
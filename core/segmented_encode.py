@@ -0,0 +1,274 @@
+import contextvars
+import glob
+import json
+import logging
+import math
+import os
+import shutil
+import socket
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Optional
+
+from core.config import Config
+from core.workspace import JobWorkspace
+from utils.artifacts import promote_artifact
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.render_profile import current_render_profile
+
+logger = logging.getLogger(__name__)
+
+TASK_PATTERN = 'segment_*.json'
+
+
+class SegmentedEncoder:
+    """
+    Encodes a long video in time segments at the same time and joins them without re-encoding.
+
+    Segment boundaries lie between frames and every segment is a whole number of GOPs long,
+    keyframes are forced on the same grid, so the joined video has a regular GOP structure
+    and no frame is lost or doubled at a seam. The filter sees the original timestamps,
+    e.g. the `ass` filter shows the same captions as in a single run.
+
+    Segments are tasks in a folder, claimed by renaming them. Local workers process the folder
+    of the job. With Config.SEGMENT_SHARED_FOLDER the folder is shared, so `videomaker segment-worker`
+    processes running on other nodes take part too. The input and the subtitles are placed in the task folder,
+    tasks only name files of it.
+    """
+
+    def __init__(self, workspace: JobWorkspace, segment_seconds: float = None, workers: int = None,
+                 shared_folder: str = None):
+        self.workspace = workspace
+        self.segment_seconds = segment_seconds or Config.SEGMENT_SECONDS
+        self.workers = workers or Config.SEGMENT_WORKERS or os.cpu_count() or 1
+        self.shared_folder = Config.SEGMENT_SHARED_FOLDER if shared_folder is None else shared_folder
+
+    @staticmethod
+    def enabled(duration: float) -> bool:
+        """Whether a video of this duration is worth encoding in segments"""
+        return Config.SEGMENTED_ENCODE and duration >= 2 * Config.SEGMENT_SECONDS
+
+    @staticmethod
+    def plan(duration: float, fps: float, segment_seconds: float) -> List[tuple]:
+        """
+        Splits the video into (start, end) segments of whole GOPs, end is None for the last one.
+        Boundaries are half a frame before a frame, so every frame falls into exactly one segment
+        and end - start is the exact length of the segment.
+        """
+        gop_frames = max(1, round(fps * Config.SEGMENT_GOP_SECONDS))
+        total_frames = int(round(duration * fps))
+        segment_frames = max(1, round(segment_seconds * fps / gop_frames)) * gop_frames
+
+        boundaries = list(range(0, total_frames, segment_frames))
+        # A short tail is encoded with the previous segment
+        if len(boundaries) > 1 and total_frames - boundaries[-1] < gop_frames:
+            boundaries.pop()
+        times = [round((frame - 0.5) / fps, 6) for frame in boundaries]
+        return list(zip(times, times[1:] + [None]))
+
+    def encode(self, input_path: str, output_path: str, ass_file: str = None) -> str:
+        """
+        Args:
+            input_path: Video to encode
+            output_path: Encoded video without audio
+            ass_file: Subtitles burned into every frame
+
+        Returns:
+            output_path
+        """
+        info = FFmpegUtils.probe_media(input_path)
+        fps = info['fps'] or current_render_profile().fps
+        segments = self.plan(info['duration'], fps, self.segment_seconds)
+
+        # Workers on other nodes only see the task folder, a local one gets links instead of copies
+        folder = self._task_folder()
+        task_input = 'input' + os.path.splitext(input_path)[1]
+        promote_artifact(input_path, os.path.join(folder, task_input), workspace=self.workspace.path)
+        task_ass = None
+        if ass_file:
+            task_ass = 'captions.ass'
+            promote_artifact(ass_file, os.path.join(folder, task_ass), workspace=self.workspace.path)
+
+        outputs = []
+        for i, (start, end) in enumerate(segments):
+            output = os.path.join(folder, f'segment_{i:04d}.mp4')
+            # Parameters and file names of the task folder only, the worker builds the command itself
+            task = {'input': task_input, 'ass': task_ass, 'start': start, 'end': end,
+                    'output': os.path.basename(output)}
+            with open(os.path.join(folder, f'segment_{i:04d}.json.tmp'), 'w') as f:
+                json.dump(task, f)
+            # Published at once, a worker never reads a half written task
+            os.replace(f.name, os.path.join(folder, f'segment_{i:04d}.json'))
+            outputs.append(output)
+
+        logger.info(f"Encoding {os.path.basename(input_path)} in {len(segments)} segments "
+                    f"with {self.workers} local workers")
+        workers = min(self.workers, len(segments))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # Every worker gets the context of the render: profile, metrics and trace
+            futures = [executor.submit(contextvars.copy_context().run, process_tasks, folder)
+                       for _ in range(workers)]
+            for future in futures:
+                future.result()
+        self._wait(folder, outputs)
+
+        concat_list = os.path.join(folder, 'segments.txt')
+        with open(concat_list, 'w') as f:
+            for output, (start, end) in zip(outputs, segments):
+                # The exact length of a segment, its file does not store the duration of the last frame
+                f.write(f"file '{os.path.basename(output)}'\n" + (f"duration {end - start}\n" if end else ''))
+        FFmpegUtils.run_command(['ffmpeg', '-f', 'concat', '-safe', '0', '-i', concat_list, '-c', 'copy',
+                                 '-y', output_path], stage='remux')
+        if self.shared_folder:
+            shutil.rmtree(folder, ignore_errors=True)
+        return output_path
+
+    @staticmethod
+    def build_segment_command(input_path: str, output_path: str, ass_file: Optional[str], start: float,
+                              end: Optional[float]) -> list:
+        """
+        The input is seeked to a second before the segment and trimmed exactly. The subtitles get
+        the timestamps of the whole video back, they are reset to zero for the join.
+        """
+        # Whole seconds are exact in any time base, the subtitles see the same timestamps as in one run
+        seek = float(max(0, math.floor(start) - 1))
+        filters = [f'trim=start={round(start - seek, 6)}' + (f':end={round(end - seek, 6)}' if end is not None else ''),
+                   f'setpts=PTS+{seek}/TB']
+        if ass_file:
+            filters.append(f'ass={ass_file}')
+        filters.append('setpts=PTS-STARTPTS')
+        return [
+            'ffmpeg',
+            *FFmpegUtils._seek_args(seek, end - seek + 1 if end is not None else None),
+            '-i', input_path,
+            '-vf', ','.join(filters),
+            '-an',
+            # Frames are trimmed exactly by the filter, the muxer keeps all of them
+            '-fps_mode', 'passthrough',
+            '-c:v', Config.VIDEO_CODEC,
+            '-pix_fmt', Config.OUTPUT_PIX_FMT,
+            '-force_key_frames', f'expr:gte(t,n_forced*{Config.SEGMENT_GOP_SECONDS})',
+            '-y', output_path
+        ]
+
+    def _task_folder(self) -> str:
+        if self.shared_folder:
+            folder = os.path.join(self.shared_folder, self.workspace.job_id)
+        else:
+            folder = self.workspace.file('segments')
+        os.makedirs(folder, exist_ok=True)
+        return folder
+
+    @staticmethod
+    def _wait(folder: str, outputs: List[str]):
+        """Waits for segments claimed by other nodes, a segment taking too long is encoded here"""
+        while True:
+            failed = glob.glob(os.path.join(folder, 'segment_*.failed'))
+            if failed:
+                with open(failed[0]) as f:
+                    raise RuntimeError(f"Segment encode failed: {f.read()}")
+            pending = [output for output in outputs if not os.path.exists(output)]
+            if not pending:
+                return
+            for claim in glob.glob(os.path.join(folder, 'segment_*.json.*.claimed')):
+                output = os.path.join(folder, os.path.basename(claim).split('.')[0] + '.mp4')
+                if output in pending and time.time() - os.path.getmtime(claim) > Config.SEGMENT_TIMEOUT:
+                    logger.warning(f"Segment {os.path.basename(claim)} timed out, encoding it here")
+                    os.utime(claim)
+                    run_task(claim)
+            time.sleep(0.5)
+
+
+def claim_task(folder: str) -> Optional[str]:
+    """Claims the next unclaimed task in the folder, None when there is none"""
+    for task in sorted(glob.glob(os.path.join(folder, TASK_PATTERN))):
+        claimed = f'{task}.{socket.gethostname()}-{os.getpid()}.claimed'
+        try:
+            # Only one worker succeeds to rename a task
+            os.rename(task, claimed)
+            return claimed
+        except OSError:
+            continue
+    return None
+
+
+def load_task(claimed: str) -> dict:
+    """
+    Reads and checks a claimed task. A task only holds the segment parameters and names
+    files of the task folder, nothing else is read or written and nothing else is run than a segment encode.
+
+    Returns:
+        The task with the full paths of its files
+    """
+    with open(claimed) as f:
+        task = json.load(f)
+    if not isinstance(task, dict) or set(task) != {'input', 'ass', 'start', 'end', 'output'}:
+        raise ValueError(f"Not a segment task: {claimed}")
+    if not isinstance(task['start'], (int, float)) \
+            or not (task['end'] is None or isinstance(task['end'], (int, float))):
+        raise ValueError(f"Invalid segment parameters: {claimed}")
+
+    folder = os.path.dirname(claimed)
+    files = {'input': _task_file(folder, task['input'], claimed),
+             'output': _task_file(folder, task['output'], claimed, '.mp4'),
+             'ass': _task_file(folder, task['ass'], claimed, '.ass') if task['ass'] is not None else None}
+    return dict(task, **files)
+
+
+def _task_file(folder: str, name, claimed: str, extension: str = '') -> str:
+    if not isinstance(name, str) or os.path.basename(name) != name or name in ('', '.', '..') \
+            or not name.endswith(extension):
+        raise ValueError(f"Segment files have to be files of the task folder: {claimed}")
+    return os.path.join(folder, name)
+
+
+def run_task(claimed: str):
+    """Encodes one segment, the output appears under its final name only when it is complete"""
+    # segment_0000.json.<worker>.claimed fails as segment_0000.failed, also when the task is rejected
+    root = os.path.join(os.path.dirname(claimed), os.path.basename(claimed).split('.')[0])
+    try:
+        task = load_task(claimed)
+        partial = f'{root}.{socket.gethostname()}-{os.getpid()}.partial.mp4'
+        FFmpegUtils.run_command(SegmentedEncoder.build_segment_command(task['input'], partial, task['ass'],
+                                                                       task['start'], task['end']))
+        os.replace(partial, task['output'])
+    except Exception as e:
+        with open(f'{root}.failed', 'w') as f:
+            f.write(f'{os.path.basename(claimed)}: {e}')
+        raise
+
+
+def process_tasks(folder: str):
+    """Encodes segments of the folder until none is left"""
+    while True:
+        claimed = claim_task(folder)
+        if claimed is None:
+            return
+        run_task(claimed)
+
+
+def run_segment_worker(shared_folder: str, once: bool = False, poll_interval: float = 1.0) -> int:
+    """
+    Encodes segments published to the shared folder by render jobs on any node.
+    The shared folder has to be mounted at the same path on every node.
+
+    Returns:
+        Number of encoded segments
+    """
+    encoded = 0
+    try:
+        while True:
+            for folder in sorted(glob.glob(os.path.join(shared_folder, '*', ''))):
+                claimed = claim_task(folder)
+                while claimed:
+                    try:
+                        run_task(claimed)
+                        encoded += 1
+                    except Exception:
+                        logger.exception(f"Failed to encode {claimed}")
+                    claimed = claim_task(folder)
+            if once:
+                return encoded
+            time.sleep(poll_interval)
+    except KeyboardInterrupt:
+        return encoded
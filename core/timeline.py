@@ -0,0 +1,118 @@
+import json
+import logging
+import random
+from typing import Callable, Iterable, List, NamedTuple, Optional
+
+from utils.ffmpeg_utils import FFmpegUtils
+
+logger = logging.getLogger(__name__)
+
+
+class ClipWindow(NamedTuple):
+    """Part of a source clip used in the video, duration None means the clip to its end"""
+    path: str
+    start: float
+    duration: Optional[float]
+
+
+class RenderPlan(NamedTuple):
+    """
+    What a render decided before encoding: the narration, its caption segments and the clip windows.
+    A preview saves its plan, so the final render of the same brand kit encodes exactly what was previewed
+    without generating the voice or transcribing it again.
+    """
+    brand_kit: str
+    title: str
+    voice_path: str
+    segments: List[dict]
+    windows: List[ClipWindow]
+
+    def save(self, path: str) -> str:
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump(self._asdict(), f, ensure_ascii=False, indent=2)
+        return path
+
+    @classmethod
+    def load(cls, path: str) -> 'RenderPlan':
+        with open(path, encoding='utf-8') as f:
+            data = json.load(f)
+        data['windows'] = [ClipWindow(*window) for window in data['windows']]
+        return cls(**data)
+
+
+class TimelinePlanner:
+    """
+    Picks the source clips and the windows inside them that cover the narration.
+    Only the planned seconds are decoded and encoded, so the render cost follows the length
+    of the video instead of the size of the clip library. Clips are probed on demand only.
+    """
+
+    def __init__(self, clips: Iterable[str], transition_duration: float, randomize: bool = False,
+                 max_window: float = 0, probe: Callable[[str], float] = None, rng: random.Random = None):
+        """
+        Args:
+            clips: Paths to the source clips
+            transition_duration: Overlap of two neighbouring clips
+            randomize: Shuffle the clips and take windows at random positions
+            max_window: Longest window taken from one clip, 0 for no limit
+            probe: Returns the duration of a clip, FFprobe by default
+            rng: Random generator, for reproducible plans
+        """
+        self.clips = list(clips)
+        self.transition_duration = transition_duration
+        self.randomize = randomize
+        self.max_window = max_window
+        self.probe = probe or FFmpegUtils.get_video_duration
+        self.rng = rng or random.Random()
+        # xfade needs every clip to be longer than the transition
+        self.min_window = max(1.0, 2 * transition_duration)
+        self._durations = {}
+
+    def plan(self, target_duration: float = None) -> List[ClipWindow]:
+        """
+        Plans windows which, joined with transitions, last at least target_duration.
+        Without a target every clip is used in full, the way it was before planning.
+        The library is cycled when it is shorter than the target.
+        """
+        if not self.clips:
+            raise ValueError("clips list is empty")
+        if target_duration is None:
+            return [ClipWindow(clip, 0.0, None) for clip in self._order()]
+
+        windows = []
+        covered = 0.0
+        while covered < target_duration:
+            usable = False
+            for clip in self._order():
+                clip_duration = self._duration(clip)
+                if clip_duration < self.min_window:
+                    continue
+                usable = True
+
+                overlap = self.transition_duration if windows else 0.0
+                window = min(clip_duration, max(target_duration - covered + overlap, self.min_window))
+                if self.max_window:
+                    window = min(window, max(self.max_window, self.min_window))
+                start = self.rng.uniform(0, clip_duration - window) if self.randomize else 0.0
+
+                windows.append(ClipWindow(clip, round(start, 3), round(window, 3)))
+                covered += window - overlap
+                if covered >= target_duration:
+                    break
+            if not usable:
+                raise ValueError(f"All source clips are shorter than {self.min_window} seconds")
+
+        logger.info(f"Planned {len(windows)} clip windows ({round(sum(w.duration for w in windows), 1)} s) "
+                    f"for {round(target_duration, 1)} s of narration")
+        return windows
+
+    def _order(self) -> List[str]:
+        clips = list(self.clips)
+        if self.randomize:
+            self.rng.shuffle(clips)
+        return clips
+
+    def _duration(self, clip: str) -> float:
+        if clip not in self._durations:
+            self._durations[clip] = self.probe(clip)
+        return self._durations[clip]
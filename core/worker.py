@@ -0,0 +1,173 @@
+import logging
+import os
+import re
+import threading
+import time
+
+from core.config import Config
+from database.job_queue import LocalJobQueue, ensure_job_queue, worker_name
+from database.progress import ProgressBatcher
+from database.snapshot import BrandKitSnapshot
+from utils.artifacts import promote_artifact
+
+logger = logging.getLogger(__name__)
+
+
+def render_job_video(job, callback, output_file: str) -> str:
+    """
+    Renders a queued job with the current settings of its brand kit,
+    or with the brand kit snapshot sent with a job leased from a coordinator
+    """
+    from core.editor import VideoEditor
+
+    if job.brand_kit is None:
+        raise ValueError('The brand kit of the job was deleted')
+    brand_kit = job.brand_kit if isinstance(job.brand_kit, BrandKitSnapshot) else job.brand_kit.name
+    return VideoEditor(brand_kit).create_video(job.title, job.script, output_file, callback=callback)
+
+
+def job_video_paths(job, worker: str) -> tuple:
+    """
+    Path of the video of the job and the path the worker renders it to, next to it.
+    Only the worker still holding the job moves its video to the final path.
+    """
+    target = job.target_path or os.path.join(Config.RESULT_FOLDER, f'job_{job.id}.mp4')
+    root, extension = os.path.splitext(target)
+    worker = re.sub(r'[^\w.-]+', '_', worker)
+    return target, f"{root}.{worker}.partial{extension or '.mp4'}"
+
+
+class RenderWorker:
+    """
+    Renders jobs queued in the render_jobs table, without the UI. Any number of workers can run
+    at the same time, every job is rendered once. Workers on the machine holding the database use it
+    directly, workers on other machines lease their jobs from a JobCoordinator (see database.job_coordinator),
+    SQLite locks do not work over network filesystems.
+
+    A job is leased for Config.JOB_LEASE_SECONDS and the lease is renewed while it renders.
+    When a worker dies, its lease expires and the job is queued again for another worker.
+    Progress is written to the job like for renders started from the app or the CLI.
+
+        worker = RenderWorker()
+        worker.run()  # until worker.stop() is called, e.g. from a signal handler
+    """
+
+    def __init__(self, name: str = None, lease_seconds: float = None, poll_interval: float = None, render=None,
+                 queue=None):
+        """
+        Args:
+            name: Name of the worker in the jobs it renders, host and process id by default
+            lease_seconds: Lease of a job, renewed every third of it
+            poll_interval: Seconds between two looks at an empty queue
+            render: Callable(job, callback, output_file) returning the path of the video,
+                    render_job_video by default
+            queue: RemoteJobQueue of a coordinator, the database of this machine by default
+        """
+        self.name = name or worker_name()
+        self.lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+        self.poll_interval = Config.WORKER_POLL_INTERVAL if poll_interval is None else poll_interval
+        self.render = render or render_job_video
+        self.queue = queue or LocalJobQueue()
+        self.stats = dict(done=0, failed=0, lost=0)
+        self._stop = threading.Event()
+
+    def run(self, max_jobs: int = None, drain: bool = False) -> dict:
+        """
+        Args:
+            max_jobs: Stop after rendering this many jobs
+            drain: Stop when the queue is empty instead of waiting for new jobs
+
+        Returns:
+            Numbers of done, failed and lost jobs
+        """
+        if not self.queue.remote:
+            with self.queue.connection():
+                ensure_job_queue()
+        logger.info(f"Worker {self.name} started")
+
+        # Progress of a job taken over by another worker is not written
+        with ProgressBatcher(worker=self.name, write=self.queue.write_progress if self.queue.remote else None) \
+                as progress:
+            while not self._stop.is_set() and (max_jobs is None or sum(self.stats.values()) < max_jobs):
+                try:
+                    with self.queue.connection():
+                        job = self.queue.lease_job(self.name, self.lease_seconds)
+                except OSError as e:
+                    # The coordinator is restarting or unreachable for a moment
+                    logger.warning(f"Worker {self.name} could not lease a job: {e}")
+                    self._stop.wait(self.poll_interval)
+                    continue
+                if job is None:
+                    if drain:
+                        break
+                    self._stop.wait(self.poll_interval)
+                    continue
+                self._process(job, progress)
+
+        logger.info(f"Worker {self.name} stopped: {self.stats}")
+        return self.stats
+
+    def stop(self):
+        """Stops after the job being rendered"""
+        self._stop.set()
+
+    def _process(self, job, progress: ProgressBatcher):
+        lost = threading.Event()
+        finished = threading.Event()
+        heartbeat = threading.Thread(target=self._heartbeat, args=(job.id, lost, finished),
+                                     name=f'lease-{job.id}', daemon=True)
+        heartbeat.start()
+
+        def report(stage, percent):
+            # The render stops at the next stage once another worker may have taken the job
+            if lost.is_set():
+                raise RuntimeError(f'The lease of job {job.id} was lost')
+            progress.update(job.id, stage=stage, progress=percent)
+
+        target, private_path = job_video_paths(job, self.name)
+        start = time.perf_counter()
+        output_path, error = None, None
+        try:
+            with self.queue.connection():
+                output_path = self.render(job, report, private_path)
+        except Exception as e:
+            if not lost.is_set():
+                logger.exception(f"Job {job.id} '{job.title}' failed")
+            error = str(e) or type(e).__name__
+        finally:
+            finished.set()
+            heartbeat.join()
+
+        # The last progress must not land after the final status
+        progress.flush()
+        with self.queue.connection():
+            kept = self.queue.finish_job(job.id, self.name, None if error else target, error)
+            if kept and not error:
+                try:
+                    promote_artifact(output_path, target, move=True)
+                except Exception as e:
+                    logger.exception(f"Failed to move the video of job {job.id} to {target}")
+                    error = str(e) or type(e).__name__
+                    self.queue.write_progress({job.id: dict(status='failed', output_path=None, error=error)},
+                                              self.name)
+        if not kept:
+            logger.warning(f"Job {job.id} was taken over by another worker, the result of {self.name} is dropped")
+            for path in {output_path, private_path} - {None, target}:
+                if os.path.exists(path):
+                    os.remove(path)
+            self.stats['lost'] += 1
+        else:
+            self.stats['failed' if error else 'done'] += 1
+        logger.info(f"Job {job.id} '{job.title}': {'failed' if error else 'done'} "
+                    f"in {round(time.perf_counter() - start, 3)}s")
+
+    def _heartbeat(self, job_id: int, lost: threading.Event, finished: threading.Event):
+        # Renewed every third of the lease, two missed renewals in a row still keep the job
+        with self.queue.connection():
+            while not finished.wait(self.lease_seconds / 3):
+                try:
+                    if not self.queue.renew_lease(job_id, self.name, self.lease_seconds):
+                        lost.set()
+                        return
+                except Exception:
+                    logger.exception(f"Failed to renew the lease of job {job_id}")
@@ -0,0 +1,71 @@
+import logging
+import os
+import re
+import shutil
+import tempfile
+import weakref
+
+from core.config import Config
+
+logger = logging.getLogger(__name__)
+
+
+class JobWorkspace:
+    """
+    Isolated temporary directory for a single render job.
+
+    Every intermediate file of the job lives here, so concurrent jobs never overwrite
+    each other. The directory is removed on cleanup(), when leaving the `with` block,
+    or at the latest when the workspace object is garbage collected / the interpreter exits.
+    """
+
+    def __init__(self, job_name: str = 'job', required_mb: int = None, base_folder: str = None):
+        """
+        Args:
+            job_name: Readable part of the directory name
+            required_mb: Free space the job needs on the scratch volume
+            base_folder: Create the workspace inside this folder, e.g. inside the workspace of the parent job
+        """
+        self.job_name = re.sub(r'[^\w-]+', '_', job_name or 'job')[:40].strip('_') or 'job'
+        base_folder = base_folder or self._choose_base_folder(required_mb or Config.SCRATCH_MIN_FREE_MB)
+        self.path = tempfile.mkdtemp(prefix=f'{self.job_name}_', dir=base_folder)
+        self.job_id = os.path.basename(self.path)
+        self._finalizer = weakref.finalize(self, shutil.rmtree, self.path, True)
+        logger.debug(f"Created job workspace: {self.path}")
+
+    @staticmethod
+    def _choose_base_folder(required_mb: int) -> str:
+        """
+        Returns the scratch folder if it is configured and has enough free space, otherwise TEMP_FOLDER
+        """
+        scratch_folder = Config.SCRATCH_FOLDER
+        if scratch_folder:
+            try:
+                os.makedirs(scratch_folder, exist_ok=True)
+                free_mb = shutil.disk_usage(scratch_folder).free // (1024 * 1024)
+                if free_mb >= required_mb:
+                    return scratch_folder
+                logger.warning(f"Scratch folder {scratch_folder} has only {free_mb} MB free "
+                               f"({required_mb} MB required), falling back to {Config.TEMP_FOLDER}")
+            except OSError as e:
+                logger.warning(f"Scratch folder {scratch_folder} is not usable: {e}")
+
+        os.makedirs(Config.TEMP_FOLDER, exist_ok=True)
+        return Config.TEMP_FOLDER
+
+    def file(self, name: str) -> str:
+        """Returns the path of a file inside the workspace"""
+        return os.path.join(self.path, name)
+
+    def cleanup(self):
+        """Removes the workspace with all intermediate files"""
+        if self._finalizer.alive:
+            self._finalizer()
+            logger.debug(f"Removed job workspace: {self.path}")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.cleanup()
+        return False
@@ -0,0 +1,241 @@
+import bisect
+import datetime
+import hashlib
+import json
+import logging
+import os
+import threading
+from typing import Dict, Iterable, NamedTuple, Optional, Tuple
+
+import peewee as pw
+
+from core.config import Config
+from database.models import SourceClipAsset, SourceVideos, ensure_table
+from utils.ffmpeg_utils import FFmpegUtils
+
+logger = logging.getLogger(__name__)
+
+# Bytes read from the start and from the end of a file for its fingerprint
+FINGERPRINT_CHUNK = 1024 * 1024
+
+
+class ClipMetadata(NamedTuple):
+    """Probe metadata of a source clip from the asset index"""
+    path: str
+    duration: float
+    width: int
+    height: int
+    fps: float
+    video_codec: str
+    has_audio: bool
+    keyframes: Tuple[float, ...] = ()
+    pix_fmt: str = None
+
+    def mismatch(self, width: int, height: int, fps: float) -> Optional[str]:
+        """Why the clip has to be normalized for the given output, None when it already matches it"""
+        if (self.width, self.height) != (width, height):
+            return f'resolution {self.width}x{self.height}'
+        if not self.fps or abs(self.fps - fps) > 0.01:
+            return f'frame rate {self.fps}'
+        if self.video_codec != Config.OUTPUT_CODEC_NAME:
+            return f'codec {self.video_codec}'
+        if self.pix_fmt != Config.OUTPUT_PIX_FMT:
+            return f'pixel format {self.pix_fmt}'
+        return None
+
+    def keyframe_before(self, t: float) -> float:
+        """Last keyframe at or before t, where a stream copy cut can start. 0 when the keyframes are unknown"""
+        i = bisect.bisect_right(self.keyframes, t + 1e-3)
+        return self.keyframes[i - 1] if i else 0.0
+
+    @classmethod
+    def from_row(cls, row: SourceClipAsset) -> 'ClipMetadata':
+        return cls(row.path, row.duration, row.width, row.height, row.fps, row.video_codec, row.has_audio,
+                   tuple(json.loads(row.keyframes or '[]')), row.pix_fmt)
+
+
+def fast_fingerprint(path: str) -> str:
+    """
+    SHA-1 of the size and the first and last megabyte of a file.
+    Tells a touched file from an edited one without reading whole videos.
+    """
+    size = os.path.getsize(path)
+    digest = hashlib.sha1(str(size).encode())
+    with open(path, 'rb') as f:
+        digest.update(f.read(FINGERPRINT_CHUNK))
+        if size > FINGERPRINT_CHUNK:
+            f.seek(max(FINGERPRINT_CHUNK, size - FINGERPRINT_CHUNK))
+            digest.update(f.read(FINGERPRINT_CHUNK))
+    return digest.hexdigest()
+
+
+def probe_clip(path: str) -> dict:
+    """Fields of a SourceClipAsset row for a file, one ffprobe run for the streams and one for the keyframes"""
+    stat = os.stat(path)
+    info = FFmpegUtils.probe_media(path)
+    try:
+        keyframes = FFmpegUtils.get_keyframes(path)
+    except Exception:
+        # Keyframes only speed up cutting, the clip stays usable without them
+        logger.warning(f"Failed to read the keyframes of {path}", exc_info=True)
+        keyframes = []
+    return dict(info, path=path, size=stat.st_size, mtime_ns=stat.st_mtime_ns, fingerprint=fast_fingerprint(path),
+                keyframes=json.dumps(keyframes), scanned_at=datetime.datetime.now())
+
+
+def ensure_asset_index() -> None:
+    """Creates the asset index table, or adds the columns missing from an index created before them"""
+    added = ensure_table(SourceClipAsset)
+    if added:
+        logger.info(f"Added the asset index columns: {', '.join(added)}, the scanner probes the clips again")
+
+
+def lookup_clip_metadata(paths: Iterable[str]) -> Dict[str, ClipMetadata]:
+    """
+    Indexed metadata of the given clips in one query.
+    Clips missing from the index, changed since their scan or scanned before a column was added
+    are left out, the caller probes them.
+    """
+    paths = list(dict.fromkeys(paths))
+    if not paths:
+        return {}
+    query = SourceClipAsset.select().where(SourceClipAsset.path.in_(paths))
+    try:
+        rows = list(query)
+    except pw.DatabaseError:
+        # No index yet or an index without the newer columns, e.g. an old database file
+        logger.debug('Asset index is not up to date', exc_info=True)
+        try:
+            ensure_asset_index()
+            rows = list(query)
+        except pw.DatabaseError:
+            logger.debug('Asset index is not available', exc_info=True)
+            return {}
+
+    result = {}
+    for row in rows:
+        try:
+            stat = os.stat(row.path)
+        except OSError:
+            continue
+        if stat.st_size == row.size and stat.st_mtime_ns == row.mtime_ns and row.pix_fmt is not None:
+            result[row.path] = ClipMetadata.from_row(row)
+    return result
+
+
+def get_clip_metadata(paths: Iterable[str]) -> Dict[str, ClipMetadata]:
+    """
+    Metadata of the given clips from the asset index, clips missing from it are probed.
+    Probed clips are not added to the index and have no keyframes, the scanner fills them in.
+    """
+    paths = list(dict.fromkeys(paths))
+    result = lookup_clip_metadata(paths)
+    for path in paths:
+        if path in result:
+            continue
+        try:
+            info = FFmpegUtils.probe_media(path)
+        except Exception:
+            logger.warning(f"Failed to probe the source clip {path}", exc_info=True)
+            continue
+        result[path] = ClipMetadata(path, info['duration'], info['width'], info['height'], info['fps'],
+                                    info['video_codec'], info['has_audio'], pix_fmt=info['pix_fmt'])
+    return result
+
+
+class AssetScanner:
+    """
+    Keeps the asset index of the source clips up to date.
+    Unchanged files (same size and mtime) are skipped, a touched file with the same fingerprint
+    only gets its mtime updated, so a rescan of a big library is a stat per file.
+
+        with AssetScanner():
+            ...  # scans in the background every Config.ASSET_SCAN_INTERVAL seconds
+    """
+
+    def __init__(self, interval: float = None):
+        self.interval = Config.ASSET_SCAN_INTERVAL if interval is None else interval
+        self._stop = threading.Event()
+        self._thread = None
+
+    def scan(self, paths: Iterable[str] = None) -> dict:
+        """
+        Args:
+            paths: Clips to scan, by default every source video of every brand kit.
+                   A scan of every source video also drops the rows of deleted files.
+
+        Returns:
+            Numbers of probed, touched, unchanged, failed and removed clips
+        """
+        # Databases created before the asset index or its newer columns get them on the first scan
+        ensure_asset_index()
+        full_scan = paths is None
+        if full_scan:
+            paths = [row.path for row in SourceVideos.select(SourceVideos.path).distinct() if row.path]
+        paths = list(dict.fromkeys(paths))
+        stats = dict(probed=0, touched=0, unchanged=0, failed=0, removed=0)
+
+        known = {row.path: row for row in SourceClipAsset.select().where(SourceClipAsset.path.in_(paths))} \
+            if paths else {}
+        for path in paths:
+            try:
+                stat = os.stat(path)
+                row = known.get(path)
+                # Rows scanned before the pixel format was indexed are probed again
+                if row and row.pix_fmt is None:
+                    row = None
+                if row and row.size == stat.st_size and row.mtime_ns == stat.st_mtime_ns:
+                    stats['unchanged'] += 1
+                elif row and row.size == stat.st_size and row.fingerprint == fast_fingerprint(path):
+                    SourceClipAsset.update(mtime_ns=stat.st_mtime_ns, scanned_at=datetime.datetime.now()) \
+                        .where(SourceClipAsset.id == row.id).execute()
+                    stats['touched'] += 1
+                else:
+                    fields = probe_clip(path)
+                    SourceClipAsset.insert(**fields).on_conflict(
+                        conflict_target=[SourceClipAsset.path],
+                        update={getattr(SourceClipAsset, name): value for name, value in fields.items()}).execute()
+                    stats['probed'] += 1
+            except Exception:
+                logger.warning(f"Failed to scan the source clip {path}", exc_info=True)
+                stats['failed'] += 1
+
+        if full_scan:
+            scanned = set(paths)
+            missing = [path for path, in SourceClipAsset.select(SourceClipAsset.path).tuples()
+                       if path not in scanned or not os.path.exists(path)]
+            if missing:
+                stats['removed'] = SourceClipAsset.delete().where(SourceClipAsset.path.in_(missing)).execute()
+
+        logger.info(f"Scanned {len(paths)} source clips: {stats}")
+        return stats
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='asset-scanner', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def _run(self):
+        # The scanning thread has its own connection, closed when the scanner stops
+        with SourceClipAsset._meta.database.connection_context():
+            while True:
+                try:
+                    self.scan()
+                except Exception:
+                    # The index is an optimization, renders probe the clips themselves without it
+                    logger.exception('Failed to scan the source clips')
+                if self._stop.wait(self.interval):
+                    break
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
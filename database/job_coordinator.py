@@ -0,0 +1,223 @@
+"""
+Job coordinator: a small HTTP endpoint in front of the job queue of the database on this machine.
+
+SQLite locks do not work over network filesystems, so render workers on other machines never open
+the database file. They lease, renew and finish jobs and report progress through the coordinator,
+which runs the same lease_job, renew_lease, finish_job and write_progress as local workers.
+Lease times are taken from the clock of the coordinator only.
+
+    python -m videomaker coordinator --port 8765                    # on the machine holding the database
+    python -m videomaker worker --coordinator http://db-host:8765   # on any machine
+"""
+import datetime
+import hmac
+import json
+import logging
+import threading
+import urllib.error
+import urllib.request
+from collections import namedtuple
+from contextlib import nullcontext
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Optional
+
+from core.config import Config
+from database import job_queue
+from database.models import RenderJob
+from database.snapshot import BrandKitSnapshot, load_brand_kit_snapshot
+
+logger = logging.getLogger(__name__)
+
+# Fields of a job a worker may report, the lease fields are only changed by the queue functions
+PROGRESS_FIELDS = ('status', 'stage', 'progress', 'output_path', 'error')
+
+# A job leased through the coordinator, with the brand kit it is rendered with
+LeasedJob = namedtuple('LeasedJob', 'id title script target_path attempts brand_kit')
+
+
+class JobCoordinator(ThreadingHTTPServer):
+    """
+    Serves the job queue to workers on other machines. Every request is a JSON POST
+    authorized with the shared token, answered in its own thread with its own connection.
+
+        coordinator = JobCoordinator(port=8765)
+        coordinator.serve_forever()
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = '0.0.0.0', port: int = 8765, token: str = None):
+        super().__init__((host, port), _CoordinatorHandler)
+        self.token = Config.JOB_COORDINATOR_TOKEN if token is None else token
+        self._thread = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server_address[:2]
+        return f'http://{host}:{port}'
+
+    def start(self):
+        """Serves in a background thread"""
+        self._thread = threading.Thread(target=self.serve_forever, name='job-coordinator', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self.shutdown()
+        self.server_close()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def authorized(self, header: Optional[str]) -> bool:
+        if not self.token:
+            return True
+        return hmac.compare_digest((header or '').encode(), f'Bearer {self.token}'.encode())
+
+    # --- Actions, one per path ---
+
+    @staticmethod
+    def lease(request: dict) -> dict:
+        job = job_queue.lease_job(_text(request, 'worker'), _seconds(request))
+        if job is None:
+            return {'job': None}
+        # Workers on other machines read the brand kit from the job, not from the database
+        brand_kit = load_brand_kit_snapshot(job.brand_kit.name) if job.brand_kit else None
+        return {'job': {'id': job.id, 'title': job.title, 'script': job.script, 'target_path': job.target_path,
+                        'attempts': job.attempts, 'brand_kit': brand_kit.to_dict() if brand_kit else None}}
+
+    @staticmethod
+    def renew(request: dict) -> dict:
+        return {'kept': job_queue.renew_lease(_job_id(request), _text(request, 'worker'), _seconds(request))}
+
+    @staticmethod
+    def finish(request: dict) -> dict:
+        return {'kept': job_queue.finish_job(_job_id(request), _text(request, 'worker'),
+                                             _optional_text(request, 'output_path'), _optional_text(request, 'error'))}
+
+    @staticmethod
+    def progress(request: dict) -> dict:
+        updates = {}
+        for job_id, fields in dict(request['updates']).items():
+            unknown = set(fields) - set(PROGRESS_FIELDS)
+            if unknown:
+                raise ValueError(f"Fields a worker cannot write: {', '.join(sorted(unknown))}")
+            if fields.get('status', 'running') not in ('running', 'done', 'failed'):
+                raise ValueError(f"A worker cannot set the status {fields['status']}")
+            updates[int(job_id)] = dict(fields, updated_at=datetime.datetime.now())
+        job_queue.write_progress(updates, _text(request, 'worker'))
+        return {}
+
+
+class _CoordinatorHandler(BaseHTTPRequestHandler):
+    server: JobCoordinator
+    ACTIONS = {'/lease': JobCoordinator.lease, '/renew': JobCoordinator.renew,
+               '/finish': JobCoordinator.finish, '/progress': JobCoordinator.progress}
+
+    def do_POST(self):
+        if not self.server.authorized(self.headers.get('Authorization')):
+            return self._reply(401, {'error': 'Invalid coordinator token'})
+        action = self.ACTIONS.get(self.path)
+        if action is None:
+            return self._reply(404, {'error': f'Unknown action: {self.path}'})
+        try:
+            request = json.loads(self.rfile.read(int(self.headers.get('Content-Length') or 0)) or b'{}')
+            if not isinstance(request, dict):
+                raise ValueError('The request has to be a JSON object')
+            with RenderJob._meta.database.connection_context():
+                response = action(request)
+        except (ValueError, KeyError, TypeError) as e:
+            return self._reply(400, {'error': str(e)})
+        except Exception as e:
+            logger.exception(f"Job coordinator request {self.path} failed")
+            return self._reply(500, {'error': str(e) or type(e).__name__})
+        self._reply(200, response)
+
+    def _reply(self, code: int, body: dict):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(code)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def log_message(self, format, *args):
+        logger.debug(f"{self.address_string()} {format % args}")
+
+
+def _text(request: dict, key: str) -> str:
+    value = request[key]
+    if not isinstance(value, str) or not value:
+        raise ValueError(f'{key} has to be a non-empty string')
+    return value
+
+
+def _optional_text(request: dict, key: str) -> Optional[str]:
+    value = request.get(key)
+    if value is not None and not isinstance(value, str):
+        raise ValueError(f'{key} has to be a string')
+    return value
+
+
+def _job_id(request: dict) -> int:
+    if not isinstance(request['job_id'], int):
+        raise ValueError('job_id has to be an integer')
+    return request['job_id']
+
+
+def _seconds(request: dict) -> Optional[float]:
+    value = request.get('lease_seconds')
+    if value is not None and (not isinstance(value, (int, float)) or value <= 0):
+        raise ValueError('lease_seconds has to be a positive number')
+    return value
+
+
+class RemoteJobQueue:
+    """
+    The job queue of a coordinator, for workers on other machines.
+    Has the lease_job, renew_lease, finish_job and write_progress of database.job_queue.
+    """
+    remote = True
+
+    def __init__(self, url: str, token: str = None, timeout: float = 30):
+        self.url = url.rstrip('/')
+        self.token = Config.JOB_COORDINATOR_TOKEN if token is None else token
+        self.timeout = timeout
+
+    @staticmethod
+    def connection():
+        # The database of the coordinator is never opened here
+        return nullcontext()
+
+    def lease_job(self, worker: str, lease_seconds: float = None) -> Optional[LeasedJob]:
+        job = self._call('lease', worker=worker, lease_seconds=lease_seconds)['job']
+        if job is None:
+            return None
+        brand_kit = BrandKitSnapshot.from_dict(job['brand_kit']) if job['brand_kit'] else None
+        return LeasedJob(**dict(job, brand_kit=brand_kit))
+
+    def renew_lease(self, job_id: int, worker: str, lease_seconds: float = None) -> bool:
+        return self._call('renew', job_id=job_id, worker=worker, lease_seconds=lease_seconds)['kept']
+
+    def finish_job(self, job_id: int, worker: str, output_path: str = None, error: str = None) -> bool:
+        return self._call('finish', job_id=job_id, worker=worker, output_path=output_path, error=error)['kept']
+
+    def write_progress(self, updates: dict, worker: str = None) -> None:
+        # The coordinator dates the updates itself
+        updates = {str(job_id): {name: value for name, value in fields.items() if name != 'updated_at'}
+                   for job_id, fields in updates.items()}
+        self._call('progress', worker=worker, updates=updates)
+
+    def _call(self, action: str, **request) -> dict:
+        headers = {'Content-Type': 'application/json'}
+        if self.token:
+            headers['Authorization'] = f'Bearer {self.token}'
+        http_request = urllib.request.Request(f'{self.url}/{action}', data=json.dumps(request).encode('utf-8'),
+                                              headers=headers, method='POST')
+        try:
+            with urllib.request.urlopen(http_request, timeout=self.timeout) as response:
+                return json.load(response)
+        except urllib.error.HTTPError as e:
+            try:
+                error = json.load(e).get('error')
+            except ValueError:
+                error = e.reason
+            raise RuntimeError(f"Job coordinator {self.url} refused {action}: {e.code} {error}")
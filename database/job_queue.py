@@ -0,0 +1,139 @@
+import datetime
+import logging
+import os
+import socket
+from typing import Optional
+
+from core.config import Config
+from database.models import RenderJob, ensure_table
+
+logger = logging.getLogger(__name__)
+
+
+def worker_name() -> str:
+    """Identifies a worker process by its host and process id"""
+    return f'{socket.gethostname()}-{os.getpid()}'
+
+
+def lease_clock() -> datetime.datetime:
+    """
+    Current time of the leases: UTC of the machine holding the database, naive like the other dates.
+    Workers on other machines lease through the job coordinator, so their clocks and time zones never matter.
+    """
+    return datetime.datetime.now(datetime.timezone.utc).replace(tzinfo=None)
+
+
+def ensure_job_queue() -> None:
+    """Creates the render_jobs table, or adds the queue columns to a table created before them"""
+    added = ensure_table(RenderJob)
+    if added:
+        logger.info(f"Added the job queue columns: {', '.join(added)}")
+
+
+def enqueue_job(brand_kit_id: int, title: str, script: str = None, target_path: str = None) -> RenderJob:
+    """Queues a render for any worker"""
+    return RenderJob.create(brand_kit=brand_kit_id, title=title, script=script, target_path=target_path)
+
+
+def requeue_expired(now: datetime.datetime = None) -> int:
+    """
+    Queues again the running jobs whose worker stopped renewing the lease, e.g. a killed process.
+    Jobs that already used all attempts fail instead.
+
+    Returns:
+        Number of jobs queued again
+    """
+    expired = (RenderJob.status == 'running') & (RenderJob.lease_expires_at < (now or lease_clock()))
+    updated_at = datetime.datetime.now()
+    with RenderJob._meta.database.atomic('IMMEDIATE'):
+        RenderJob.update(status='failed', worker=None, lease_expires_at=None, updated_at=updated_at,
+                         error=f'The lease expired {Config.JOB_MAX_ATTEMPTS} times') \
+            .where(expired & (RenderJob.attempts >= Config.JOB_MAX_ATTEMPTS)).execute()
+        requeued = RenderJob.update(status='queued', worker=None, lease_expires_at=None, stage=None, progress=0,
+                                    updated_at=updated_at).where(expired).execute()
+    if requeued:
+        logger.warning(f"Queued again {requeued} jobs with an expired lease")
+    return requeued
+
+
+def lease_job(worker: str, lease_seconds: float = None) -> Optional[RenderJob]:
+    """
+    Takes the oldest queued job for the worker until the lease expires.
+    Only jobs queued without a worker are leased, jobs rendered by the CLI itself are not.
+
+    Returns:
+        The leased job, None when the queue is empty
+    """
+    lease_seconds = lease_seconds or Config.JOB_LEASE_SECONDS
+    requeue_expired()
+    while True:
+        job = RenderJob.select().where((RenderJob.status == 'queued') & RenderJob.worker.is_null()) \
+            .order_by(RenderJob.id).first()
+        if job is None:
+            return None
+
+        # Compare and set: another worker may have taken the job since the select
+        leased = RenderJob.update(status='running', worker=worker, attempts=RenderJob.attempts + 1, error=None,
+                                  lease_expires_at=lease_clock() + datetime.timedelta(seconds=lease_seconds),
+                                  updated_at=datetime.datetime.now()) \
+            .where((RenderJob.id == job.id) & (RenderJob.status == 'queued') & RenderJob.worker.is_null()).execute()
+        if leased:
+            logger.info(f"Worker {worker} leased job {job.id} '{job.title}'")
+            return RenderJob.get_by_id(job.id)
+
+
+def renew_lease(job_id: int, worker: str, lease_seconds: float = None) -> bool:
+    """
+    Heartbeat of a worker rendering a job.
+
+    Returns:
+        False when the worker lost the job, e.g. its lease expired and another worker took it
+    """
+    lease_expires_at = lease_clock() + datetime.timedelta(seconds=lease_seconds or Config.JOB_LEASE_SECONDS)
+    return bool(RenderJob.update(lease_expires_at=lease_expires_at, updated_at=datetime.datetime.now())
+                .where((RenderJob.id == job_id) & (RenderJob.worker == worker) & (RenderJob.status == 'running'))
+                .execute())
+
+
+def finish_job(job_id: int, worker: str, output_path: str = None, error: str = None) -> bool:
+    """
+    Marks a leased job done, or failed with the error. Ignored when the worker lost the job.
+
+    Returns:
+        Whether the job was still leased by the worker
+    """
+    fields = dict(status='failed', error=error) if error else dict(status='done', progress=100,
+                                                                   output_path=output_path)
+    return bool(RenderJob.update(lease_expires_at=None, updated_at=datetime.datetime.now(), **fields)
+                .where((RenderJob.id == job_id) & (RenderJob.worker == worker) & (RenderJob.status == 'running'))
+                .execute())
+
+
+def write_progress(updates: dict, worker: str = None) -> None:
+    """
+    Writes {job id: RenderJob fields} in one transaction. With a worker only the jobs still leased by it are updated.
+    """
+    # IMMEDIATE takes the write lock at the start, so the transaction never has to
+    # be upgraded from a read lock, which fails right away when another writer holds it
+    with RenderJob._meta.database.atomic('IMMEDIATE'):
+        for job_id, fields in updates.items():
+            condition = RenderJob.id == job_id
+            if worker:
+                condition &= RenderJob.worker == worker
+            RenderJob.update(**fields).where(condition).execute()
+
+
+class LocalJobQueue:
+    """
+    The job queue in the database of this machine, for workers running on it.
+    Workers on other machines use RemoteJobQueue of database.job_coordinator with the same functions.
+    """
+    remote = False
+    lease_job = staticmethod(lease_job)
+    renew_lease = staticmethod(renew_lease)
+    finish_job = staticmethod(finish_job)
+    write_progress = staticmethod(write_progress)
+
+    @staticmethod
+    def connection():
+        return RenderJob._meta.database.connection_context()
@@ -2,13 +2,34 @@ import datetime
 import os
 
 import peewee as pw
+from playhouse.migrate import SchemaMigrator, migrate
+
+from core.config import Config
+from utils.tracing import trace_span
 
 
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 DATABASE_PATH = os.path.join(PROJECT_ROOT, 'video_editor.db')
 
+
+class TracedSqliteDatabase(pw.SqliteDatabase):
+    """ SQLite database recording every query as a span when a render job is traced. """
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        with trace_span('db.query', 'db', sql=sql):
+            return super().execute_sql(sql, params, *args, **kwargs)
+
+
 # --- Database Setup (Example using SQLite) ---
-db = pw.SqliteDatabase(DATABASE_PATH, pragmas={'foreign_keys': 1})
+# WAL lets the UI read while render workers write, writers wait for the lock up to the busy timeout
+# instead of failing with "database is locked". Every thread gets its own connection.
+DATABASE_PRAGMAS = {
+    'foreign_keys': 1,
+    'journal_mode': 'wal',
+    'synchronous': 'normal',
+}
+db = TracedSqliteDatabase(DATABASE_PATH, pragmas=DATABASE_PRAGMAS, thread_safe=True,
+                          timeout=Config.DATABASE_BUSY_TIMEOUT_MS / 1000)
 
 
 class _BaseModel(pw.Model):
@@ -222,8 +243,8 @@ class Caption(_BaseModel):
 
 class Transition(_BaseModel):
     """ Defines an available video transition type. """
-    TRANSITION_TYPE_CHOICES = [  # These values are used in FFmpeg xfade
-        ('none', 'None'), ('fade', 'Fade'), ('dissolve', 'Dissolve'), ('pixelize', 'Pixelize'),
+    TRANSITION_TYPE_CHOICES = [  # These values are used in FFmpeg xfade, except the plain cuts
+        ('none', 'None'), ('cut', 'Cut'), ('fade', 'Fade'), ('dissolve', 'Dissolve'), ('pixelize', 'Pixelize'),
         ('radial', 'Radial'), ('hblur', 'Horizontal Blur'), ('distance', 'Distance'),
         ('wipeleft', 'Wipe Left'), ('wiperight', 'Wipe Right'), ('wipeup', 'Wipe Up'), ('wipedown', 'Wipe Down'),
         ('slideleft', 'Slide Left'), ('slideright', 'Slide Right'), ('slideup', 'Slide Up'),
@@ -307,7 +328,77 @@ class SourceVideos(_BaseModel):
         table_name = 'source_videos'
 
 
+class SourceClipAsset(_BaseModel):
+    """
+    Probe metadata of a source clip, kept up to date by the asset scanner.
+    Renders read it instead of running ffprobe. A row is valid while the size and the mtime of the file match.
+    """
+    path = pw.CharField(unique=True, help_text="Path to the source clip.")
+    size = pw.BigIntegerField(help_text="Size of the file in bytes when it was scanned.")
+    mtime_ns = pw.BigIntegerField(help_text="Modification time of the file in nanoseconds when it was scanned.")
+    fingerprint = pw.CharField(max_length=40, index=True,
+                               help_text="SHA-1 of the size and the first and last megabyte of the file.")
+    duration = pw.FloatField(help_text="Duration in seconds.")
+    width = pw.IntegerField(help_text="Width of the video stream.")
+    height = pw.IntegerField(help_text="Height of the video stream.")
+    fps = pw.FloatField(null=True, help_text="Average frame rate of the video stream.")
+    video_codec = pw.CharField(null=True, help_text="Codec of the video stream, e.g. h264.")
+    pix_fmt = pw.CharField(null=True, help_text="Pixel format of the video stream, e.g. yuv420p.")
+    has_audio = pw.BooleanField(default=False, help_text="Whether the file has an audio stream.")
+    keyframes = pw.TextField(default='[]', help_text="JSON list of the keyframe timestamps in seconds.")
+    scanned_at = pw.DateTimeField(default=datetime.datetime.now, help_text="Date and time of the last scan.")
+
+    class Meta:
+        table_name = 'source_clip_assets'
+
+
+class RenderJob(_BaseModel):
+    """
+    A video render and its progress, updated by the worker rendering it.
+    Jobs queued without a worker are leased by render workers, see database.job_queue.
+    """
+    STATUS_CHOICES = [('queued', 'Queued'), ('running', 'Running'), ('done', 'Done'), ('failed', 'Failed')]
+
+    brand_kit = pw.ForeignKeyField(BrandKit, backref='render_jobs', null=True, on_delete='SET NULL',
+                                   help_text="The BrandKit used for the render.")
+    title = pw.CharField(help_text="Title of the video.")
+    status = pw.CharField(default='queued', choices=STATUS_CHOICES, index=True, help_text="State of the render.")
+    stage = pw.CharField(null=True, help_text="Pipeline stage being rendered.")
+    progress = pw.IntegerField(default=0, help_text="Progress of the render (from 0 to 100).")
+    output_path = pw.CharField(null=True, help_text="Path to the rendered video.")
+    error = pw.TextField(null=True, help_text="Error message of a failed render.")
+    script = pw.TextField(null=True, help_text="Script to voice over, the brand kit script when empty.")
+    target_path = pw.CharField(null=True, help_text="Path of the video requested when the job was queued.")
+    worker = pw.CharField(null=True, help_text="Worker rendering the job, empty while it waits for a worker.")
+    lease_expires_at = pw.DateTimeField(null=True, index=True,
+                                        help_text="The job goes back to the queue when its worker stops "
+                                                  "renewing the lease until this time.")
+    attempts = pw.IntegerField(default=0, help_text="Number of times a worker took the job.")
+    created_at = pw.DateTimeField(default=datetime.datetime.now, help_text="Date and time of record creation.")
+    updated_at = pw.DateTimeField(default=datetime.datetime.now, help_text="Date and time of the last progress update.")
+
+    class Meta:
+        table_name = 'render_jobs'
+
+
 # --- DB Initialization Utility ---
+def ensure_table(model) -> list:
+    """
+    Creates the table of the model, or adds the columns missing from a table created before them.
+
+    Returns:
+        Names of the added columns
+    """
+    database = model._meta.database
+    model.create_table(safe=True)
+    existing = {column.name for column in database.get_columns(model._meta.table_name)}
+    missing = [field for field in model._meta.sorted_fields if field.column_name not in existing]
+    if missing:
+        migrator = SchemaMigrator.from_database(database)
+        migrate(*(migrator.add_column(model._meta.table_name, field.column_name, field) for field in missing))
+    return [field.column_name for field in missing]
+
+
 def register_models() -> None:
     for model in _BaseModel.__subclasses__():
         model.create_table()
@@ -0,0 +1,97 @@
+import datetime
+import logging
+import threading
+from contextlib import nullcontext
+
+from core.config import Config
+from database.job_queue import write_progress
+from database.models import RenderJob
+
+logger = logging.getLogger(__name__)
+
+FINAL_STATUSES = ('done', 'failed')
+
+
+class ProgressBatcher:
+    """
+    Collects progress updates of render jobs and writes them together in one short transaction.
+    Only the latest update of every job is written, so a render reporting often costs
+    a handful of writes and the database stays free for readers and other workers.
+    Final statuses (done, failed) are written right away.
+    With a worker only the jobs still leased by it are updated.
+    Workers of a job coordinator pass its write_progress, the updates are sent to it instead.
+
+        with ProgressBatcher() as progress:
+            progress.update(job.id, status='running', stage='tts', progress=0)
+    """
+
+    def __init__(self, flush_interval: float = None, worker: str = None, write=None):
+        self.flush_interval = Config.PROGRESS_FLUSH_INTERVAL if flush_interval is None else flush_interval
+        self.worker = worker
+        self.write = write
+        self.flushes = 0
+        self.rows_written = 0
+        self._pending = {}
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._stop = threading.Event()
+        self._thread = None
+
+    def update(self, job_id: int, **fields):
+        """Queues fields of a RenderJob, e.g. status, stage, progress, output_path or error"""
+        with self._lock:
+            self._pending.setdefault(job_id, {}).update(fields, updated_at=datetime.datetime.now())
+        if fields.get('status') in FINAL_STATUSES:
+            try:
+                self.flush()
+            except Exception:
+                # The update stays queued and is written by the next flush
+                logger.exception('Failed to write render progress')
+
+    def flush(self):
+        """Writes the queued updates in one transaction"""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, {}
+            if not pending:
+                return
+
+            try:
+                (self.write or write_progress)(pending, self.worker)
+            except Exception:
+                # Keeps the updates for the next flush unless newer ones were queued meanwhile
+                with self._lock:
+                    for job_id, fields in pending.items():
+                        self._pending[job_id] = {**fields, **self._pending.get(job_id, {})}
+                raise
+            self.flushes += 1
+            self.rows_written += len(pending)
+
+    def start(self):
+        self._stop.clear()
+        self._thread = threading.Thread(target=self._run, name='progress-batcher', daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+
+    def _run(self):
+        # The flushing thread has its own connection, closed when the batcher stops
+        with RenderJob._meta.database.connection_context() if self.write is None else nullcontext():
+            while not self._stop.wait(self.flush_interval):
+                try:
+                    self.flush()
+                except Exception:
+                    # Progress is informational, a failed write must not stop the renders
+                    logger.exception('Failed to write render progress')
+
+    def __enter__(self):
+        self.start()
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.stop()
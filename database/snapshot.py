@@ -0,0 +1,159 @@
+import datetime
+
+import peewee as pw
+
+from database.models import AutoIntroSetting, BrandKit, BrandKitTransition, Caption, SourceVideos, Transition, Voice
+
+
+def _field_names(model, exclude=()) -> tuple:
+    return tuple(field.name for field in model._meta.sorted_fields if field.name not in exclude)
+
+
+class _Snapshot:
+    """
+    Immutable copy of a database row. Reading it never runs a query, so one snapshot
+    can be shared by the threads and processes of several render jobs.
+    """
+    __slots__ = ()
+    # Model of the row, and the attributes holding other snapshots, to rebuild a snapshot from JSON
+    _model = None
+    _nested = {}
+
+    def __init__(self, **values):
+        for name in self.__slots__:
+            object.__setattr__(self, name, values.get(name))
+
+    @classmethod
+    def from_model(cls, instance, **values):
+        fields = {name: getattr(instance, name) for name in cls.__slots__ if name not in values}
+        return cls(**fields, **values)
+
+    def replace(self, **changes):
+        """Returns a copy with some attributes changed, like namedtuple._replace"""
+        unknown = set(changes) - set(self.__slots__)
+        if unknown:
+            raise ValueError(f"{type(self).__name__} has no attributes: {', '.join(sorted(unknown))}")
+        return type(self)(**{name: changes.get(name, getattr(self, name)) for name in self.__slots__})
+
+    def to_dict(self) -> dict:
+        """JSON compatible values, e.g. to send the snapshot to a worker on another machine"""
+        values = {}
+        for name in self.__slots__:
+            value = getattr(self, name)
+            if isinstance(value, _Snapshot):
+                value = value.to_dict()
+            elif isinstance(value, datetime.datetime):
+                value = value.isoformat()
+            elif isinstance(value, tuple):
+                value = list(value)
+            values[name] = value
+        return values
+
+    @classmethod
+    def from_dict(cls, values: dict):
+        """Rebuilds a snapshot from to_dict"""
+        fields = cls._model._meta.fields
+        snapshot = {}
+        for name in cls.__slots__:
+            value = values.get(name)
+            if value is not None and name in cls._nested:
+                value = cls._nested[name].from_dict(value)
+            elif value is not None and isinstance(fields.get(name), pw.DateTimeField):
+                value = datetime.datetime.fromisoformat(value)
+            elif isinstance(value, list):
+                value = tuple(value)
+            snapshot[name] = value
+        return cls(**snapshot)
+
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{type(self).__name__} is read-only')
+
+    def __getstate__(self):
+        return tuple(getattr(self, name) for name in self.__slots__)
+
+    def __setstate__(self, state):
+        for name, value in zip(self.__slots__, state):
+            object.__setattr__(self, name, value)
+
+    def __eq__(self, other):
+        return type(self) is type(other) and self.__getstate__() == other.__getstate__()
+
+    def __hash__(self):
+        return hash((type(self).__name__, self.__getstate__()))
+
+    def __repr__(self):
+        return f"{type(self).__name__}(id={getattr(self, 'id', None)!r})"
+
+
+class VoiceSnapshot(_Snapshot):
+    __slots__ = _field_names(Voice)
+    _model = Voice
+
+
+class AutoIntroSettingSnapshot(_Snapshot):
+    __slots__ = _field_names(AutoIntroSetting, exclude=('brand_kit',))
+    _model = AutoIntroSetting
+
+
+class CaptionSnapshot(_Snapshot):
+    __slots__ = _field_names(Caption, exclude=('brand_kit',))
+    _model = Caption
+
+
+class BrandKitSnapshot(_Snapshot):
+    """
+    Brand kit with its voice, intro and caption settings, transitions and source videos.
+    Has the same attributes as the BrandKit model, so processors accept either of them.
+    """
+    __slots__ = _field_names(BrandKit) + (
+        'auto_intro_settings', 'caption_config', 'transition_names', 'source_videos_paths')
+    _model = BrandKit
+    _nested = {'voice': VoiceSnapshot, 'auto_intro_settings': AutoIntroSettingSnapshot,
+               'caption_config': CaptionSnapshot}
+
+    def __repr__(self):
+        return f'BrandKitSnapshot(id={self.id!r}, name={self.name!r})'
+
+    @property
+    def cache_key(self) -> tuple:
+        """Changes whenever the brand kit is saved"""
+        return self.id, self.updated_at
+
+
+def load_brand_kit_snapshot(name: str) -> BrandKitSnapshot:
+    """
+    Loads a brand kit and all of its related rows with one query per table.
+
+    Raises:
+        BrandKit.DoesNotExist: No brand kit with this name
+    """
+    query = (BrandKit
+             .select(BrandKit, Voice)
+             .join(Voice, pw.JOIN.LEFT_OUTER)
+             .where(BrandKit.name == name))
+    transitions = BrandKitTransition.select(BrandKitTransition, Transition).join(Transition)
+    brand_kits = pw.prefetch(query, AutoIntroSetting, Caption, transitions, SourceVideos)
+    if not brand_kits:
+        raise BrandKit.DoesNotExist(f'Brand kit: {name} does not exist')
+    return snapshot_brand_kit(brand_kits[0])
+
+
+def snapshot_brand_kit(brand_kit: BrandKit) -> BrandKitSnapshot:
+    """
+    Freezes a brand kit loaded by load_brand_kit_snapshot.
+    A brand kit loaded without prefetch works too, but every relation costs a query.
+    """
+    auto_intro = list(brand_kit.auto_intro_setting_ref)
+    caption = list(brand_kit.caption_specification)
+    voice = brand_kit.voice
+    return BrandKitSnapshot.from_model(
+        brand_kit,
+        voice=VoiceSnapshot.from_model(voice) if voice else None,
+        auto_intro_settings=AutoIntroSettingSnapshot.from_model(auto_intro[0]) if auto_intro else None,
+        caption_config=CaptionSnapshot.from_model(caption[0]) if caption else None,
+        transition_names=tuple(junction.transition.name for junction in brand_kit.selected_transitions_junction),
+        source_videos_paths=tuple(video.path for video in brand_kit.source_videos),
+    )
@@ -5,25 +5,27 @@ from database.models import BrandKit
 from utils.ffmpeg_utils import FFmpegUtils
 from utils.audio_utils import get_audio_duration
 from core.config import Config
+from core.workspace import JobWorkspace
+from utils.metrics import measure_stage
 
 logger = logging.getLogger(__name__)
 
 class AudioProcessor:
-    def __init__(self, brand_kit: BrandKit):
+    def __init__(self, brand_kit: BrandKit, workspace: JobWorkspace = None):
         self.brand_kit = brand_kit
         self.ffmpeg = FFmpegUtils()
-        self.temp_dir = Config.TEMP_FOLDER
+        self.temp_dir = workspace.path if workspace else Config.TEMP_FOLDER
 
-    def add_audio_in_video(self, video_path: str, voice_path: str) -> str:
+    @measure_stage('audio.add_audio')
+    def add_audio_in_video(self, video_path: str, voice_path: str, audio_path: str = None) -> str:
         """
         Replaces the audio track in a video with the provided audio.
+        audio_path is a soundtrack already made by prepare_audio, e.g. shared by several videos.
 
         """
         output_path = f'{self.temp_dir}/{int(time.time())}misic_added.mp4'
-        if self.brand_kit.music_path:
-            audio_path = self._mix_audio_with_music(voice_path)
-        else:
-            audio_path = voice_path
+        if audio_path is None:
+            audio_path = self.prepare_audio(voice_path)
         cmd = [
             "ffmpeg",
             "-i", video_path,
@@ -33,9 +35,18 @@ class AudioProcessor:
             "-map", "1:a",
             "-y", output_path
         ]
-        self.ffmpeg.run_command(cmd)
+        self.ffmpeg.run_command(cmd, stage='remux')
         return output_path
 
+    def prepare_audio(self, voice_path: str) -> str:
+        """
+        Returns the soundtrack of the video: the voice mixed with the background music if the brand kit has it.
+
+        """
+        if self.brand_kit.music_path:
+            return self._mix_audio_with_music(voice_path)
+        return voice_path
+
     def _mix_audio_with_music(self, voice_path: str) -> str:
         """
         Mixes TTS voice audio with background music. Loops music if it's shorter than the voice.
@@ -70,5 +81,5 @@ class AudioProcessor:
                 "-y", output_path
             ]
 
-        self.ffmpeg.run_command(cmd)
+        self.ffmpeg.run_command(cmd, stage='audio')
         return output_path
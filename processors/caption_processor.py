@@ -1,10 +1,12 @@
 import os
-import subprocess
 import logging
 import time
 from core.config import Config
+from core.workspace import JobWorkspace
 from database.functions import get_active_assembly_ai_api_key
 from database.models import BrandKit
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.metrics import measure_stage
 
 from utils.subtitle_utils import (
     generate_subtitles,
@@ -15,15 +17,36 @@ from utils.subtitle_utils import (
 logger = logging.getLogger(__name__)
 
 class CaptionProcessor:
-    def __init__(self, brand_kit: BrandKit):
+    def __init__(self, brand_kit: BrandKit, workspace: JobWorkspace = None):
         self.brand_kit = brand_kit
         self.caption_specification = brand_kit.caption_config
-        self.temp_dir = Config.TEMP_FOLDER
+        self.temp_dir = workspace.path if workspace else Config.TEMP_FOLDER
 
+    @measure_stage('captions.add_captions')
     def add_captions(self, audio_path: str, video_path: str) -> str:
         """
         Transcribes audio, generates styled ASS subtitles, and adds them to the video.
         """
+        ass_file = self.create_subtitles_file(audio_path)
+
+        # Add subtitles to video
+        output_file = os.path.join(self.temp_dir, f"{int(time.time())}_captioned.mp4")
+        cmd = self.build_captions_command(video_path, ass_file, output_file)
+        FFmpegUtils.run_command(cmd)
+        os.remove(ass_file)
+        return output_file
+
+    def create_subtitles_file(self, audio_path: str) -> str:
+        """
+        Transcribes audio and generates the styled ASS subtitles file for it.
+        """
+        return self.create_subtitles_file_from_segments(self.transcribe(audio_path))
+
+    @measure_stage('captions.transcribe')
+    def transcribe(self, audio_path: str) -> list:
+        """
+        Transcribes audio into caption segments, they do not depend on the caption style.
+        """
         # Transcribe audio to SRT
         srt_file = os.path.join(self.temp_dir, f"{int(time.time())}_srt_temp.srt")
         language_code = self.brand_kit.language_code
@@ -37,7 +60,13 @@ class CaptionProcessor:
 
         # Parse SRT to segments
         segments = parse_srt(srt_file)
+        os.remove(srt_file)
+        return segments
 
+    def create_subtitles_file_from_segments(self, segments: list) -> str:
+        """
+        Generates the styled ASS subtitles file for already transcribed segments.
+        """
         # Prepare ASS styling
         font = self.caption_specification.font
         font_size = self.caption_specification.font_size
@@ -50,7 +79,7 @@ class CaptionProcessor:
 
         # Generate ASS file
         ass_file = os.path.join(self.temp_dir, f"{int(time.time())}_subtitles.ass")
-        generate_ass_subtitles_from_segments(
+        return generate_ass_subtitles_from_segments(
             segments,
             ass_file,
             font=font,
@@ -63,21 +92,26 @@ class CaptionProcessor:
             max_words_per_line=max_words_per_line
         )
 
-        # Add subtitles to video
-        output_file = os.path.join(self.temp_dir, f"{int(time.time())}_captioned.mp4")
-        cmd = [
+    @staticmethod
+    def captions_filter(ass_file: str) -> str:
+        """Filter burning ASS subtitles into the frames"""
+        return f"ass={ass_file}"
+
+    @staticmethod
+    def build_captions_command(video_path: str, ass_file: str, output_file: str, output_args: list = None) -> list:
+        """
+        Builds the command burning ASS subtitles into the video.
+        """
+        if output_args is None:
+            output_args = ["-c:v", Config.VIDEO_CODEC, "-c:a", "copy"]
+        return [
             "ffmpeg",
             "-i", video_path,
-            "-vf", f"ass={ass_file}",
-            "-c:v", Config.VIDEO_CODEC,
-            "-c:a", "copy",
+            "-vf", CaptionProcessor.captions_filter(ass_file),
+            *output_args,
             "-y",
             output_file
         ]
-        subprocess.run(cmd, check=True)
-        os.remove(srt_file)
-        os.remove(ass_file)
-        return output_file
 
     @staticmethod
     def _get_alignment_from_position(position: str) -> int:
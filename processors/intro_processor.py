@@ -2,25 +2,32 @@ import logging
 import time
 
 from database.models import BrandKit
+from utils.artifacts import promote_artifact
 from utils.ffmpeg_utils import FFmpegUtils
 from core.config import Config
+from core.workspace import JobWorkspace
+from utils.metrics import measure_stage
+from utils.render_profile import current_render_profile
 import os
 import time
 import subprocess
 from pathlib import Path
+from typing import List
 
 logger = logging.getLogger(__name__)
 
 class IntroProcessor:
-    def __init__(self, brand_kit: BrandKit):
+    def __init__(self, brand_kit: BrandKit, workspace: JobWorkspace = None):
         self.brand_kit = brand_kit
         self.ffmpeg = FFmpegUtils()
-        self.temp_dir = Config.TEMP_FOLDER
+        self.temp_dir = workspace.path if workspace else Config.TEMP_FOLDER
 
-    def create_intro(self) -> str:
+    @measure_stage('intro.create_intro')
+    def create_intro(self, title: str = None) -> str:
         """
         Creates an intro sequence with typewriter effect
         Supports different background types: color, image, video
+        The title defaults to the text from the auto intro settings
         """
         output_file = f'{self.temp_dir}/{int(time.time())}_intro.mp4'
 
@@ -29,78 +36,130 @@ class IntroProcessor:
         if intro_clip:
             if not os.path.exists(intro_clip):
                 raise FileNotFoundError(f'Intro clip file: {intro_clip} does not exist')
-            return self.ffmpeg.copy_file(intro_clip, output_file)
+            return promote_artifact(intro_clip, output_file, workspace=self.temp_dir)
 
         intro_config = self.brand_kit.auto_intro_settings
         if not intro_config:
             raise ValueError("Auto intro settings not configured for this brand kit")
 
-        # Get parameters
-        background_type = intro_config.background_type
-        background_value = intro_config.background_value
-        text = intro_config.text
-        font = intro_config.title_font
-        font_size = intro_config.title_font_size
-        font_color = intro_config.title_font_color
-        duration = intro_config.duration
+        # Create ASS file with typewriter effect
+        title_ass_file = self._create_typewriter_into_title(title or intro_config.text, intro_config.title_font,
+                                                            intro_config.title_font_size,
+                                                            intro_config.title_font_color)
 
-        # Determine resolution based on aspect_ratio
-        resolution = self._get_resolution_from_aspect_ratio()
+        # Background, scaling, title and trimming are compiled into one graph and encoded once
+        cmd = self._build_intro_command(intro_config, [title_ass_file], [output_file])
 
-        # Validate and process background
-        background_input = self._prepare_background(background_type, background_value, duration, resolution)
+        try:
+            self.ffmpeg.run_command(cmd)
+            return output_file
+        except subprocess.CalledProcessError as e:
+            raise RuntimeError(f"Error creating intro video: {e.stderr}")
 
-        # Create ASS file with typewriter effect
-        title_ass_file = self._create_typewriter_into_title(text, font, font_size, font_color)
+    @measure_stage('intro.create_intros')
+    def create_intros(self, titles: List[str]) -> List[str]:
+        """
+        Creates intros for several titles in a single FFmpeg run.
+        The background is decoded once and split into one branch per title,
+        each branch gets its own typewriter ASS and is written to its own output file.
+        """
+        if not titles:
+            return []
 
-        # Create video with subtitles
-        cmd = [
-            "ffmpeg",
-            "-f", "lavfi" if background_type == "color" else "concat",
-            "-i", background_input,
-            "-vf", f"subtitles={title_ass_file}",
-            "-c:v", Config.VIDEO_CODEC,
-            "-t", str(duration),  # Limit duration
-            "-y", output_file
-        ]
+        timestamp = int(time.time())
 
-        # If background is not color, change command structure
-        if background_type != "color":
-            cmd = [
-                "ffmpeg",
-                "-i", background_input,
-                "-vf", f"subtitles={title_ass_file}",
-                "-c:v", Config.VIDEO_CODEC,
-                "-preset", "medium",
-                "-crf", "22",
-                "-t", str(duration),
-                "-y", output_file
-            ]
+        # A ready intro clip does not depend on the title: it is brought into the workspace once (reflinked or
+        # copied, never linked to the original), every title gets its own link to the copy, so moving
+        # the intro of one title keeps the others
+        intro_clip = self.brand_kit.intro_clip_path
+        if intro_clip:
+            if not os.path.exists(intro_clip):
+                raise FileNotFoundError(f'Intro clip file: {intro_clip} does not exist')
+            intro_copy = promote_artifact(intro_clip, f'{self.temp_dir}/{timestamp}_intro_0.mp4',
+                                          workspace=self.temp_dir)
+            return [intro_copy] + [promote_artifact(intro_copy, f'{self.temp_dir}/{timestamp}_intro_{i}.mp4')
+                                   for i in range(1, len(titles))]
+
+        intro_config = self.brand_kit.auto_intro_settings
+        if not intro_config:
+            raise ValueError("Auto intro settings not configured for this brand kit")
+
+        title_ass_files = []
+        output_files = []
+        for i, title in enumerate(titles):
+            title_ass_files.append(self._create_typewriter_into_title(
+                title, intro_config.title_font, intro_config.title_font_size, intro_config.title_font_color,
+                output_file=f'{self.temp_dir}/{timestamp}_title_ass_{i}.ass'
+            ))
+            output_files.append(f'{self.temp_dir}/{timestamp}_intro_{i}.mp4')
+
+        cmd = self._build_intro_command(intro_config, title_ass_files, output_files)
 
         try:
             self.ffmpeg.run_command(cmd)
-            return output_file
+            return output_files
         except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Error creating intro video: {e.stderr}")
+            raise RuntimeError(f"Error creating intro videos: {e.stderr}")
 
-    def _get_resolution_from_aspect_ratio(self) -> tuple:
+    def _build_intro_command(self, intro_config, title_ass_files: List[str], output_files: List[str]) -> list:
         """
-        Returns resolution based on aspect_ratio
+        Builds a single FFmpeg command: background input -> scale/pad -> subtitles -> trim -> encode.
+        With several ASS files the prepared background is split into one branch per output.
+        """
+        background_type = intro_config.background_type
+        duration = intro_config.duration
+        resolution = self._get_resolution_from_aspect_ratio()
+
+        input_args, background_filter = self._prepare_background(background_type, intro_config.background_value,
+                                                                 duration, resolution)
+        trim_filter = f"trim=duration={duration},fps={current_render_profile().fps}"
+
+        filter_complex = []
+        if len(title_ass_files) == 1:
+            branch_labels = [f"[0:v]{background_filter},"]
+        else:
+            filter_complex.append(f"[0:v]{background_filter},split={len(title_ass_files)}"
+                                  + "".join(f"[bg{i}]" for i in range(len(title_ass_files))))
+            branch_labels = [f"[bg{i}]" for i in range(len(title_ass_files))]
+
+        outputs = []
+        for i, (title_ass_file, output_file) in enumerate(zip(title_ass_files, output_files)):
+            filter_complex.append(f"{branch_labels[i]}subtitles={title_ass_file},{trim_filter}[v{i}]")
+            outputs.extend(["-map", f"[v{i}]"])
+            if background_type != "color":
+                outputs.extend(["-map", "0:a?", "-preset", "medium", "-crf", "22"])
+            outputs.extend(["-c:v", Config.VIDEO_CODEC, "-t", str(duration), output_file])
+
+        return [
+            "ffmpeg",
+            *input_args,
+            "-filter_complex", ";".join(filter_complex),
+            "-y",
+            *outputs
+        ]
+
+    def _get_resolution_from_aspect_ratio(self, scaled: bool = True) -> tuple:
+        """
+        Returns resolution based on aspect_ratio.
+        scaled gives the proxy resolution of the current render profile, e.g. for previews
 
         """
         aspect_ratio = self.brand_kit.aspect_ratio
 
         if aspect_ratio == "16:9":
-            return 1920, 1080
+            resolution = 1920, 1080
         elif aspect_ratio == "9:16":
-            return 1080, 1920
+            resolution = 1080, 1920
         else:
             # Default to 16:9
-            return 1920, 1080
+            resolution = 1920, 1080
+        return current_render_profile().resolution(*resolution) if scaled else resolution
 
-    def _prepare_background(self, background_type: str, background_value: str, duration: int, resolution: tuple) -> str:
+    def _prepare_background(self, background_type: str, background_value: str, duration: int,
+                            resolution: tuple) -> tuple:
         """
-        Prepares background for intro based on type
+        Prepares background input for intro based on type.
+        Returns FFmpeg input arguments and the filter that brings the background to the target resolution.
 
         """
         width, height = resolution
@@ -108,20 +167,21 @@ class IntroProcessor:
         if background_type == "color":
             return self._prepare_color_background(background_value, width, height, duration)
         elif background_type == "image":
-            return self._prepare_image_background(background_value, width, height, duration)
+            return self._prepare_image_background(background_value, width, height)
         elif background_type == "video":
-            return self._prepare_video_background(background_value, width, height, duration)
+            return self._prepare_video_background(background_value, width, height)
         else:
             raise ValueError(f"Unsupported background type: {background_type}")
 
-    def _prepare_color_background(self, color_value: str, width: int, height: int, duration: int) -> str:
+    def _prepare_color_background(self, color_value: str, width: int, height: int, duration: int) -> tuple:
         """Prepares color background"""
         # Validate and format color
         formatted_color = self._validate_color(color_value)
-        return f"color=c={formatted_color}:s={width}x{height}:d={duration}"
+        color_source = f"color=c={formatted_color}:s={width}x{height}:d={duration}:r={current_render_profile().fps}"
+        return ["-f", "lavfi", "-i", color_source], "null"
 
-    def _prepare_image_background(self, image_path: str, width: int, height: int, duration: int) -> str:
-        """Prepares background from image"""
+    def _prepare_image_background(self, image_path: str, width: int, height: int) -> tuple:
+        """Prepares background from image, looped for the whole intro"""
         if not image_path:
             raise ValueError("Image path is required for image background type")
 
@@ -133,28 +193,11 @@ class IntroProcessor:
         if not any(image_path.lower().endswith(ext) for ext in valid_extensions):
             raise ValueError(f"Invalid image format. Supported: {', '.join(valid_extensions)}")
 
-        # Create temporary video file from image
-        temp_video = f'{self.temp_dir}/{int(time.time())}_bg_image.mp4'
+        input_args = ["-loop", "1", "-framerate", str(current_render_profile().fps), "-i", image_path]
+        return input_args, self._scale_pad_filter(width, height)
 
-        cmd = [
-            "ffmpeg",
-            "-loop", "1",
-            "-i", image_path,
-            "-vf",
-            f"scale={width}:{height}:force_original_aspect_ratio=decrease,pad={width}:{height}:(ow-iw)/2:(oh-ih)/2",
-            "-c:v", Config.VIDEO_CODEC,
-            "-t", str(duration),
-            "-y", temp_video
-        ]
-
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-            return temp_video
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Error processing background image: {e.stderr}")
-
-    def _prepare_video_background(self, video_path: str, width: int, height: int, duration: int) -> str:
-        """Prepares background from video"""
+    def _prepare_video_background(self, video_path: str, width: int, height: int) -> tuple:
+        """Prepares background from video, looped if it is shorter than the intro"""
         if not video_path:
             raise ValueError("Video path is required for video background type")
 
@@ -166,34 +209,14 @@ class IntroProcessor:
         if not any(video_path.lower().endswith(ext) for ext in valid_extensions):
             raise ValueError(f"Invalid video format. Supported: {', '.join(valid_extensions)}")
 
-        # Normalize video and trim by duration
-        temp_normalized = f'{self.temp_dir}/{int(time.time())}_bg_normalized.mp4'
-
-        # First normalize resolution
-        normalized_video = self.ffmpeg.normalize_video_resolution(
-            video_path,
-            temp_normalized,
-            f"{width}:{height}"
-        )
-
-        # Then trim by duration and loop if needed
-        temp_final = f'{self.temp_dir}/{int(time.time())}_bg_final.mp4'
+        input_args = ["-stream_loop", "-1", "-i", video_path]
+        return input_args, self._scale_pad_filter(width, height)
 
-        cmd = [
-            "ffmpeg",
-            "-stream_loop", "-1",  # Loop video
-            "-i", normalized_video,
-            "-t", str(duration),  # Trim to needed duration
-            "-c:v", Config.VIDEO_CODEC,
-            "-c:a", "copy",
-            "-y", temp_final
-        ]
-
-        try:
-            subprocess.run(cmd, check=True, capture_output=True, text=True)
-            return temp_final
-        except subprocess.CalledProcessError as e:
-            raise RuntimeError(f"Error processing background video: {e.stderr}")
+    @staticmethod
+    def _scale_pad_filter(width: int, height: int) -> str:
+        """Fits the background into the target resolution, same as normalize_video_resolution"""
+        return (f"scale={width}:{height}:force_original_aspect_ratio=decrease,"
+                f"pad={width}:{height}:(ow-iw)/2:(oh-ih)/2,setsar=1,format=yuv420p")
 
     @staticmethod
     def _validate_color(color_value: str) -> str:
@@ -222,14 +245,16 @@ class IntroProcessor:
         # Reject invalid input
         raise ValueError(f"Invalid hex color format: '{color_value}'. Expected format: RRGGBB or #RRGGBB")
 
-    def _create_typewriter_into_title(self, text: str, font: str, font_size: int, font_color: str):
+    def _create_typewriter_into_title(self, text: str, font: str, font_size: int, font_color: str,
+                                      output_file: str = None):
         """Создает ASS-файл с эффектом печатной машинки (правильная версия)"""
 
-        output_file = f'{self.temp_dir}/{int(time.time())}_title_ass.ass'
+        output_file = output_file or f'{self.temp_dir}/{int(time.time())}_title_ass.ass'
 
         # Убираем переносы строк и лишние пробелы
         text = text.replace('\n', ' ').replace('\r', ' ').strip()
-        width, height = self._get_resolution_from_aspect_ratio()
+        # libass scales the script to the video, the title keeps its size in previews
+        width, height = self._get_resolution_from_aspect_ratio(scaled=False)
 
         ass_content = f"""[Script Info]
     Title: Typewriter Effect
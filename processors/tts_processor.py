@@ -8,21 +8,27 @@ from database.models import BrandKit
 from services.minimax_tts import MinimaxTTS
 from services.replicate_tts import ReplicateTTS
 from database.functions import get_active_voice_over_api_key
+from core.workspace import JobWorkspace
+from utils.metrics import measure_stage
 
 logger = logging.getLogger(__name__)
 
 
 class TTSProcessor:
-    def __init__(self, brand_kit: BrandKit):
+    def __init__(self, brand_kit: BrandKit, workspace: JobWorkspace = None):
         self.brand_kit = brand_kit
         self.voice_config = brand_kit.voice
-        self.tts_provider = MinimaxTTS(self.voice_config) if self.voice_config.provider == 'minimax' \
-            else ReplicateTTS(self.voice_config)
+        temp_dir = workspace.path if workspace else None
+        self.tts_provider = MinimaxTTS(self.voice_config, temp_dir) \
+            if self.voice_config.provider == 'minimax' \
+            else ReplicateTTS(self.voice_config, temp_dir)
 
-    def generate_audio(self) -> str:
+    @measure_stage('tts.generate_audio')
+    def generate_audio(self, script: str = None) -> str:
         """
         Generates audio from text using Minimax or Replicat services.
+        The script defaults to the one stored in the brand kit.
 
         """
-        result_file = self.tts_provider.generate_audio(script=self.brand_kit.script_to_voice_over)
+        result_file = self.tts_provider.generate_audio(script=script or self.brand_kit.script_to_voice_over)
         return result_file
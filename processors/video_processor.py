@@ -1,95 +1,83 @@
 import os
 import random
-import shutil
-import subprocess
 import time
 from typing import List, Dict, Any, Optional
 import logging
 
 from core.config import Config
+from core.timeline import ClipWindow, TimelinePlanner
+from core.workspace import JobWorkspace
+from utils.artifacts import is_inside, promote_artifact
+from utils.cache import DiskCache, file_key
 from utils.ffmpeg_utils import FFmpegUtils
+from database.assets import ClipMetadata, get_clip_metadata, lookup_clip_metadata
 from database.models import BrandKit
+from utils.metrics import measure_stage, record_clip
+from utils.render_profile import current_render_profile
 
 logger = logging.getLogger(__name__)
 
 
+def uses_cuts(brand_kit) -> bool:
+    """Brand kits without transitions or with only plain cuts join clips without re-encoding"""
+    return all(name in Config.CUT_TRANSITIONS for name in brand_kit.transition_names or ())
+
+
+def transition_overlap(brand_kit) -> float:
+    """How long two neighbouring clips overlap, plain cuts do not"""
+    return 0.0 if uses_cuts(brand_kit) else brand_kit.transition_duration
+
+
 class VideoProcessor:
-    def __init__(self, brand_kit: BrandKit):
+    def __init__(self, brand_kit: BrandKit, workspace: JobWorkspace = None):
         self.brand_kit = brand_kit
         self.ffmpeg = FFmpegUtils()
-        self.temp_dir = Config.TEMP_FOLDER
+        self.temp_dir = workspace.path if workspace else Config.TEMP_FOLDER
 
-    def join_clips_with_transitions(self) -> str:
+    @measure_stage('video.transitions')
+    def join_clips_with_transitions(self, target_duration: float = None, normalized_clips: List[str] = None) -> str:
         """
         Подготавливает основные клипы контента с переходами
 
         Args:
-            clips: Список путей к клипам
-            transitions: Список типов переходов
-            temp_dir: Временная директория
+            target_duration: Длительность, которую должен покрыть контент, по умолчанию все клипы целиком
+            normalized_clips: Уже нормализованные клипы, например из normalize_source_clips_for_aspects
 
         Returns:
             Путь к подготовленному видео
         """
-        source_videos = self.brand_kit.source_videos_paths
-        transitions = self.brand_kit.transition_names
-        if not source_videos:
+        if not self.brand_kit.source_videos_paths:
             raise ValueError("clips list is empty")
-        if not transitions:
-            raise ValueError("transitions list is empty")
-
-        # Рандомно перемешиваем переходы
-        random.shuffle(transitions)
 
         output_file = f'{self.temp_dir}/{int(time.time())}_content_with_transitions.mp4'
         temp_files = []
-        normalized_clips = []
 
         try:
-            # Определяем целевое разрешение
-            width, height = self._get_resolution_from_aspect_ratio()
-            target_resolution = f'{width}:{height}'
-
-            # Нормализуем все клипы к одному размеру
-            for i, clip in enumerate(source_videos):
-                normalized_clip = os.path.join(self.temp_dir, f"normalized_{i}.mp4")
+            # Нормализуем все клипы к одному размеру, переданные и закэшированные клипы не удаляются
+            if normalized_clips is None:
+                normalized_clips = self.normalize_source_clips(target_duration)
+                temp_files.extend(clip for clip in normalized_clips if is_inside(clip, self.temp_dir))
 
-                # Используем новую функцию из ffmpeg_utils
-                self.ffmpeg.normalize_video_resolution(clip, normalized_clip, target_resolution)
-
-                normalized_clips.append(normalized_clip)
-                temp_files.append(normalized_clip)
-
-            # Если только один клип, возвращаем нормализованный
+            # Если только один клип, возвращаем нормализованный, временный клип переименовывается
             if len(normalized_clips) == 1:
-                return self.ffmpeg.copy_file(normalized_clips[0], output_file)
-
-            # Применяем переходы между нормализованными клипами
-            current_video = normalized_clips[0]
+                return promote_artifact(normalized_clips[0], output_file, move=normalized_clips[0] in temp_files,
+                                        workspace=self.temp_dir)
 
-            for i in range(1, len(normalized_clips)):
-                transition_type = transitions[(i - 1) % len(transitions)]
-                next_clip = normalized_clips[i]
+            # Без переходов клипы склеиваются без перекодирования
+            if uses_cuts(self.brand_kit):
+                return self.join_clips_with_cuts(normalized_clips, output_file)
 
-                temp_output = os.path.join(self.temp_dir, f"transition_result_{i}.mp4")
-                temp_files.append(temp_output)
-
-                # Создаем переход между клипами
-                self.ffmpeg.create_transition(
-                    clip1=current_video,
-                    clip2=next_clip,
-                    output=temp_output,
-                    transition_type=transition_type,
-                    duration=0.5
-                )
-
-                current_video = temp_output
+            # Применяем переходы между нормализованными клипами, последний шаг пишет сразу в output_file
+            commands, intermediates, _ = self.build_transition_commands(normalized_clips, output_file)
+            temp_files.extend(intermediates)
+            for cmd in commands:
+                try:
+                    self.ffmpeg.run_command(cmd)
+                except Exception as e:
+                    raise RuntimeError(f"Error creating transition: {str(e)}")
 
-            # Копируем финальный результат
-            final_result = self.ffmpeg.copy_file(current_video, output_file)
             logger.info(f"Successfully created content with transitions: {output_file}")
-
-            return final_result
+            return output_file
 
         except Exception as e:
             logger.error(f"Error preparing content clips: {str(e)}")
@@ -104,6 +92,231 @@ class VideoProcessor:
                 except Exception as e:
                     logger.warning(f"Error deleting temporary file {file_path}: {e}")
 
+    @measure_stage('video.normalize')
+    def normalize_source_clips(self, target_duration: float = None) -> List[str]:
+        """
+        Normalizes the source clips of the brand kit to the target resolution.
+        With a target duration only the clip windows planned to cover it are decoded.
+
+        Returns:
+            Paths to the normalized clips
+        """
+        source_videos = self.brand_kit.source_videos_paths
+        if not source_videos:
+            raise ValueError("clips list is empty")
+
+        return self.normalize_clip_windows(self.plan_source_clips(target_duration))
+
+    def normalize_clip_windows(self, windows: List[ClipWindow], cache: Dict[tuple, str] = None) -> List[str]:
+        """
+        Normalizes planned clip windows to the resolution of the brand kit.
+        Windows of clips already in the output format are not re-encoded, see _reuse_conforming_clip.
+
+        Args:
+            windows: Windows from plan_source_clips
+            cache: Optional {(window, resolution): path} shared by several renders,
+                   a window already normalized to the same resolution is not encoded again
+
+        Returns:
+            Paths to the normalized clips. With a profile caching proxies they are
+            in Config.PROXY_CACHE_FOLDER and stay there after the render
+        """
+        # Определяем целевое разрешение
+        width, height = self._get_resolution_from_aspect_ratio()
+        target_resolution = f'{width}:{height}'
+        cache = {} if cache is None else cache
+        profile = current_render_profile()
+        proxy_cache = DiskCache(Config.PROXY_CACHE_FOLDER, Config.PROXY_CACHE_MAX_MB) if profile.cache_proxies else None
+        metadata = self._source_clip_metadata(windows)
+
+        normalized_clips = []
+        for window in windows:
+            key = (window, target_resolution)
+            if key in cache:
+                normalized_clips.append(cache[key])
+                continue
+            reused_clip = self._reuse_conforming_clip(
+                window, metadata.get(window.path), width, height,
+                os.path.join(self.temp_dir, f"cut_{width}x{height}_{len(cache)}.mp4"))
+            if reused_clip:
+                cache[key] = reused_clip
+            elif proxy_cache:
+                # The source file is part of the key, an edited clip gets a new proxy
+                proxy_key = (file_key(window.path), window.start, window.duration, target_resolution, profile,
+                             Config.VIDEO_TIMESCALE)
+                cache[key] = proxy_cache.get_or_create(
+                    proxy_key, lambda path, window=window: self.ffmpeg.normalize_video_resolution(
+                        window.path, path, target_resolution, window.start, window.duration))
+            else:
+                normalized_clip = os.path.join(self.temp_dir, f"normalized_{width}x{height}_{len(cache)}.mp4")
+                cache[key] = self.ffmpeg.normalize_video_resolution(window.path, normalized_clip, target_resolution,
+                                                                    window.start, window.duration)
+            normalized_clips.append(cache[key])
+        if proxy_cache:
+            logger.info(f"Proxy cache: {proxy_cache.hits} hits, {proxy_cache.misses} misses")
+        return normalized_clips
+
+    @measure_stage('video.normalize')
+    def normalize_source_clips_for_aspects(self, aspect_ratios: List[str],
+                                           target_duration: float = None) -> Dict[str, List[str]]:
+        """
+        Normalizes the source clips to the resolutions of several aspect ratios.
+        Every clip window is decoded once and split into one branch per aspect ratio,
+        all aspect ratios get the same footage.
+
+        Returns:
+            Paths to the normalized clips per aspect ratio
+        """
+        if not self.brand_kit.source_videos_paths:
+            raise ValueError("clips list is empty")
+
+        normalized_clips = {aspect_ratio: [] for aspect_ratio in aspect_ratios}
+        windows = self.plan_source_clips(target_duration)
+        metadata = self._source_clip_metadata(windows)
+        for i, window in enumerate(windows):
+            outputs = []
+            for aspect_ratio in aspect_ratios:
+                width, height = self._get_resolution_from_aspect_ratio(aspect_ratio)
+                reused_clip = self._reuse_conforming_clip(
+                    window, metadata.get(window.path), width, height,
+                    os.path.join(self.temp_dir, f"cut_{width}x{height}_{i}.mp4"))
+                if reused_clip:
+                    normalized_clips[aspect_ratio].append(reused_clip)
+                    continue
+                normalized_clip = os.path.join(self.temp_dir, f"normalized_{width}x{height}_{i}.mp4")
+                outputs.append((f'{width}:{height}', normalized_clip))
+                normalized_clips[aspect_ratio].append(normalized_clip)
+            if outputs:
+                self.ffmpeg.normalize_video_resolutions(window.path, outputs, window.start, window.duration)
+        return normalized_clips
+
+    @staticmethod
+    def _source_clip_metadata(windows: List[ClipWindow]) -> Dict[str, ClipMetadata]:
+        if not Config.SKIP_CONFORMING_CLIPS:
+            return {}
+        return get_clip_metadata(window.path for window in windows)
+
+    def _reuse_conforming_clip(self, window: ClipWindow, metadata: Optional[ClipMetadata], width: int, height: int,
+                               output_path: str) -> Optional[str]:
+        """
+        Uses a window of a clip already in the output resolution, frame rate, codec and pixel format
+        without re-encoding: the whole clip as it is, a part of it stream copied when it starts on a keyframe.
+        Clips joined with cuts are always stream copied, the copy gets the time scale of the normalized clips.
+        Every decision is recorded in the job metrics.
+
+        Returns:
+            Path to the clip, None when the window has to be normalized
+        """
+        if not Config.SKIP_CONFORMING_CLIPS:
+            reason = 'disabled'
+        elif metadata is None:
+            reason = 'not probed'
+        else:
+            reason = metadata.mismatch(width, height, current_render_profile().fps)
+        if reason is None:
+            whole_clip = not window.start and (window.duration is None
+                                               or window.duration >= metadata.duration - 0.05)
+            if whole_clip and not uses_cuts(self.brand_kit):
+                record_clip(window.path, window.start, window.duration, 'passthrough')
+                return window.path
+            if whole_clip:
+                # The concat demuxer needs one time scale, a clip from a camera often has another one
+                record_clip(window.path, window.start, window.duration, 'copy')
+                return self.ffmpeg.cut_video(window.path, output_path)
+            if not metadata.keyframes:
+                reason = 'keyframes not indexed'
+            elif abs(metadata.keyframe_before(window.start) - window.start) < 0.01:
+                record_clip(window.path, window.start, window.duration, 'copy')
+                return self.ffmpeg.cut_video(window.path, output_path, window.start, window.duration)
+            else:
+                reason = 'starts between keyframes'
+
+        record_clip(window.path, window.start, window.duration, 'normalize', reason)
+        return None
+
+    @measure_stage('video.cuts')
+    def join_clips_with_cuts(self, clips: List[str], output_file: str) -> str:
+        """
+        Joins normalized clips with plain cuts using the concat demuxer, without re-encoding.
+        The clips have to share the codec, resolution, frame rate and pixel format, which
+        normalized and conforming clips do. Their audio is dropped, the soundtrack replaces it anyway.
+        """
+        concat_list = os.path.join(self.temp_dir, f'{int(time.time())}_cuts.txt')
+        with open(concat_list, 'w') as f:
+            for clip in clips:
+                escaped_path = os.path.abspath(clip).replace("'", "'\\''")
+                f.write(f"file '{escaped_path}'\n")
+        try:
+            self.ffmpeg.run_command(['ffmpeg', '-f', 'concat', '-safe', '0', '-i', concat_list, '-map', '0:v',
+                                     '-c', 'copy', '-an', '-y', output_file], stage='remux')
+        finally:
+            os.remove(concat_list)
+        logger.info(f"Joined {len(clips)} clips with cuts: {output_file}")
+        return output_file
+
+    def plan_source_clips(self, target_duration: float = None) -> List[ClipWindow]:
+        """Picks the source clip windows covering target_duration, see TimelinePlanner"""
+        # Durations come from the asset index, only clips missing from it or changed are probed
+        metadata = lookup_clip_metadata(self.brand_kit.source_videos_paths or ())
+        planner = TimelinePlanner(self.brand_kit.source_videos_paths, transition_overlap(self.brand_kit),
+                                  randomize=self.brand_kit.randomize_clips,
+                                  max_window=Config.TIMELINE_MAX_CLIP_SECONDS,
+                                  probe=lambda clip: metadata[clip].duration if clip in metadata
+                                  else self.ffmpeg.get_video_duration(clip))
+        return planner.plan(target_duration)
+
+    def build_transition_commands(self, clips: List[str], output_file: str, output_args: list = None,
+                                  streaming: bool = False) -> tuple:
+        """
+        Builds the chain of pairwise transition commands for normalized clips.
+        In streaming mode intermediate results are named pipes, so the chain has to be
+        started at once with FFmpegUtils.run_pipeline instead of running step by step.
+
+        Returns:
+            Commands, intermediate files and the duration of the joined video
+        """
+        # Plain cuts among crossfades are not supported, only the crossfades are used
+        transitions = [name for name in self.brand_kit.transition_names if name not in Config.CUT_TRANSITIONS]
+        if not transitions:
+            raise ValueError("transitions list is empty, clips are joined with join_clips_with_cuts")
+
+        # Рандомно перемешиваем переходы
+        random.shuffle(transitions)
+        # The timeline planner counts with the same overlap
+        transition_duration = self.brand_kit.transition_duration
+
+        clip_durations = [self.ffmpeg.get_video_duration(clip) for clip in clips]
+        commands = []
+        intermediates = []
+        current_video = clips[0]
+        current_duration = clip_durations[0]
+
+        for i in range(1, len(clips)):
+            if i == len(clips) - 1:
+                step_output, step_args = output_file, output_args
+            elif streaming:
+                step_output = self.ffmpeg.create_fifo(os.path.join(self.temp_dir, f"transition_result_{i}.nut"))
+                step_args = FFmpegUtils.stream_output_args()
+                intermediates.append(step_output)
+            else:
+                step_output, step_args = os.path.join(self.temp_dir, f"transition_result_{i}.mp4"), None
+                intermediates.append(step_output)
+
+            commands.append(self.ffmpeg.build_transition_command(
+                clip1=current_video,
+                clip2=clips[i],
+                output=step_output,
+                transition_type=transitions[(i - 1) % len(transitions)],
+                duration=transition_duration,
+                clip1_duration=current_duration,
+                output_args=step_args
+            ))
+            current_video = step_output
+            current_duration += clip_durations[i] - transition_duration
+
+        return commands, intermediates, current_duration
+
+    @measure_stage('video.overlays')
     def add_overlays(self, video_path: str) -> str:
         """
         Добавляет наложения на видео (водяной знак, аватар, призыв к действию)
@@ -111,9 +324,31 @@ class VideoProcessor:
         """
         output_file = f'{self.temp_dir}/{int(time.time())}_overlayed.mp4'
 
+        cmd = self.build_overlays_command(video_path, output_file)
+
+        # Если нет наложений, видео передаётся дальше без копирования
+        if not cmd:
+            return promote_artifact(video_path, output_file, workspace=self.temp_dir)
+
+        self.ffmpeg.run_command(cmd)
+        return output_file
+
+    def build_overlays_command(self, video_path: str, output_file: str, output_args: list = None,
+                               video_size: tuple = None, duration: float = None,
+                               still: bool = False) -> Optional[list]:
+        """
+        Builds the overlay command, returns None when the brand kit has no overlays.
+        video_size and duration have to be passed when the input is a pipe and can not be probed.
+        still shows the CTA all the time instead of at its interval, for a preview of a single frame.
+
+        """
+        if not (self.brand_kit.watermark_path or self.brand_kit.avatar_path or self.brand_kit.cta_path):
+            return None
+
         # Получаем информацию о видео
-        background_width, background_height  = self.ffmpeg.get_video_info(video_path)
-        duration = self.ffmpeg.get_video_duration(video_path)
+        background_width, background_height = video_size or self.ffmpeg.get_video_info(video_path)
+        if duration is None:
+            duration = self.ffmpeg.get_video_duration(video_path)
 
         positions = {
             "top_right": "W-w-W/20:H/20",
@@ -189,145 +424,145 @@ class VideoProcessor:
             inputs.extend(["-i", cta])
 
             # Обрабатываем CTA
-            cta_filter = f"[{input_index}:v]scale={background_width};{cta_size_width_part_of_background}:-1[cta]"
+            cta_filter = f"[{input_index}:v]scale={background_width}*{cta_size_width_part_of_background}:-1[cta]"
             filter_complex.append(cta_filter)
 
             # Показываем CTA с интервалами
-            overlay_filter = f"{current_video}[cta]overlay={cta_ffmpeg_position}:enable='gt(mod(t,{cta_interval}),{cta_interval - cta_duration})'[v{input_index}]"
+            enable = '' if still else f":enable='gt(mod(t,{cta_interval}),{cta_interval - cta_duration})'"
+            overlay_filter = f"{current_video}[cta]overlay={cta_ffmpeg_position}{enable}[v{input_index}]"
             filter_complex.append(overlay_filter)
             current_video = f"[v{input_index}]"
             input_index += 1
 
-        # Если нет наложений, просто копируем видео
-        if not filter_complex:
-            return self.ffmpeg.copy_file(video_path, output_file)
+        if output_args is None:
+            output_args = ["-c:v", Config.VIDEO_CODEC, "-c:a", "copy"]
 
         # Собираем команду FFmpeg
-        cmd = [
+        return [
             'ffmpeg',
             *inputs,
             "-filter_complex", ";".join(filter_complex),
             "-map", current_video, "-map", "0:a?",
-            "-c:v", Config.VIDEO_CODEC,
-            "-c:a", "copy",
+            *output_args,
             "-y", output_file
         ]
 
-        subprocess.run(cmd, check=True)
-        return output_file
-
+    @measure_stage('video.effects')
     def apply_effects(self, video_path: str) -> str:
         """
         Применяет эффекты к видео (LUT, маски)
 
         Args:
             video_path: Путь к видео
-            effects_settings: Настройки эффектов
-            temp_dir: Временная директория
 
         Returns:
             Путь к видео с эффектами
         """
         output_file = f'{self.temp_dir}/{int(time.time())}_effects.mp4'
-        current_video = video_path
-        temp_files = []
+
+        cmd = self.build_effects_command(video_path, output_file)
+
+        # Если никаких эффектов не применялось, видео передаётся дальше без копирования
+        if not cmd:
+            return promote_artifact(video_path, output_file, workspace=self.temp_dir)
+
+        self.ffmpeg.run_command(cmd)
+        return output_file
+
+    def build_effects_command(self, video_path: str, output_file: str, output_args: list = None,
+                              video_size: tuple = None, duration: float = None) -> Optional[list]:
+        """
+        Builds one command applying LUT and mask, returns None when the brand kit has no effects.
+        video_size and duration have to be passed when the input is a pipe and can not be probed.
+
+        """
+        filter_complex = []
+        inputs = ["-i", video_path]
+        current_video = "[0:v]"
 
         # Применяем LUT
         if self.brand_kit.lut_path:
             lut_file = self.brand_kit.lut_path
-            lut_output = os.path.join(self.temp_dir, f"{int(time.time())}_lut_effect.mp4")
-            cmd = [
-                'ffmpeg',
-                "-i", current_video,
-                "-vf", f"lut3d={lut_file}",
-                "-c:v", Config.VIDEO_CODEC,
-                "-c:a", "copy",
-                "-y", lut_output
-            ]
-            subprocess.run(cmd, check=True)
-            temp_files.append(lut_output)
-            current_video = lut_output
+            filter_complex.append(f"{current_video}lut3d={lut_file}[graded]")
+            current_video = "[graded]"
 
-        # В функции apply_effects замените логику масштабирования:
         if self.brand_kit.mask_effect_path:
             mask_file = self.brand_kit.mask_effect_path
             mask_bg_color = self.brand_kit.mask_effect_background_color
             similarity = 0.3
             blend = 0.1
 
-            # Получаем информацию о видео и маске
-            video_width, video_height = self.ffmpeg.get_video_info(current_video)
-            video_duration = self.ffmpeg.get_video_duration(current_video)
-            mask_width, mask_height = self.ffmpeg.get_video_info(mask_file)
+            # Получаем информацию о видео
+            video_width, video_height = video_size or self.ffmpeg.get_video_info(video_path)
+            video_duration = duration if duration is not None else self.ffmpeg.get_video_duration(video_path)
 
-            # Определяем наибольшую сторону видео
-            max_video_dimension = max(video_width, video_height)
-
-            # Определяем как масштабировать маску в зависимости от её ориентации
+            # Определяем как масштабировать маску в зависимости от ориентации видео
             if video_width > video_height:
-                # Маска горизонтальная - масштабируем по ширине
+                # Видео горизонтальное - масштабируем по ширине
                 scale_filter = f"scale={video_width}:-1"
             else:
-                # Маска вертикальная - масштабируем по высоте
+                # Видео вертикальное - масштабируем по высоте
                 scale_filter = f"scale=-1:{video_height}"
 
             overlay_position = "(main_w-overlay_w)/2:(main_h-overlay_h)/2"
 
-            mask_output = os.path.join(self.temp_dir,f"{int(time.time())}_masked.mp4")
-
-            filter_complex = (
+            inputs.extend(["-i", mask_file])
+            filter_complex.append(
                 f"[1:v]loop=loop=-1:size=32767:start=0,setpts=PTS-STARTPTS,trim=duration={video_duration},"
                 f"colorkey={mask_bg_color}:similarity={similarity}:blend={blend},"
-                f"{scale_filter}[mask_processed];"
-                f"[0:v][mask_processed]overlay={overlay_position}[out]"
+                f"{scale_filter}[mask_processed]"
             )
+            filter_complex.append(f"{current_video}[mask_processed]overlay={overlay_position}[masked]")
+            current_video = "[masked]"
 
-            cmd = [
-                'ffmpeg',
-                "-i", current_video,
-                "-i", mask_file,
-                "-filter_complex", filter_complex,
-                "-map", "[out]",
-                "-map", "0:a?",
-                "-c:v", Config.VIDEO_CODEC,
-                "-c:a", "copy",
-                "-y", mask_output
-            ]
-            subprocess.run(cmd, check=True)
-            temp_files.append(mask_output)
-            current_video = mask_output
+        if not filter_complex:
+            return None
 
-        # Если никаких эффектов не применялось, копируем исходное видео
-        if current_video == video_path:
-            return self.ffmpeg.copy_file(video_path, output_file)
+        if output_args is None:
+            output_args = ["-c:v", Config.VIDEO_CODEC, "-c:a", "copy"]
 
-        result_file = self.ffmpeg.copy_file(current_video, output_file)
-        for file in temp_files:
-            os.remove(file)
-        return result_file
+        return [
+            'ffmpeg',
+            *inputs,
+            "-filter_complex", ";".join(filter_complex),
+            "-map", current_video,
+            "-map", "0:a?",
+            *output_args,
+            "-y", output_file
+        ]
 
+    @measure_stage('video.join_intro')
     def join_intro_with_main_parts(self, intro_path: str, video_path: str) -> str:
         """Fallback method that processes video and audio separately"""
-        temp_intro = f'temp/{int(time.time())}_temp_intro.mp4'
-        temp_main_video = f'temp/{int(time.time())}_temp_main_video.mp4'
-        output_file = f'{Config.RESULT_FOLDER}/{int(time.time())}_final_video.mp4'
-
-        transition_type = random.choice(self.brand_kit.transition_names)
-        transition_duration = self.brand_kit.transition_duration
+        timestamp = int(time.time())
+        temp_intro = f'{self.temp_dir}/{timestamp}_temp_intro.mp4'
+        temp_main = f'{self.temp_dir}/{timestamp}_temp_main.mp4'
+        temp_main_video = f'{self.temp_dir}/{timestamp}_temp_main_video.mp4'
+        output_file = f'{self.temp_dir}/{timestamp}_final_video.mp4'
+
+        cuts = uses_cuts(self.brand_kit)
+        transitions = [name for name in self.brand_kit.transition_names if name not in Config.CUT_TRANSITIONS]
+        transition_type = None if cuts else random.choice(transitions)
+        transition_duration = transition_overlap(self.brand_kit)
         intro_duration = self.ffmpeg.get_video_duration(intro_path)
         offset = intro_duration - transition_duration
         width, height = self._get_resolution_from_aspect_ratio()
-        normalized_intro = self.ffmpeg.normalize_video_resolution(intro_path, temp_intro, f'{width}:{height}')
-        normalized_main_video = self.ffmpeg.normalize_video_resolution(intro_path, temp_intro, f'{width}:{height}')
-        temp_files = []
+        fps = current_render_profile().fps
+        temp_files = [temp_main_video, temp_intro, temp_main]
         try:
-            # First, create video crossfade only
+            normalized_intro = self.ffmpeg.normalize_video_resolution(intro_path, temp_intro, f'{width}:{height}')
+            normalized_main_video = self.ffmpeg.normalize_video_resolution(video_path, temp_main, f'{width}:{height}')
+
+            # First, create video crossfade only, or a cut
+            join_filter = "[intro][main]concat=n=2:v=1:a=0" if cuts else \
+                f"[intro][main]xfade=transition={transition_type}:duration={transition_duration}:offset={offset}"
             video_cmd = [
                 'ffmpeg',
                 "-i", normalized_intro,
                 "-i", normalized_main_video,
                 "-filter_complex",
-                f"[0:v][1:v]xfade=transition={transition_type}:duration={transition_duration}:offset={offset}",
+                # xfade needs both inputs with the same frame rate and time base
+                f"[0:v]fps={fps},settb=AVTB[intro];[1:v]fps={fps},settb=AVTB[main];{join_filter}",
                 "-c:v", "libx264",
                 "-an",  # No audio
                 "-y",
@@ -336,14 +571,22 @@ class VideoProcessor:
 
             self.ffmpeg.run_command(video_cmd)
 
-            # Then, add audio crossfade
+            # Then, add audio crossfade. Auto intros have no audio track,
+            # in that case the main audio is just delayed to the start of the transition
+            if self.ffmpeg.has_audio_stream(normalized_intro):
+                audio_filter = "[1:a][2:a]concat=n=2:v=0:a=1[a]" if cuts else \
+                    f"[1:a][2:a]acrossfade=d={transition_duration}[a]"
+            else:
+                delay_ms = int(offset * 1000)
+                audio_filter = f"[2:a]adelay={delay_ms}:all=1[a]"
+
             final_cmd = [
                 'ffmpeg',
                 "-i", temp_main_video,
                 "-i", normalized_intro,
                 "-i", normalized_main_video,
                 "-filter_complex",
-                f"[1:a][2:a]acrossfade=d={transition_duration}[a]",
+                audio_filter,
                 "-map", "0:v",
                 "-map", "[a]",
                 "-c:v", "copy",
@@ -352,10 +595,7 @@ class VideoProcessor:
                 output_file
             ]
 
-            self.ffmpeg.run_command(final_cmd)
-
-            # Clean up temp file
-            temp_files = [temp_main_video, normalized_intro, normalized_main_video]
+            self.ffmpeg.run_command(final_cmd, stage='audio')
 
             return output_file
 
@@ -363,19 +603,22 @@ class VideoProcessor:
             raise RuntimeError(f"Fallback method failed: {str(e)}")
         finally:
             for temp_file in temp_files:
-                os.remove(temp_file)
+                if os.path.exists(temp_file):
+                    os.remove(temp_file)
 
-    def _get_resolution_from_aspect_ratio(self) -> tuple:
+    def _get_resolution_from_aspect_ratio(self, aspect_ratio: str = None) -> tuple:
         """
-        Returns resolution based on aspect_ratio
+        Returns resolution based on aspect_ratio, the one of the brand kit by default.
+        Preview renders get the proxy resolution of the current render profile.
 
         """
-        aspect_ratio = self.brand_kit.aspect_ratio
+        aspect_ratio = aspect_ratio or self.brand_kit.aspect_ratio
 
         if aspect_ratio == "16:9":
-            return 1920, 1080
+            resolution = 1920, 1080
         elif aspect_ratio == "9:16":
-            return 1080, 1920
+            resolution = 1080, 1920
         else:
             # Default to 16:9
-            return 1920, 1080
+            resolution = 1920, 1080
+        return current_render_profile().resolution(*resolution)
@@ -1,17 +1,25 @@
 # services/brand_kit_service.py
 from typing import Optional, Dict, Any, List
 import os
+import threading
+from core.config import Config
 from database.models import (
     BrandKit, AutoIntroSetting, Caption, Voice, Transition,
     BrandKitTransition, db
 )
+from utils.cache import VersionedLRUCache
 
 
 class BrandKitService:
     """Комплексный сервис для управления Brand Kit"""
 
-    def __init__(self):
-        self._cache = {}
+    def __init__(self, cache_size: int = None):
+        # Brand kits are validated against updated_at, the lists of voices and transitions
+        # against the database version, so changes made by other processes are picked up
+        self._cache = VersionedLRUCache(cache_size or Config.BRAND_KIT_CACHE_SIZE)
+        self._database_version = 0
+        self._version_lock = threading.Lock()
+        self._seen_versions = threading.local()
         self._ensure_db_connection()
 
     def _ensure_db_connection(self):
@@ -58,6 +66,7 @@ class BrandKitService:
                 avatar_background_color=brand_kit_data.get('avatar_background_color'),
                 cta_path=brand_kit_data.get('cta_path'),
                 cta_interval=brand_kit_data.get('cta_interval', 120),
+                cta_position=brand_kit_data.get('cta_position', 'bottom_left'),
                 voice=voice,
                 aspect_ratio=brand_kit_data.get('aspect_ratio', '16:9'),
                 music_path=brand_kit_data.get('music_path'),
@@ -106,7 +115,7 @@ class BrandKitService:
                     print(f"Переход с ID {transition_id} не найден")
 
             # Очистка кэша
-            self._cache.clear()
+            self._invalidate(brand_kit.name)
 
             return brand_kit
 
@@ -125,10 +134,13 @@ class BrandKitService:
         Returns:
             Словарь с данными Brand Kit или None
         """
-        if use_cache and name in self._cache:
-            return self._cache[name]
-
         try:
+            if use_cache:
+                version = self._brand_kit_version(name)
+                cached = self._cache.get(('brand_kit', name), version)
+                if cached is not None:
+                    return cached
+
             # Загрузка основного Brand Kit
             brand_kit = BrandKit.get(BrandKit.name == name)
 
@@ -142,8 +154,8 @@ class BrandKitService:
                 'files_info': self._get_files_info(brand_kit)
             }
 
-            if use_cache:
-                self._cache[name] = result
+            if use_cache and version is not None:
+                self._cache.put(('brand_kit', name), version, result)
 
             return result
 
@@ -162,11 +174,12 @@ class BrandKitService:
             'randomize_clips': brand_kit.randomize_clips,
             'watermark_path': brand_kit.watermark_path,
             'watermark_position': brand_kit.watermark_position,
-            'avatar_clip_path': brand_kit.avatar_clip_path,
+            'avatar_clip_path': brand_kit.avatar_path,
             'avatar_position': brand_kit.avatar_position,
             'avatar_background_color': brand_kit.avatar_background_color,
             'cta_path': brand_kit.cta_path,
             'cta_interval': brand_kit.cta_interval,
+            'cta_position': brand_kit.cta_position,
             'aspect_ratio': brand_kit.aspect_ratio,
             'music_path': brand_kit.music_path,
             'music_volume': brand_kit.music_volume,
@@ -183,12 +196,12 @@ class BrandKitService:
         try:
             auto_intro = AutoIntroSetting.get(AutoIntroSetting.brand_kit == brand_kit)
             return {
-                'enabled': auto_intro.enabled,
+                'enabled': True,
                 'title_font': auto_intro.title_font,
                 'title_font_size': auto_intro.title_font_size,
                 'title_font_color': auto_intro.title_font_color,
-                'title_background_type': auto_intro.title_background_type,
-                'title_background_value': auto_intro.title_background_value
+                'title_background_type': auto_intro.background_type,
+                'title_background_value': auto_intro.background_value
             }
         except AutoIntroSetting.DoesNotExist:
             return None
@@ -217,7 +230,6 @@ class BrandKitService:
                 'provider': brand_kit.voice.provider,
                 'language_code': brand_kit.language_code,
                 'voice_id': brand_kit.voice.voice_id,
-                'group_id': brand_kit.voice.group_id,
                 'description': brand_kit.voice.description,
                 'speed': brand_kit.voice.speed
             }
@@ -249,7 +261,7 @@ class BrandKitService:
         file_paths = {
             'intro_clip': brand_kit.intro_clip_path,
             'watermark': brand_kit.watermark_path,
-            'avatar_clip': brand_kit.avatar_clip_path,
+            'avatar_clip': brand_kit.avatar_path,
             'cta': brand_kit.cta_path,
             'music': brand_kit.music_path,
             'lut': brand_kit.lut_path,
@@ -269,14 +281,21 @@ class BrandKitService:
     def get_available_voices(self) -> List[Dict[str, Any]]:
         """Возвращает список доступных голосов"""
         try:
+            version = self._get_database_version()
+            cached = self._cache.get('voices', version)
+            if cached is not None:
+                return cached
+
             voices = Voice.select()
-            return [
+            result = [
                 {
                     'id': voice.id,
                     'description': voice.description
                 }
                 for voice in voices
             ]
+            self._cache.put('voices', version, result)
+            return result
         except Exception as e:
             print(f"Ошибка получения голосов: {e}")
             return []
@@ -284,8 +303,13 @@ class BrandKitService:
     def get_available_transitions(self) -> List[Dict[str, Any]]:
         """Возвращает список доступных переходов"""
         try:
+            version = self._get_database_version()
+            cached = self._cache.get('transitions', version)
+            if cached is not None:
+                return cached
+
             transitions = Transition.select()
-            return [
+            result = [
                 {
                     'id': transition.id,
                     'name': transition.name,
@@ -293,6 +317,8 @@ class BrandKitService:
                 }
                 for transition in transitions
             ]
+            self._cache.put('transitions', version, result)
+            return result
         except Exception as e:
             print(f"Ошибка получения переходов: {e}")
             return []
@@ -309,28 +335,30 @@ class BrandKitService:
     def update_brand_kit(self, name: str, updates: Dict[str, Any]) -> bool:
         """Обновляет существующий Brand Kit"""
         try:
-            brand_kit = BrandKit.get(BrandKit.name == name)
+            # Одна транзакция: другие соединения видят либо старый, либо новый Brand Kit целиком
+            with db.atomic():
+                brand_kit = BrandKit.get(BrandKit.name == name)
 
-            # Обновление основных полей
-            for field, value in updates.get('brand_kit', {}).items():
-                if hasattr(brand_kit, field):
-                    setattr(brand_kit, field, value)
+                # Обновление связанных объектов
+                if 'auto_intro_settings' in updates:
+                    self._update_auto_intro_settings(brand_kit, updates['auto_intro_settings'])
 
-            brand_kit.save()
+                if 'caption_settings' in updates:
+                    self._update_caption_settings(brand_kit, updates['caption_settings'])
 
-            # Обновление связанных объектов
-            if 'auto_intro_settings' in updates:
-                self._update_auto_intro_settings(brand_kit, updates['auto_intro_settings'])
+                if 'transition_ids' in updates:
+                    self._update_transitions(brand_kit, updates['transition_ids'])
 
-            if 'caption_settings' in updates:
-                self._update_caption_settings(brand_kit, updates['caption_settings'])
+                # Обновление основных полей. Brand Kit сохраняется последним: его updated_at -
+                # версия в кэше, и она меняется только вместе со всеми связанными объектами
+                for field, value in updates.get('brand_kit', {}).items():
+                    if hasattr(brand_kit, field):
+                        setattr(brand_kit, field, value)
 
-            if 'transition_ids' in updates:
-                self._update_transitions(brand_kit, updates['transition_ids'])
+                brand_kit.save()
 
             # Очистка кэша
-            if name in self._cache:
-                del self._cache[name]
+            self._invalidate(name)
 
             return True
 
@@ -380,8 +408,7 @@ class BrandKitService:
             brand_kit.delete_instance(recursive=True)
 
             # Очистка кэша
-            if name in self._cache:
-                del self._cache[name]
+            self._invalidate(name)
 
             return True
 
@@ -390,3 +417,36 @@ class BrandKitService:
         except Exception as e:
             print(f"Ошибка удаления Brand Kit '{name}': {e}")
             return False
+
+    def cache_stats(self) -> Dict[str, Any]:
+        """Статистика кэша: размер, попадания, промахи, устаревшие записи и hit rate"""
+        return self._cache.stats()
+
+    def _invalidate(self, name: str):
+        """Сбрасывает кэш Brand Kit после изменения через этот сервис"""
+        self._cache.invalidate(('brand_kit', name))
+
+    @staticmethod
+    def _brand_kit_version(name: str):
+        """
+        Версия Brand Kit - его updated_at, который меняется при каждом сохранении.
+        Один запрос по уникальному индексу вместо загрузки всех связанных объектов.
+        """
+        return BrandKit.select(BrandKit.updated_at).where(BrandKit.name == name).scalar()
+
+    def _get_database_version(self) -> int:
+        """
+        Версия данных для списков голосов и переходов.
+        PRAGMA data_version меняется, когда другое соединение (другой поток или процесс) сохраняет изменения,
+        total_changes - когда изменения делает само соединение, например этот сервис или окна приложения.
+        Значения сравниваются с тем, что видел текущий поток на своем соединении.
+        """
+        database = Voice._meta.database
+        connection = database.connection()
+        data_version = database.execute_sql('PRAGMA data_version').fetchone()[0]
+        seen = (id(connection), data_version, connection.total_changes)
+        with self._version_lock:
+            if getattr(self._seen_versions, 'seen', None) != seen:
+                self._seen_versions.seen = seen
+                self._database_version += 1
+            return self._database_version
@@ -1,27 +1,29 @@
 import os
 import time
 
-import requests
 import json
 import logging
 from mutagen import File as MutagenFile
-from aiohttp.abc import HTTPException
 
 from core.config import Config
 from database.functions import get_active_voice_over_api_key
+from utils.tracing import trace_span
 
 logger = logging.getLogger(__name__)
 
 
 class MinimaxTTS:
-    def __init__(self, voice_config):
+    def __init__(self, voice_config, temp_dir: str = None):
         self.voice_config = voice_config
-        self.temp_dir = Config.TEMP_FOLDER
+        self.temp_dir = temp_dir or Config.TEMP_FOLDER
 
     def generate_audio(self, script: str):
         """
         Voiceover script
         """
+        # requests is imported on first use, it is heavy for the startup of the app
+        import requests
+
         output_file = f'{self.temp_dir}/{int(time.time())}_minimax_tts.mp3'
         active_api_key = get_active_voice_over_api_key('minimax')
         group_id = active_api_key.group_id
@@ -52,11 +54,13 @@ class MinimaxTTS:
             'Authorization': f'Bearer {api_key}',
             'Content-Type': 'application/json'
         }
-        response = requests.post(url, headers=headers, json=payload)
+        with trace_span('minimax.t2a', 'network', characters=len(script)):
+            response = requests.post(url, headers=headers, json=payload)
         try:
             response.raise_for_status()
-        except HTTPException as e:
+        except requests.HTTPError as e:
             logger.error(f'Raised error during minimax voice over creation: {e}')
+            raise
 
         resp_json = response.json()
         base_resp = resp_json.get("base_resp", {})
@@ -79,6 +83,7 @@ class MinimaxTTS:
         Clones a voice based on the uploaded file.
         voice_id: minimum 8 characters, letters and numbers, starts with a letter.
         """
+        import requests
 
         custom_voice_file_id = self._upload_cloned_voice(audio_path, group_id, api_key)
         if len(voice_id) < 8 or not voice_id[0].isalpha() or not any(c.isdigit() for c in voice_id):
@@ -106,6 +111,8 @@ class MinimaxTTS:
         Validation: MP3/M4A/WAV format, duration 10 sec - 5 min, size < 20MB.Clones the voice based on the uploaded file.
         voice_id: minimum 8 characters, letters and numbers, starts with a letter.
         """
+        import requests
+
         # Валидация файла
         allowed_ext = ('.mp3', '.m4a', '.wav')
         if not audio_path.lower().endswith(allowed_ext):
@@ -1,19 +1,22 @@
 # Chat gpt
 
-import requests
-import tempfile
 import time
 from typing import Dict, Any
 import logging
 
+from core.config import Config
+from utils.tracing import trace_span
+
 logger = logging.getLogger(__name__)
 
 
 class ReplicateTTS:
-    def __init__(self, api_key: str):
+    def __init__(self, api_key: str, temp_dir: str = None):
         self.api_key = api_key
+        self.temp_dir = temp_dir or Config.TEMP_FOLDER
         self.api_url = "https://api.replicate.com/v1/predictions"
 
+    @trace_span('replicate.tts', 'network')
     def generate_audio(self, text: str, voice_id: str = "", speed: float = 1.0, output_file: str = "") -> str:
         """
         Генерирует аудио из текста с помощью Replicate TTS
@@ -22,16 +25,18 @@ class ReplicateTTS:
             text: Текст для преобразования в речь
             voice_id: Идентификатор голоса (или модели)
             speed: Скорость речи (1.0 = нормальная)
-            output_file: Путь к выходному файлу
+            output_file: Путь к выходному файлу, по умолчанию в папке задачи
 
         Returns:
             Путь к сгенерированному аудио файлу
         """
+        import requests
+
         if not self.api_key:
             raise ValueError("API ключ Replicate не указан")
 
         if not output_file:
-            output_file = tempfile.mktemp(suffix=".mp3")
+            output_file = f'{self.temp_dir}/{int(time.time())}_replicate_tts.mp3'
 
         # Если voice_id не указан, используем модель по умолчанию
         if not voice_id:
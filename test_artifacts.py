@@ -0,0 +1,69 @@
+import errno
+import os
+
+import utils.artifacts as artifacts
+from utils.artifacts import is_inside, promote_artifact
+from utils.metrics import collect_metrics
+
+
+def make_file(path, content=b'video' * 1000):
+    with open(path, 'wb') as f:
+        f.write(content)
+    return str(path)
+
+
+def test_promotion_does_not_copy_on_the_same_filesystem(tmp_path):
+    source = make_file(tmp_path / 'content.mp4')
+    with collect_metrics('job') as metrics:
+        linked = promote_artifact(source, str(tmp_path / 'effects.mp4'))
+        moved = promote_artifact(linked, str(tmp_path / 'final.mp4'), move=True)
+
+    assert os.path.samefile(source, moved) and not os.path.exists(linked)
+    assert [record['method'] for record in metrics.promotion_records()] == ['hardlink', 'rename']
+    assert sum(record['bytes_saved'] for record in metrics.promotion_records()) == 2 * 5000
+
+    # The promoted file is replaced, never written into, the source stays intact
+    promote_artifact(make_file(tmp_path / 'other.mp4', b'other'), moved)
+    with open(source, 'rb') as f:
+        assert f.read() == b'video' * 1000
+
+
+def test_promotion_copies_across_filesystems(tmp_path, monkeypatch):
+    def cross_device(src, dst):
+        raise OSError(errno.EXDEV, os.strerror(errno.EXDEV))
+
+    monkeypatch.setattr(artifacts.os, 'link', cross_device)
+    monkeypatch.setattr(artifacts, '_reflink', lambda src, dst: False)
+    monkeypatch.setattr(artifacts.os, 'replace', lambda src, dst: os.rename(src, dst)
+                        if src.endswith('.partial') else cross_device(src, dst))
+    source = make_file(tmp_path / 'final.mp4')
+
+    with collect_metrics('job') as metrics:
+        output = promote_artifact(source, str(tmp_path / 'result.mp4'), move=True)
+
+    assert not os.path.exists(source) and os.path.getsize(output) == 5000
+    assert [(record['method'], record['bytes_saved']) for record in metrics.promotion_records()] == [('copy', 0)]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.partial')]
+
+
+def test_paths_inside_a_folder(tmp_path):
+    job = str(tmp_path / 'job1')
+    assert is_inside(os.path.join(job, 'clip.mp4'), job)
+    assert is_inside(os.path.join(job, 'clips', '..', 'clips', 'clip.mp4'), job + os.sep)
+    # A sibling folder sharing the prefix and a path leaving the folder are outside
+    assert not is_inside(str(tmp_path / 'job10' / 'clip.mp4'), job)
+    assert not is_inside(os.path.join(job, '..', 'clip.mp4'), job)
+
+
+def test_inputs_outside_the_workspace_are_never_hardlinked(tmp_path, monkeypatch):
+    monkeypatch.setattr(artifacts, '_reflink', lambda src, dst: False)
+    workspace = tmp_path / 'job'
+    workspace.mkdir()
+    source_clip = make_file(tmp_path / 'source.mp4')
+
+    with collect_metrics('job') as metrics:
+        clip = promote_artifact(source_clip, str(workspace / 'clip.mp4'), workspace=str(workspace))
+        effects = promote_artifact(clip, str(workspace / 'effects.mp4'), workspace=str(workspace))
+
+    assert not os.path.samefile(source_clip, clip) and os.path.samefile(clip, effects)
+    assert [record['method'] for record in metrics.promotion_records()] == ['copy', 'hardlink']
@@ -0,0 +1,34 @@
+import pytest
+
+from conftest import NARRATION_SECONDS, make_clip, requires_ffmpeg, video_size_and_duration
+from core.editor import VideoEditor
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.render_profile import PREVIEW_PROFILE, use_render_profile
+
+pytestmark = requires_ffmpeg
+
+
+def test_one_decode_normalizes_every_resolution(tmp_path):
+    source = make_clip(str(tmp_path / 'source.mp4'), 3, '640x360')
+    outputs = [('320:180', str(tmp_path / 'landscape.mp4')), ('180:320', str(tmp_path / 'portrait.mp4'))]
+
+    paths = FFmpegUtils().normalize_video_resolutions(source, outputs, start=0.5, duration=2)
+
+    assert [video_size_and_duration(path)[0] for path in paths] == [(320, 180), (180, 320)]
+    assert all(video_size_and_duration(path)[1] == pytest.approx(2, abs=0.1) for path in paths)
+
+
+def test_create_videos_renders_every_aspect_ratio(brand_kit, tmp_path):
+    editor = VideoEditor.__new__(VideoEditor)
+    editor.brandkit = brand_kit
+    output_files = {'16:9': str(tmp_path / 'landscape.mp4'), '9:16': str(tmp_path / 'portrait.mp4')}
+
+    with use_render_profile(PREVIEW_PROFILE):
+        results = editor.create_videos('Title', ['16:9', '9:16'], output_files=output_files)
+
+    assert results == output_files
+    (landscape_size, landscape_duration) = video_size_and_duration(results['16:9'])
+    (portrait_size, portrait_duration) = video_size_and_duration(results['9:16'])
+    assert landscape_size == portrait_size[::-1] and landscape_size[0] > landscape_size[1]
+    assert landscape_duration == pytest.approx(portrait_duration, abs=0.1)
+    assert NARRATION_SECONDS - 0.1 <= landscape_duration <= NARRATION_SECONDS + 1
@@ -0,0 +1,84 @@
+import os
+
+import pytest
+
+from database.assets import AssetScanner, ClipMetadata, lookup_clip_metadata
+from database.models import DATABASE_PRAGMAS, SourceClipAsset, TracedSqliteDatabase
+from utils.ffmpeg_utils import FFmpegUtils
+
+
+@pytest.fixture
+def database(tmp_path):
+    test_db = TracedSqliteDatabase(str(tmp_path / 'assets.db'), pragmas=DATABASE_PRAGMAS)
+    with test_db.bind_ctx([SourceClipAsset]):
+        test_db.create_tables([SourceClipAsset])
+        yield test_db
+    test_db.close()
+
+
+@pytest.fixture
+def probes(monkeypatch):
+    probed = []
+
+    def probe_media(path):
+        probed.append(path)
+        return {'duration': 12.5, 'width': 1920, 'height': 1080, 'fps': 30.0, 'video_codec': 'h264', 'has_audio': False,
+                'pix_fmt': 'yuv420p'}
+
+    monkeypatch.setattr(FFmpegUtils, 'probe_media', staticmethod(probe_media))
+    monkeypatch.setattr(FFmpegUtils, 'get_keyframes', staticmethod(lambda path: [0.0, 2.0, 4.0]))
+    return probed
+
+
+def test_scan_probes_only_new_and_changed_clips(database, probes, tmp_path):
+    clip = tmp_path / 'clip.mp4'
+    clip.write_bytes(b'video')
+    scanner = AssetScanner()
+
+    assert scanner.scan([str(clip)])['probed'] == 1
+    assert scanner.scan([str(clip)])['unchanged'] == 1
+
+    # Touched without changes, only the modification time is updated
+    os.utime(clip, ns=(0, 10 ** 9))
+    assert scanner.scan([str(clip)])['touched'] == 1
+
+    clip.write_bytes(b'edited video')
+    assert scanner.scan([str(clip)])['probed'] == 1
+    assert probes == [str(clip), str(clip)]
+
+
+def test_lookup_skips_clips_changed_since_the_scan(database, probes, tmp_path):
+    clip = tmp_path / 'clip.mp4'
+    clip.write_bytes(b'video')
+    AssetScanner().scan([str(clip)])
+
+    metadata = lookup_clip_metadata([str(clip), str(tmp_path / 'unknown.mp4')])
+    assert metadata == {str(clip): ClipMetadata(str(clip), 12.5, 1920, 1080, 30.0, 'h264', False, (0.0, 2.0, 4.0),
+                                                'yuv420p')}
+    assert metadata[str(clip)].keyframe_before(3.5) == 2.0
+
+    clip.write_bytes(b'edited video')
+    assert lookup_clip_metadata([str(clip)]) == {}
+
+
+def test_index_without_the_pixel_format_is_migrated_and_probed_again(database, probes, tmp_path):
+    clip = tmp_path / 'clip.mp4'
+    clip.write_bytes(b'video')
+    AssetScanner().scan([str(clip)])
+    # An index created before the pixel format column
+    database.execute_sql('ALTER TABLE source_clip_assets DROP COLUMN pix_fmt')
+
+    assert lookup_clip_metadata([str(clip)]) == {}
+    assert 'pix_fmt' in {column.name for column in database.get_columns('source_clip_assets')}
+    assert AssetScanner().scan([str(clip)])['probed'] == 1
+    assert lookup_clip_metadata([str(clip)])[str(clip)].pix_fmt == 'yuv420p'
+    assert probes == [str(clip), str(clip)]
+
+
+def test_only_clips_in_the_output_format_skip_normalization():
+    clip = ClipMetadata('clip.mp4', 10.0, 1920, 1080, 30.0, 'h264', True, pix_fmt='yuv420p')
+    assert clip.mismatch(1920, 1080, 30) is None
+    assert clip.mismatch(1080, 1920, 30) == 'resolution 1920x1080'
+    assert clip.mismatch(1920, 1080, 15) == 'frame rate 30.0'
+    assert clip._replace(video_codec='hevc').mismatch(1920, 1080, 30) == 'codec hevc'
+    assert clip._replace(pix_fmt='yuv422p').mismatch(1920, 1080, 30) == 'pixel format yuv422p'
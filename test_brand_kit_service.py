@@ -0,0 +1,108 @@
+import datetime
+import sqlite3
+import threading
+
+import peewee as pw
+import pytest
+
+from database.models import AutoIntroSetting, BrandKit, BrandKitTransition, Caption, SourceVideos, Transition, Voice
+from services import brand_kit_service
+from services.brand_kit_service import BrandKitService
+
+MODELS = [Voice, BrandKit, AutoIntroSetting, Caption, Transition, BrandKitTransition, SourceVideos]
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    path = str(tmp_path / 'brand_kits.db')
+    test_db = pw.SqliteDatabase(path)
+    monkeypatch.setattr(brand_kit_service, 'db', test_db)
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables(MODELS)
+        voice = Voice.create(provider='minimax', voice_id='narrator')
+        for name in ('first', 'second', 'third'):
+            BrandKit.create(name=name, voice=voice, script_to_voice_over='script')
+        yield path
+    test_db.close()
+
+
+def external_update(path: str, sql: str, params=()):
+    """Writes through another connection, like another worker process would"""
+    connection = sqlite3.connect(path)
+    with connection:
+        connection.execute(sql, params)
+    connection.close()
+
+
+def test_brand_kit_cache_is_validated_against_updated_at(database):
+    service = BrandKitService()
+    assert service.load_brand_kit('first')['brand_kit']['music_volume'] == 20
+    assert service.load_brand_kit('first')['brand_kit']['music_volume'] == 20
+    assert service.cache_stats()['hits'] == 1
+
+    external_update(database, 'UPDATE brand_kits SET music_volume = 50, updated_at = ? WHERE name = ?',
+                    (datetime.datetime.now().isoformat(' '), 'first'))
+
+    assert service.load_brand_kit('first')['brand_kit']['music_volume'] == 50
+    stats = service.cache_stats()
+    assert stats['stale'] == 1
+    assert stats['hits'] == 1
+
+
+def test_voices_cache_sees_changes_of_other_connections(database):
+    service = BrandKitService()
+    assert len(service.get_available_voices()) == 1
+    assert len(service.get_available_voices()) == 1
+    assert service.cache_stats()['hits'] == 1
+
+    external_update(database, "INSERT INTO voices (provider, voice_id, speed) VALUES ('replicate', 'clone', 1.0)")
+
+    assert len(service.get_available_voices()) == 2
+
+
+def test_cache_is_bounded(database):
+    service = BrandKitService(cache_size=2)
+    for name in ('first', 'second', 'third'):
+        service.load_brand_kit(name)
+    stats = service.cache_stats()
+    assert stats['size'] == 2
+    assert stats['evictions'] == 1
+
+
+def test_lists_cache_sees_changes_of_the_same_connection(database):
+    service = BrandKitService()
+    assert service.get_available_transitions() == []
+
+    # PRAGMA data_version does not change for writes of the connection itself
+    Transition.create(name='fade')
+    assert [transition['name'] for transition in service.get_available_transitions()] == ['fade']
+
+    service.update_brand_kit('first', {'transition_ids': [Transition.get(name='fade').id]})
+    Voice.create(provider='replicate', voice_id='clone')
+    assert len(service.get_available_voices()) == 2
+
+
+def test_update_of_related_settings_is_atomic_and_changes_the_version(database, monkeypatch):
+    service, other_service = BrandKitService(), BrandKitService()
+    assert other_service.load_brand_kit('first')['caption_settings'] is None
+
+    # Another thread loads the brand kit in the middle of the update, before the transitions are saved
+    update_transitions = service._update_transitions
+
+    def load_during_update(brand_kit, transition_ids):
+        thread = threading.Thread(target=other_service.load_brand_kit, args=('first',))
+        thread.start()
+        thread.join()
+        update_transitions(brand_kit, transition_ids)
+
+    monkeypatch.setattr(service, '_update_transitions', load_during_update)
+    fade = Transition.create(name='fade')
+    assert service.update_brand_kit('first', {'caption_settings': {'font_size': 30}, 'transition_ids': [fade.id]})
+    loaded = other_service.load_brand_kit('first')
+    assert loaded['caption_settings']['font_size'] == 30 and len(loaded['transitions']) == 1
+
+    # A failing save of the brand kit rolls back the related rows saved before it
+    assert not service.update_brand_kit('first', {'caption_settings': {'font_size': 40}, 'transition_ids': [],
+                                                  'brand_kit': {'watermark_path': 'logo.gif'}})
+    loaded = other_service.load_brand_kit('first')
+    assert loaded['caption_settings']['font_size'] == 30 and len(loaded['transitions']) == 1
@@ -0,0 +1,93 @@
+import json
+from types import SimpleNamespace
+
+import pytest
+
+import core.editor
+from core.config import Config
+from database.job_queue import ensure_job_queue
+from database.models import DATABASE_PRAGMAS, BrandKit, RenderJob, TracedSqliteDatabase, Voice
+from videomaker.cli import main
+
+MODELS = [Voice, BrandKit, RenderJob]
+
+
+class FakeEditor:
+    """Renders a text file instead of a video, a script containing 'fail' fails"""
+
+    def __init__(self, brand_kit_name):
+        if brand_kit_name != 'My Brand Kit':
+            raise BrandKit.DoesNotExist
+        self.brandkit = SimpleNamespace(id=None)
+
+    def create_video(self, title, script=None, output_file=None, callback=None):
+        callback('content', 50)
+        if 'fail' in (script or ''):
+            raise RuntimeError('TTS provider is not available')
+        with open(output_file, 'w') as f:
+            f.write(f'{title}: {script}')
+        return output_file
+
+
+@pytest.fixture
+def database(tmp_path, monkeypatch):
+    monkeypatch.setattr(core.editor, 'VideoEditor', FakeEditor)
+    test_db = TracedSqliteDatabase(str(tmp_path / 'video_editor.db'), pragmas=DATABASE_PRAGMAS, thread_safe=True,
+                                   timeout=Config.DATABASE_BUSY_TIMEOUT_MS / 1000)
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables([Voice, BrandKit])
+        ensure_job_queue()
+        yield
+    test_db.close()
+
+
+def write_jobs(path, rows):
+    with open(path, 'w', encoding='utf-8') as f:
+        f.write(''.join(json.dumps(row) + '\n' for row in rows))
+    return str(path)
+
+
+def test_render_writes_the_summary_and_fails_when_a_job_fails(database, tmp_path):
+    jobs = write_jobs(tmp_path / 'videos.jsonl', [{'title': 'First video', 'script': 'Hello'},
+                                                  {'title': 'Second video', 'script': 'fail'}])
+    summary_path = tmp_path / 'summary.json'
+
+    assert main(['render', 'My Brand Kit', jobs, '-j', '2', '-o', str(tmp_path / 'out'),
+                 '--summary', str(summary_path)]) == 1
+
+    with open(summary_path) as f:
+        summary = json.load(f)
+    assert (summary['brand_kit'], summary['total'], summary['succeeded'], summary['failed']) == \
+           ('My Brand Kit', 2, 1, 1)
+    first, second = summary['jobs']
+    assert first['status'] == 'ok' and first['output'] == str(tmp_path / 'out' / '0000_First_video.mp4')
+    with open(first['output']) as f:
+        assert f.read() == 'First video: Hello'
+    assert (second['status'], second['output'], second['error']) == ('failed', None, 'TTS provider is not available')
+
+    # Progress of every job is tracked in the database
+    jobs = {job.id: job for job in RenderJob.select()}
+    assert (jobs[first['job_id']].status, jobs[first['job_id']].output_path) == ('done', first['output'])
+    assert (jobs[second['job_id']].status, jobs[second['job_id']].error) == ('failed', second['error'])
+
+
+def test_render_prints_the_summary_and_succeeds(database, tmp_path, capsys):
+    output = str(tmp_path / 'video.mp4')
+    jobs = write_jobs(tmp_path / 'videos.jsonl', [{'title': 'Video', 'script': 'Hello', 'output': output}])
+
+    assert main(['render', 'My Brand Kit', jobs]) == 0
+    summary = json.loads(capsys.readouterr().out)
+    assert (summary['succeeded'], summary['failed'], summary['jobs'][0]['output']) == (1, 0, output)
+
+
+def test_render_rejects_an_unknown_brand_kit_and_bad_input(database, tmp_path):
+    jobs = write_jobs(tmp_path / 'videos.jsonl', [{'title': 'Video'}])
+    with pytest.raises(SystemExit) as exit_info:
+        main(['render', 'Unknown', jobs])
+    assert exit_info.value.code == 2
+
+    no_title = write_jobs(tmp_path / 'no_title.jsonl', [{'script': 'Hello'}])
+    with pytest.raises(SystemExit) as exit_info:
+        main(['render', 'My Brand Kit', no_title])
+    assert exit_info.value.code == 2
+    assert not RenderJob.select().count()
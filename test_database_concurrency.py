@@ -0,0 +1,98 @@
+import threading
+import time
+
+import pytest
+
+from core.config import Config
+from database.models import DATABASE_PRAGMAS, BrandKit, RenderJob, TracedSqliteDatabase, Voice
+from database.progress import ProgressBatcher
+
+MODELS = [Voice, BrandKit, RenderJob]
+WRITERS = 8
+UPDATES_PER_WRITER = 50
+
+
+@pytest.fixture
+def database(tmp_path):
+    # Same settings as the application database, in a file so every thread has a real connection
+    test_db = TracedSqliteDatabase(str(tmp_path / 'render_jobs.db'), pragmas=DATABASE_PRAGMAS, thread_safe=True,
+                                   timeout=Config.DATABASE_BUSY_TIMEOUT_MS / 1000)
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables(MODELS)
+        yield test_db
+    test_db.close()
+
+
+def run_threads(targets):
+    errors = []
+
+    def guarded(target):
+        def run():
+            try:
+                target()
+            except Exception as e:
+                errors.append(e)
+        return run
+
+    threads = [threading.Thread(target=guarded(target)) for target in targets]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    return errors
+
+
+def test_database_uses_wal(database):
+    assert database.execute_sql('PRAGMA journal_mode').fetchone()[0] == 'wal'
+
+
+def test_writers_do_not_lock_out_each_other_or_the_reader(database):
+    jobs = [RenderJob.create(title=f'job {i}').id for i in range(WRITERS)]
+    writers_done = threading.Event()
+    read_latencies = []
+
+    def writer(job_id):
+        def run():
+            with database.connection_context():
+                for progress in range(1, UPDATES_PER_WRITER + 1):
+                    with database.atomic('IMMEDIATE'):
+                        RenderJob.update(progress=progress, stage='encode').where(RenderJob.id == job_id).execute()
+        return run
+
+    def reader():
+        with database.connection_context():
+            while not writers_done.is_set():
+                start = time.perf_counter()
+                list(RenderJob.select(RenderJob.id, RenderJob.progress))
+                read_latencies.append(time.perf_counter() - start)
+
+    reader_thread = threading.Thread(target=reader)
+    reader_thread.start()
+    errors = run_threads([writer(job_id) for job_id in jobs])
+    writers_done.set()
+    reader_thread.join()
+
+    assert not errors
+    assert all(job.progress == UPDATES_PER_WRITER for job in RenderJob.select())
+    assert read_latencies
+    # With WAL readers never wait for writers
+    assert max(read_latencies) < 1
+
+
+def test_progress_batcher_coalesces_updates(database):
+    jobs = [RenderJob.create(title=f'job {i}').id for i in range(WRITERS)]
+
+    with ProgressBatcher(flush_interval=0.05) as progress:
+        def worker(job_id):
+            def run():
+                for percent in range(UPDATES_PER_WRITER):
+                    progress.update(job_id, status='running', stage='encode', progress=percent)
+                    time.sleep(0.001)
+                progress.update(job_id, status='done', progress=100, output_path=f'{job_id}.mp4')
+            return run
+
+        errors = run_threads([worker(job_id) for job_id in jobs])
+
+    assert not errors
+    assert all(job.status == 'done' and job.progress == 100 for job in RenderJob.select())
+    assert progress.rows_written < WRITERS * (UPDATES_PER_WRITER + 1)
@@ -0,0 +1,46 @@
+from conftest import requires_ffmpeg, video_size_and_duration
+from core.config import Config
+from core.fanout import FanOutRenderer
+from processors.caption_processor import CaptionProcessor
+from processors.tts_processor import TTSProcessor
+from utils.cache import DiskCache
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.render_profile import PREVIEW_PROFILE, use_render_profile
+
+pytestmark = requires_ffmpeg
+
+
+def count_calls(monkeypatch, owner, name) -> list:
+    calls = []
+    original = getattr(owner, name)
+
+    def counted(*args, **kwargs):
+        calls.append(args)
+        return original(*args, **kwargs)
+
+    monkeypatch.setattr(owner, name, counted)
+    return calls
+
+
+def test_brand_kits_share_the_narration_and_the_normalized_clips(brand_kit, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'PROXY_CACHE_FOLDER', str(tmp_path / 'proxies'))
+    narrations = count_calls(monkeypatch, TTSProcessor, 'generate_audio')
+    transcriptions = count_calls(monkeypatch, CaptionProcessor, 'transcribe')
+    normalizations = count_calls(monkeypatch, FFmpegUtils, 'normalize_video_resolution')
+    proxy_lookups = count_calls(monkeypatch, DiskCache, 'get_or_create')
+
+    renderer = FanOutRenderer.__new__(FanOutRenderer)
+    renderer.brand_kits = [brand_kit.replace(id=1, name='first'),
+                           brand_kit.replace(id=2, name='second', transition_names=('wipeleft',))]
+    output_files = {'first': str(tmp_path / 'first.mp4'), 'second': str(tmp_path / 'second.mp4')}
+
+    with use_render_profile(PREVIEW_PROFILE):
+        results = renderer.render('Title', 'One script for both channels', output_files)
+
+    assert results == output_files
+    # Same voice and language: one narration and one transcription for both brand kits
+    assert (len(narrations), len(transcriptions)) == (1, 1)
+    # The windows of the second brand kit are the same, they come from the normalized_clips cache
+    # without even a look into the proxy cache
+    assert len(normalizations) == len(proxy_lookups) == len(brand_kit.source_videos_paths)
+    assert video_size_and_duration(results['first'])[0] == video_size_and_duration(results['second'])[0]
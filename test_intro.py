@@ -0,0 +1,70 @@
+import os
+import subprocess
+
+import pytest
+
+from conftest import requires_ffmpeg, video_size_and_duration
+from core.workspace import JobWorkspace
+from database.models import AutoIntroSetting, BrandKit
+from database.snapshot import AutoIntroSettingSnapshot, BrandKitSnapshot
+from processors.intro_processor import IntroProcessor
+from utils.render_profile import RenderProfile, use_render_profile
+
+
+def make_brand_kit(**changes) -> BrandKitSnapshot:
+    defaults = {field.name: field.default for field in BrandKit._meta.sorted_fields if not callable(field.default)}
+    return BrandKitSnapshot(**dict(defaults, name='intro', aspect_ratio='16:9', **changes))
+
+
+def intro_settings(background_type: str, background_value: str) -> AutoIntroSettingSnapshot:
+    defaults = {field.name: field.default for field in AutoIntroSetting._meta.sorted_fields
+                if not callable(field.default)}
+    return AutoIntroSettingSnapshot(**dict(defaults, text='Intro', duration=2, background_type=background_type,
+                                           background_value=background_value))
+
+
+def test_ready_intro_clip_gives_every_title_its_own_file(tmp_path):
+    intro_clip = tmp_path / 'intro.mp4'
+    intro_clip.write_bytes(b'intro')
+
+    with JobWorkspace('intros', base_folder=str(tmp_path)) as workspace:
+        intros = IntroProcessor(make_brand_kit(intro_clip_path=str(intro_clip)), workspace).create_intros(
+            ['First', 'Second', 'Third'])
+        assert len(set(intros)) == 3
+        # The intros share one copy, the clip of the user is never linked
+        assert not any(os.path.samefile(path, intro_clip) for path in intros)
+        with open(intros[1], 'r+b') as f:
+            f.write(b'INTRO')
+        assert intro_clip.read_bytes() == b'intro'
+        # Moving the intro of one title keeps the others
+        os.replace(intros[0], str(tmp_path / 'delivered.mp4'))
+        assert all(open(path, 'rb').read() == b'INTRO' for path in intros[1:])
+    assert intro_clip.read_bytes() == b'intro'
+
+
+@requires_ffmpeg
+@pytest.mark.parametrize('background_type', ['color', 'image', 'video'])
+def test_intros_of_every_background_are_rendered_in_one_run(tmp_path, background_type):
+    backgrounds = {
+        'color': ('#336699', None),
+        'image': (str(tmp_path / 'background.png'), ['-f', 'lavfi', '-i', 'testsrc=size=400x300', '-frames:v', '1']),
+        # Shorter than the intro, it is looped
+        'video': (str(tmp_path / 'background.mp4'), ['-f', 'lavfi', '-i', 'testsrc=size=640x360:rate=30', '-t', '1',
+                                                     '-pix_fmt', 'yuv420p']),
+    }
+    background_value, make_background = backgrounds[background_type]
+    if make_background:
+        subprocess.run(['ffmpeg', '-v', 'error', *make_background, '-y', background_value], check=True)
+    brand_kit = make_brand_kit(auto_intro_settings=intro_settings(background_type, background_value))
+
+    with use_render_profile(RenderProfile('intro', height=180, fps=30)), \
+            JobWorkspace('intros', base_folder=str(tmp_path)) as workspace:
+        processor = IntroProcessor(brand_kit, workspace)
+        intros = processor.create_intros(['First title', 'Second title'])
+        single = processor.create_intro('Only title')
+
+        assert len(set(intros)) == 2
+        for path in intros + [single]:
+            size, duration = video_size_and_duration(path)
+            assert size == (320, 180)
+            assert duration == pytest.approx(2, abs=0.1)
@@ -0,0 +1,173 @@
+import datetime
+import multiprocessing
+import time
+
+import peewee as pw
+import pytest
+
+from core.config import Config
+from core.worker import RenderWorker
+from database.job_coordinator import JobCoordinator, RemoteJobQueue
+from database.job_queue import enqueue_job, ensure_job_queue, finish_job, lease_job
+from database.models import (DATABASE_PRAGMAS, AutoIntroSetting, BrandKit, BrandKitTransition, Caption, RenderJob,
+                             SourceVideos, TracedSqliteDatabase, Transition, Voice)
+from database.progress import ProgressBatcher
+
+MODELS = [Voice, BrandKit, RenderJob]
+JOBS = 12
+WORKERS = 3
+
+
+def open_database(path: str) -> TracedSqliteDatabase:
+    return TracedSqliteDatabase(path, pragmas=DATABASE_PRAGMAS, thread_safe=True,
+                                timeout=Config.DATABASE_BUSY_TIMEOUT_MS / 1000)
+
+
+def fake_render(job, callback, output_file):
+    for stage, percent in (('tts', 0), ('content', 50)):
+        callback(stage, percent)
+        time.sleep(0.02)
+    with open(output_file, 'w') as f:
+        f.write(f"video of job {job.id} with {job.brand_kit.name if job.brand_kit else None}")
+    return output_file
+
+
+def run_worker(path: str) -> dict:
+    # Runs in its own process with its own connection, like a worker on another machine
+    with open_database(path).bind_ctx(MODELS):
+        return RenderWorker(render=fake_render, poll_interval=0.05).run(drain=True)
+
+
+@pytest.fixture
+def database_path(tmp_path):
+    path = str(tmp_path / 'render_jobs.db')
+    test_db = open_database(path)
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables([Voice, BrandKit])
+        ensure_job_queue()
+        yield path
+    test_db.close()
+
+
+def test_worker_processes_render_every_job_once(database_path, tmp_path):
+    for i in range(JOBS):
+        enqueue_job(None, f'video {i}', target_path=str(tmp_path / f'video_{i}.mp4'))
+
+    with multiprocessing.get_context('spawn').Pool(WORKERS) as pool:
+        stats = pool.map(run_worker, [database_path] * WORKERS)
+
+    assert sum(worker_stats['done'] for worker_stats in stats) == JOBS
+    jobs = list(RenderJob.select())
+    assert all(job.status == 'done' and job.attempts == 1 and job.output_path == job.target_path for job in jobs)
+    assert sorted(path.name for path in tmp_path.glob('*.mp4')) == sorted(f'video_{i}.mp4' for i in range(JOBS))
+
+
+def test_expired_lease_goes_back_to_the_queue(database_path, tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'JOB_MAX_ATTEMPTS', 2)
+    job = enqueue_job(None, 'video', target_path=str(tmp_path / 'video.mp4'))
+
+    # A worker takes the job and dies without renewing the lease
+    assert lease_job('dead worker', lease_seconds=0.05).id == job.id
+    time.sleep(0.1)
+    assert RenderWorker('live worker', render=fake_render).run(drain=True)['done'] == 1
+    assert not finish_job(job.id, 'dead worker', 'late.mp4')
+
+    job = RenderJob.get_by_id(job.id)
+    assert (job.status, job.worker, job.attempts, job.output_path) == ('done', 'live worker', 2, job.target_path)
+
+    # Without attempts left an expired job fails instead
+    failing = enqueue_job(None, 'video')
+    for _ in range(2):
+        lease_job('dead worker', lease_seconds=0.05)
+        time.sleep(0.1)
+    assert lease_job('live worker') is None
+    assert RenderJob.get_by_id(failing.id).status == 'failed'
+
+
+def test_worker_losing_the_lease_leaves_the_job_to_the_new_owner(database_path, tmp_path):
+    target = tmp_path / 'video.mp4'
+    job = enqueue_job(None, 'video', target_path=str(target))
+    stages = []
+
+    def slow_render(job, callback, output_file):
+        fake_render(job, callback, output_file)
+        # The lease expired meanwhile and another worker took the job
+        RenderJob.update(worker='new owner', attempts=2).where(RenderJob.id == job.id).execute()
+        time.sleep(0.1)
+        callback('late stage', 90)
+        stages.append('late stage')
+        return output_file
+
+    stats = RenderWorker('old owner', lease_seconds=0.06, render=slow_render).run(max_jobs=1)
+
+    # The render stopped at the next stage and its video was dropped
+    assert stats['lost'] == 1 and stages == []
+    assert list(tmp_path.glob('*.mp4')) == []
+    assert RenderJob.get_by_id(job.id).worker == 'new owner'
+
+    # Late progress of the old owner does not overwrite the progress of the new one
+    RenderJob.update(stage='content', progress=50).where(RenderJob.id == job.id).execute()
+    with ProgressBatcher(flush_interval=60, worker='old owner') as progress:
+        progress.update(job.id, stage='late stage', progress=90)
+    job = RenderJob.get_by_id(job.id)
+    assert (job.status, job.worker, job.stage, job.progress) == ('running', 'new owner', 'content', 50)
+
+
+def run_remote_worker(url: str) -> dict:
+    # A worker on another machine: the database file is out of reach, only the coordinator is not
+    with pw.SqliteDatabase(None).bind_ctx(MODELS):
+        return RenderWorker(render=fake_render, poll_interval=0.05, queue=RemoteJobQueue(url, 'secret')).run(drain=True)
+
+
+@pytest.fixture
+def coordinator(database_path):
+    coordinator = JobCoordinator('127.0.0.1', 0, token='secret')
+    coordinator.start()
+    yield coordinator
+    coordinator.stop()
+
+
+def test_workers_on_other_machines_render_every_job_once_through_the_coordinator(coordinator, tmp_path):
+    brand_kit_models = [AutoIntroSetting, Caption, Transition, BrandKitTransition, SourceVideos]
+    with RenderJob._meta.database.bind_ctx(brand_kit_models):
+        RenderJob._meta.database.create_tables(brand_kit_models)
+        brand_kit = BrandKit.create(name='kit', script_to_voice_over='script')
+        SourceVideos.create(brand_kit=brand_kit, path='/mnt/media/clip.mp4')
+        for i in range(JOBS):
+            enqueue_job(brand_kit.id if i % 2 else None, f'video {i}', target_path=str(tmp_path / f'video_{i}.mp4'))
+
+        with multiprocessing.get_context('spawn').Pool(WORKERS) as pool:
+            stats = pool.map(run_remote_worker, [coordinator.url] * WORKERS)
+
+    assert sum(worker_stats['done'] for worker_stats in stats) == JOBS
+    jobs = list(RenderJob.select())
+    assert all(job.status == 'done' and job.attempts == 1 and job.progress == 100 and job.lease_expires_at is None
+               and job.output_path == job.target_path for job in jobs)
+    # The brand kit is sent with the job
+    for job in jobs:
+        with open(job.target_path) as f:
+            assert f.read() == f"video of job {job.id} with {'kit' if job.brand_kit_id else None}"
+
+
+def test_coordinator_only_answers_its_workers(coordinator):
+    job = enqueue_job(None, 'video')
+    with pytest.raises(RuntimeError, match='401'):
+        RemoteJobQueue(coordinator.url, 'wrong').lease_job('intruder')
+
+    queue = RemoteJobQueue(coordinator.url, 'secret')
+    leased = queue.lease_job('remote worker', lease_seconds=30)
+    assert leased.id == job.id and queue.lease_job('other worker') is None
+    # Leases are in UTC of the coordinator, whatever the time zone of the workers
+    expires = RenderJob.get_by_id(job.id).lease_expires_at
+    assert abs((expires - datetime.datetime.utcnow()).total_seconds() - 30) < 5
+
+    with pytest.raises(RuntimeError, match='400'):
+        queue.write_progress({job.id: {'worker': 'other worker'}}, 'remote worker')
+    with pytest.raises(RuntimeError, match='400'):
+        queue.write_progress({job.id: {'status': 'queued'}}, 'remote worker')
+    queue.write_progress({job.id: {'stage': 'captions', 'progress': 65, 'updated_at': None}}, 'remote worker')
+    assert not queue.renew_lease(job.id, 'other worker')
+    assert queue.finish_job(job.id, 'remote worker', error='TTS provider is not available')
+
+    job = RenderJob.get_by_id(job.id)
+    assert (job.status, job.stage, job.progress, job.error) == ('failed', 'captions', 65, 'TTS provider is not available')
@@ -0,0 +1,56 @@
+import json
+
+import pytest
+
+from utils.metrics import MetricsCollector, collect_metrics, measure_ffmpeg, measure_stage
+
+
+def make_file(path, size):
+    with open(path, 'wb') as f:
+        f.write(b'\0' * size)
+    return str(path)
+
+
+def test_ffmpeg_run_counts_every_output(tmp_path):
+    source = make_file(tmp_path / 'source.mp4', 300)
+    outputs = [str(tmp_path / 'video_1080.mp4'), str(tmp_path / 'video_720.mp4')]
+    command = ['ffmpeg', '-y', '-i', source, '-map', '0', '-c:v', 'libx264', outputs[0],
+               '-map', '0', '-s', '1280x720', outputs[1]]
+
+    with collect_metrics('job') as metrics:
+        with measure_stage('resolutions'):
+            with measure_ffmpeg([command], 'encode') as run:
+                make_file(outputs[0], 1000)
+                make_file(outputs[1], 400)
+                run['stderr'] = 'frame=  50 speed=2.5x\nframe= 100 speed=3.0x'
+
+    record, = metrics.ffmpeg_records()
+    assert (record['stage'], record['status'], record['speed']) == ('resolutions', 'ok', 3.0)
+    assert (record['input_bytes'], record['output_bytes']) == (300, 1400)
+    assert [stage['stage'] for stage in metrics.stage_records()] == ['resolutions']
+
+
+def test_metrics_are_saved_as_json_lines_and_prometheus_text(tmp_path):
+    collector = MetricsCollector('job-1')
+    for output_bytes in (1000, 400):
+        collector.add({'type': 'ffmpeg', 'stage': 'captions', 'kind': 'encode', 'status': 'ok',
+                       'wall_time': 2.0, 'speed': 1.5, 'cpu_user': 3.0, 'cpu_system': 0.5,
+                       'peak_rss_bytes': 1024, 'processes': 1, 'input_bytes': 500,
+                       'output_bytes': output_bytes, 'output': 'video.mp4'})
+    collector.add({'type': 'stage', 'stage': 'captions', 'status': 'ok', 'wall_time': 4.5,
+                   'cpu_user': 6.0, 'cpu_system': 1.0})
+
+    path = collector.save(str(tmp_path / 'metrics'))
+    assert path.endswith('job-1.jsonl')
+    with open(path) as f:
+        assert [json.loads(line) for line in f] == collector.records
+
+    with open(collector.save(str(tmp_path / 'metrics'), 'prometheus')) as f:
+        lines = f.read().splitlines()
+    assert 'videomaker_ffmpeg_runs_total{job="job-1",stage="captions"} 2' in lines
+    assert 'videomaker_ffmpeg_output_bytes_total{job="job-1",stage="captions"} 1400' in lines
+    assert 'videomaker_ffmpeg_media_seconds_total{job="job-1",stage="captions"} 6.0' in lines
+    assert 'videomaker_stage_wall_seconds{job="job-1",stage="captions"} 4.5' in lines
+
+    with pytest.raises(ValueError):
+        collector.save(str(tmp_path / 'metrics'), 'csv')
@@ -0,0 +1,150 @@
+import os
+import shutil
+import subprocess
+import sys
+
+import pytest
+
+from core.frame_preview import FramePreviewer
+from core.timeline import ClipWindow, RenderPlan
+from database.models import BrandKit, Caption
+from database.snapshot import BrandKitSnapshot, CaptionSnapshot
+from utils.cache import DiskCache, file_key, pin_cached_files
+from utils.render_profile import FINAL_PROFILE, PREVIEW_PROFILE, RenderProfile, current_render_profile, use_render_profile
+
+
+def test_final_profile_keeps_the_full_resolution_and_commands():
+    command = ['ffmpeg', '-i', 'in.mp4', '-c:v', 'libx264', '-y', 'out.mp4']
+    assert FINAL_PROFILE.resolution(1920, 1080) == (1920, 1080)
+    assert FINAL_PROFILE.apply(command) == command
+    assert FINAL_PROFILE.frame_rate_filter() == ''
+
+
+def test_preview_profile_scales_the_short_side_and_keeps_sides_even():
+    profile = RenderProfile('preview', height=480, fps=15)
+    assert profile.resolution(1920, 1080) == (854, 480)
+    assert profile.resolution(1080, 1920) == (480, 854)
+    assert profile.frame_rate_filter() == ',fps=15'
+
+
+def test_encoder_options_are_added_to_known_codecs_only():
+    profile = RenderProfile('preview', encoder_args={'libx264': ('-preset', 'ultrafast')})
+    command = ['ffmpeg', '-i', 'a.mp4', '-c:v', 'libx264', 'a_out.mp4', '-c:v', 'copy', 'b_out.mp4']
+    assert profile.apply(command) == ['ffmpeg', '-i', 'a.mp4', '-c:v', 'libx264', '-preset', 'ultrafast',
+                                      'a_out.mp4', '-c:v', 'copy', 'b_out.mp4']
+
+
+def test_profile_is_scoped_to_the_with_block():
+    with use_render_profile(PREVIEW_PROFILE):
+        assert current_render_profile() is PREVIEW_PROFILE
+    assert current_render_profile() is FINAL_PROFILE
+
+
+def test_disk_cache_creates_once_and_keys_on_the_source_file(tmp_path):
+    source = tmp_path / 'clip.mp4'
+    source.write_bytes(b'source')
+    cache = DiskCache(str(tmp_path / 'cache'), max_mb=1)
+    created = []
+
+    def create(path):
+        created.append(path)
+        with open(path, 'wb') as f:
+            f.write(b'proxy')
+
+    first = cache.get_or_create((file_key(str(source)), 0.0, 3.0), create)
+    second = cache.get_or_create((file_key(str(source)), 0.0, 3.0), create)
+    assert first == second and len(created) == 1
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    source.write_bytes(b'edited source')
+    assert cache.get_or_create((file_key(str(source)), 0.0, 3.0), create) != first
+
+
+def test_disk_cache_removes_least_recently_used_files(tmp_path):
+    cache = DiskCache(str(tmp_path), max_mb=1)
+    chunk = b'x' * (400 * 1024)
+    paths = []
+    for i in range(3):
+        paths.append(cache.get_or_create((i,), lambda path: open(path, 'wb').write(chunk)))
+        os.utime(paths[-1], (i, i))
+    cache.get_or_create((3,), lambda path: open(path, 'wb').write(chunk))
+    assert not os.path.exists(paths[0]) and os.path.exists(paths[2])
+
+
+def test_render_plan_round_trip(tmp_path):
+    plan = RenderPlan('Brand', 'Title', 'voice.mp3', [{'start': 0.0, 'end': 1.5, 'text': 'Hello'}],
+                      [ClipWindow('a.mp4', 0.0, 3.0), ClipWindow('b.mp4', 1.25, None)])
+    assert RenderPlan.load(plan.save(str(tmp_path / 'video.plan.json'))) == plan
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='FFmpeg is not installed')
+def test_frame_preview_is_cached_by_the_overlay_settings(tmp_path):
+    brand_kit = BrandKitSnapshot(**{field.name: field.default for field in BrandKit._meta.sorted_fields
+                                    if not callable(field.default)})
+    brand_kit = brand_kit.replace(caption_config=CaptionSnapshot(**{field.name: field.default
+                                                                    for field in Caption._meta.sorted_fields}))
+    previewer = FramePreviewer(DiskCache(str(tmp_path), max_mb=16))
+
+    with use_render_profile(PREVIEW_PROFILE):
+        first = previewer.render(brand_kit)
+        assert previewer.render(brand_kit) == first
+        moved = previewer.render(brand_kit.replace(caption_config=brand_kit.caption_config.replace(position='center')))
+
+    assert moved != first
+    assert open(first, 'rb').read(8) == b'\x89PNG\r\n\x1a\n'
+    # The background is rendered once, every setting once
+    assert (previewer.cache.hits, previewer.cache.misses) == (3, 3)
+
+
+def test_disk_cache_keeps_files_pinned_by_the_render(tmp_path):
+    cache = DiskCache(str(tmp_path), max_mb=1)
+    chunk = b'x' * (400 * 1024)
+    with pin_cached_files():
+        paths = [cache.get_or_create((i,), lambda path: open(path, 'wb').write(chunk)) for i in range(4)]
+        # Over max_mb, but every file is still read by the render
+        assert all(os.path.exists(path) for path in paths)
+    cache.get_or_create((4,), lambda path: open(path, 'wb').write(chunk))
+    assert not os.path.exists(paths[0])
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.pin')]
+
+
+PINNING_RENDER = """
+import sys
+from utils.cache import DiskCache, pin_cached_files
+
+cache = DiskCache(sys.argv[1], max_mb=1)
+with pin_cached_files():
+    cache.get_or_create(('pinned',), lambda path: open(path, 'wb').write(b'x' * (400 * 1024)))
+    print('pinned', flush=True)
+    sys.stdin.read()
+"""
+
+
+def start_pinning_render(folder: str) -> subprocess.Popen:
+    render = subprocess.Popen([sys.executable, '-c', PINNING_RENDER, folder], stdin=subprocess.PIPE,
+                              stdout=subprocess.PIPE, text=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+    assert render.stdout.readline() == 'pinned\n'
+    return render
+
+
+def test_disk_cache_keeps_files_pinned_by_renders_of_other_processes(tmp_path):
+    cache = DiskCache(str(tmp_path), max_mb=1)
+    chunk = b'x' * (400 * 1024)
+    pinned = cache.path(('pinned',))
+    fill = lambda path: open(path, 'wb').write(chunk)
+
+    render = start_pinning_render(str(tmp_path))
+    for i in range(3):
+        cache.get_or_create((i,), fill)
+    assert os.path.exists(pinned)
+    render.communicate('')
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.pin')]
+
+    # A killed render leaves its pin behind, the pin is removed with the file
+    render = start_pinning_render(str(tmp_path))
+    render.kill()
+    render.wait()
+    os.utime(pinned, (0, 0))
+    cache.get_or_create((3,), fill)
+    assert not os.path.exists(pinned)
+    assert not [name for name in os.listdir(tmp_path) if name.endswith('.pin')]
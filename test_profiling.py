@@ -0,0 +1,57 @@
+import os
+import pstats
+import time
+
+from utils.profiling import ProfileSession, profile_job, record_ffmpeg_benchmark, with_ffmpeg_benchmark
+
+
+def busy_render(seconds: float = 0.1):
+    deadline = time.perf_counter() + seconds
+    while time.perf_counter() < deadline:
+        sum(range(1000))
+
+
+def test_job_profile_is_saved_as_pstats_and_collapsed_stacks(tmp_path):
+    output_dir = str(tmp_path / 'profile')
+    with profile_job('all', output_dir, sampling_interval=0.001):
+        busy_render()
+        command = with_ffmpeg_benchmark(['ffmpeg', '-i', 'clip.mp4', 'out.mp4'])
+        record_ffmpeg_benchmark(command, 'frame=  1\nbench: utime=0.100s stime=0.010s rtime=0.200s\n')
+
+    assert sorted(os.listdir(output_dir)) == ['ffmpeg_benchmark.log', 'profile.collapsed',
+                                              'profile.pstats', 'profile.txt']
+    stats = pstats.Stats(os.path.join(output_dir, 'profile.pstats'))
+    assert any(function == 'busy_render' for _, _, function in stats.stats)
+
+    with open(os.path.join(output_dir, 'profile.collapsed')) as f:
+        lines = f.read().splitlines()
+    assert lines and all(line.rsplit(' ', 1)[1].isdigit() for line in lines)
+    assert any(';busy_render (test_profiling.py:' in line for line in lines)
+
+    with open(os.path.join(output_dir, 'ffmpeg_benchmark.log')) as f:
+        assert f.read() == ('ffmpeg -benchmark -i clip.mp4 out.mp4\n'
+                            '  bench: utime=0.100s stime=0.010s rtime=0.200s\n')
+
+    # FFmpeg runs outside a profiled job are left alone
+    assert with_ffmpeg_benchmark(['ffmpeg', '-i', 'clip.mp4']) == ['ffmpeg', '-i', 'clip.mp4']
+
+
+def test_concurrent_job_is_sampled_while_another_is_profiled(tmp_path):
+    first = ProfileSession('cprofile', str(tmp_path / 'first'), 0.001)
+    second = ProfileSession('cprofile', str(tmp_path / 'second'), 0.001)
+    first.start()
+    try:
+        second.start()
+        busy_render(0.05)
+        second.stop()
+    finally:
+        first.stop()
+
+    assert first.profiler is not None and second.profiler is None
+    assert [os.path.basename(path) for path in second.save()] == ['profile.collapsed']
+
+    # The profiler is free again once the first job is done
+    third = ProfileSession('cprofile', str(tmp_path / 'third'), 0.001)
+    third.start()
+    third.stop()
+    assert third.profiler is not None and third.sampler is None
@@ -0,0 +1,73 @@
+import json
+import shutil
+import subprocess
+
+import pytest
+
+from conftest import count_frames
+from core.config import Config
+from core.segmented_encode import SegmentedEncoder, load_task, run_task
+from core.workspace import JobWorkspace
+
+
+def test_segments_are_whole_gops_and_cover_every_frame(monkeypatch):
+    monkeypatch.setattr(Config, 'SEGMENT_GOP_SECONDS', 2)
+    segments = SegmentedEncoder.plan(13.4, 30, 4)
+    assert segments == [(-0.016667, 3.983333), (3.983333, 7.983333), (7.983333, None)]
+    # A tail shorter than a GOP is not a segment of its own
+    assert SegmentedEncoder.plan(9, 30, 4)[-1] == (3.983333, None)
+
+
+ASS = """[Script Info]
+ScriptType: v4.00+
+PlayResX: 160
+PlayResY: 90
+
+[V4+ Styles]
+Format: Name, Fontname, Fontsize, PrimaryColour, Bold, Italic, Alignment, MarginL, MarginR, MarginV
+Style: Default,Arial,20,&H00FFFFFF,0,0,2,10,10,10
+
+[Events]
+Format: Layer, Start, End, Style, Text
+Dialogue: 0,0:00:01.00,0:00:04.00,Default,Captions
+"""
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='FFmpeg is not installed')
+@pytest.mark.parametrize('shared', (False, True))
+def test_joined_segments_keep_every_frame(tmp_path, monkeypatch, shared):
+    monkeypatch.setattr(Config, 'SEGMENT_GOP_SECONDS', 1)
+    source = str(tmp_path / 'source.mp4')
+    subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=160x90:rate=30', '-t', '5.2',
+                    '-pix_fmt', 'yuv420p', '-y', source], check=True)
+    ass_file = tmp_path / 'captions.ass'
+    ass_file.write_text(ASS)
+
+    shared_folder = str(tmp_path / 'shared') if shared else ''
+    with JobWorkspace('segments', base_folder=str(tmp_path)) as workspace:
+        output = SegmentedEncoder(workspace, segment_seconds=2, workers=2, shared_folder=shared_folder).encode(
+            source, str(tmp_path / 'output.mp4'), str(ass_file))
+
+    assert count_frames(output) == count_frames(source) == 156
+
+
+def test_tasks_hold_parameters_and_not_commands(tmp_path):
+    task = {'input': 'input.mp4', 'ass': 'captions.ass', 'start': 0.0, 'end': 2.0, 'output': 'segment_0000.mp4'}
+    claimed = tmp_path / 'segment_0000.json.node-1.claimed'
+    claimed.write_text(json.dumps(task))
+    loaded = load_task(str(claimed))
+    assert (loaded['input'], loaded['ass'], loaded['output']) == \
+           (str(tmp_path / 'input.mp4'), str(tmp_path / 'captions.ass'), str(tmp_path / 'segment_0000.mp4'))
+    claimed.write_text(json.dumps(dict(task, ass=None)))
+    assert load_task(str(claimed))['ass'] is None
+
+    for invalid in (dict(task, command=['sh', '-c', 'true']), dict(task, output='/etc/segment.mp4'),
+                    dict(task, output='../segment.mp4'), dict(task, start='0; rm'),
+                    dict(task, input='/home/user/.ssh/id_rsa'), dict(task, input='..'),
+                    dict(task, ass='../../other_job/captions.ass'), dict(task, ass='captions.mp4'),
+                    dict(task, ass=None, filter='movie=/etc/passwd')):
+        claimed.write_text(json.dumps(invalid))
+        with pytest.raises(ValueError):
+            run_task(str(claimed))
+        # The render waiting for the segment fails instead of waiting for it
+        assert (tmp_path / 'segment_0000.failed').exists()
@@ -0,0 +1,98 @@
+import json
+import pickle
+
+import peewee as pw
+import pytest
+
+from database.models import AutoIntroSetting, BrandKit, BrandKitTransition, Caption, SourceVideos, Transition, Voice
+from database.snapshot import BrandKitSnapshot, load_brand_kit_snapshot
+
+MODELS = [Voice, BrandKit, AutoIntroSetting, Caption, Transition, BrandKitTransition, SourceVideos]
+
+
+class CountingDatabase(pw.SqliteDatabase):
+    queries = 0
+
+    def execute_sql(self, sql, params=None, *args, **kwargs):
+        self.queries += 1
+        return super().execute_sql(sql, params, *args, **kwargs)
+
+
+@pytest.fixture
+def database(tmp_path):
+    test_db = CountingDatabase(str(tmp_path / 'brand_kits.db'))
+    with test_db.bind_ctx(MODELS):
+        test_db.create_tables(MODELS)
+        voice = Voice.create(provider='minimax', voice_id='narrator')
+        brand_kit = BrandKit.create(name='kit', voice=voice, script_to_voice_over='script')
+        AutoIntroSetting.create(brand_kit=brand_kit, text='Welcome')
+        Caption.create(brand_kit=brand_kit)
+        for name in ('fade', 'wipeleft'):
+            BrandKitTransition.create(brand_kit=brand_kit, transition=Transition.create(name=name))
+        for name in ('first', 'second'):
+            SourceVideos.create(brand_kit=brand_kit, path=f'{name}.mp4')
+        yield test_db
+    test_db.close()
+
+
+def test_snapshot_is_loaded_with_one_query_per_table(database):
+    database.queries = 0
+    snapshot = load_brand_kit_snapshot('kit')
+    # Brand kit with its voice, then intro settings, captions, transitions and source videos
+    assert database.queries == 5
+
+    assert (snapshot.name, snapshot.voice.voice_id, snapshot.auto_intro_settings.text) == ('kit', 'narrator', 'Welcome')
+    assert snapshot.caption_config.font == 'Arial'
+    assert sorted(snapshot.transition_names) == ['fade', 'wipeleft']
+    assert sorted(snapshot.source_videos_paths) == ['first.mp4', 'second.mp4']
+    assert database.queries == 5
+
+    with pytest.raises(BrandKit.DoesNotExist):
+        load_brand_kit_snapshot('unknown')
+
+
+def test_snapshot_is_read_only_and_hashable(database):
+    snapshot = load_brand_kit_snapshot('kit')
+    for obj, name in ((snapshot, 'music_volume'), (snapshot.voice, 'speed'), (snapshot.caption_config, 'font')):
+        with pytest.raises(AttributeError):
+            setattr(obj, name, None)
+        with pytest.raises(AttributeError):
+            delattr(obj, name)
+
+    again = load_brand_kit_snapshot('kit')
+    assert again is not snapshot and again == snapshot and hash(again) == hash(snapshot)
+    assert pickle.loads(pickle.dumps(snapshot)) == snapshot
+    assert len({snapshot, again}) == 1
+
+
+def test_replace_returns_a_changed_copy(database):
+    snapshot = load_brand_kit_snapshot('kit')
+    louder = snapshot.replace(music_volume=80, transition_names=('fade',))
+
+    assert (louder.music_volume, louder.transition_names) == (80, ('fade',))
+    assert snapshot.music_volume == 20 and louder != snapshot
+    assert isinstance(louder, BrandKitSnapshot) and louder.voice is snapshot.voice
+    with pytest.raises(ValueError):
+        snapshot.replace(unknown=1)
+
+
+def test_cache_key_changes_when_the_brand_kit_is_saved(database):
+    snapshot = load_brand_kit_snapshot('kit')
+    assert load_brand_kit_snapshot('kit').cache_key == snapshot.cache_key
+
+    brand_kit = BrandKit.get(BrandKit.name == 'kit')
+    brand_kit.music_volume = 50
+    brand_kit.save()
+
+    changed = load_brand_kit_snapshot('kit')
+    assert changed.cache_key[0] == snapshot.cache_key[0] and changed.cache_key != snapshot.cache_key
+    assert changed.music_volume == 50
+
+
+def test_snapshot_survives_json(database):
+    snapshot = load_brand_kit_snapshot('kit')
+    sent = json.loads(json.dumps(snapshot.to_dict()))
+
+    received = BrandKitSnapshot.from_dict(sent)
+    assert received == snapshot and received.cache_key == snapshot.cache_key
+    assert received.voice.voice_id == 'narrator' and received.transition_names == ('fade', 'wipeleft')
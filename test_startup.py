@@ -0,0 +1,10 @@
+import pytest
+
+from benchmarks.startup_benchmark import STARTUP_BUDGETS_MS, run_benchmark
+
+
+@pytest.mark.parametrize('module', list(STARTUP_BUDGETS_MS))
+def test_startup_import_budget(module):
+    result, = run_benchmark([module], repeat=3)
+    assert not result['heavy_modules'], f"{module} imports {result['heavy_modules']} at startup"
+    assert result['within_budget'], f"{module} takes {result['import_ms']} ms to import, budget {result['budget_ms']} ms"
@@ -0,0 +1,58 @@
+import subprocess
+import time
+
+import pytest
+
+from conftest import make_clip, requires_ffmpeg, video_size_and_duration
+from core.editor import VideoEditor
+from core.workspace import JobWorkspace
+from processors.caption_processor import CaptionProcessor
+from processors.video_processor import VideoProcessor
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.render_profile import RenderProfile, use_render_profile
+
+pytestmark = [requires_ffmpeg,
+              pytest.mark.skipif(not FFmpegUtils.streaming_supported(), reason='Named pipes are not supported')]
+
+
+def test_pipeline_streams_through_a_named_pipe(tmp_path):
+    fifo = FFmpegUtils.create_fifo(str(tmp_path / 'frames.nut'))
+    output = str(tmp_path / 'output.mp4')
+
+    FFmpegUtils.run_pipeline([
+        ['ffmpeg', '-f', 'lavfi', '-i', 'testsrc=size=160x90:rate=30', '-t', '2', *FFmpegUtils.stream_output_args(),
+         '-y', fifo],
+        ['ffmpeg', '-i', fifo, '-c:v', 'libx264', '-pix_fmt', 'yuv420p', '-y', output],
+    ], ['filter', 'encode'])
+
+    assert video_size_and_duration(output) == ((160, 90), pytest.approx(2, abs=0.1))
+
+
+def test_failed_stage_stops_the_whole_pipeline(tmp_path):
+    fifo = FFmpegUtils.create_fifo(str(tmp_path / 'frames.nut'))
+    start = time.perf_counter()
+
+    # The consumer fails, the endless producer is killed instead of blocking on the pipe
+    with pytest.raises(subprocess.CalledProcessError) as error:
+        FFmpegUtils.run_pipeline([
+            ['ffmpeg', '-f', 'lavfi', '-i', 'testsrc=size=160x90:rate=30', *FFmpegUtils.stream_output_args(),
+             '-y', fifo],
+            ['ffmpeg', '-i', fifo, '-c:v', 'no_such_encoder', '-y', str(tmp_path / 'output.mp4')],
+        ], ['filter', 'encode'])
+
+    assert 'no_such_encoder' in error.value.cmd and time.perf_counter() - start < 30
+
+
+def test_streaming_content_render_keeps_the_duration(brand_kit, tmp_path):
+    clips = [make_clip(str(tmp_path / f'normalized_{i}.mp4'), 2) for i in range(2)]
+
+    with use_render_profile(RenderProfile('streaming', height=180, fps=30)), \
+            JobWorkspace('streaming', base_folder=str(tmp_path)) as workspace:
+        caption_processor = CaptionProcessor(brand_kit, workspace)
+        ass_file = caption_processor.create_subtitles_file_from_segments(
+            [{'start': 0.0, 'end': 3.0, 'text': 'Streaming captions'}])
+        output = VideoEditor._render_content_streaming(VideoProcessor(brand_kit, workspace), caption_processor,
+                                                       ass_file, clips, workspace)
+
+        # Two clips of 2 seconds joined with a crossfade of 0.5 seconds
+        assert video_size_and_duration(output) == ((320, 180), pytest.approx(3.5, abs=0.1))
@@ -0,0 +1,42 @@
+import os
+import subprocess
+import sys
+
+from utils.ffmpeg_utils import ThreadBudget
+
+
+def test_every_output_gets_its_thread_limit():
+    command = ['ffmpeg', '-stream_loop', '-1', '-i', 'input.mp4', '-filter_complex', '[0:v]split=2[a][b]',
+               '-map', '[a]', '-c:v', 'libx264', '-an', 'landscape.mp4',
+               '-map', '[b]', '-c:v', 'libx264', '-y', 'portrait.mp4']
+
+    threaded = ThreadBudget.apply(command, 3, 2)
+
+    assert threaded[:5] == ['ffmpeg', '-filter_threads', '2', '-filter_complex_threads', '2']
+    for output in ('landscape.mp4', 'portrait.mp4'):
+        assert threaded[threaded.index(output) - 2:threaded.index(output)] == ['-threads', '3']
+    assert threaded.count('-threads') == 2
+    # Options and their values are kept in order
+    assert [arg for arg in threaded if arg not in ('-threads', '3')][5:] == command[1:]
+
+
+def test_commands_with_thread_options_are_kept():
+    command = ['ffmpeg', '-i', 'input.mp4', '-threads', '1', 'output.mp4']
+    assert ThreadBudget.apply(command, 3, 2) == command
+    assert ThreadBudget.apply(['ffprobe', 'input.mp4'], 3, 2) == ['ffprobe', 'input.mp4']
+
+
+def test_cores_are_shared_with_the_other_processes(tmp_path):
+    # Another live process (the one running the tests) is encoding, a dead one left its file behind
+    (tmp_path / f'{os.getppid()}.weight').write_text('4')
+    dead = subprocess.Popen([sys.executable, '-c', 'pass'])
+    dead.wait()
+    (tmp_path / f'{dead.pid}.weight').write_text('4')
+    budget = ThreadBudget(cores=8, shared_folder=str(tmp_path))
+
+    with budget.lease(['encode']) as ((threads, filter_threads),):
+        # Half of the cores, the other half belongs to the other process
+        assert (threads, filter_threads) == (4, 2)
+        assert (tmp_path / f'{os.getpid()}.weight').read_text() == '4'
+    assert not (tmp_path / f'{os.getpid()}.weight').exists()
+    assert not (tmp_path / f'{dead.pid}.weight').exists()
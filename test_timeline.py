@@ -0,0 +1,59 @@
+import random
+
+import pytest
+
+from core.timeline import ClipWindow, TimelinePlanner
+
+TRANSITION = 0.5
+
+
+def covered_duration(windows):
+    return sum(window.duration for window in windows) - TRANSITION * (len(windows) - 1)
+
+
+def planner(durations, **kwargs):
+    return TimelinePlanner(list(durations), TRANSITION, probe=durations.__getitem__, **kwargs)
+
+
+def test_without_target_every_clip_is_used_in_full():
+    windows = planner({'a.mp4': 10, 'b.mp4': 20}).plan()
+    assert windows == [ClipWindow('a.mp4', 0.0, None), ClipWindow('b.mp4', 0.0, None)]
+
+
+def test_only_needed_clips_are_probed_and_trimmed():
+    probed = []
+    durations = {f'{i}.mp4': 60 for i in range(100)}
+
+    def probe(clip):
+        probed.append(clip)
+        return durations[clip]
+
+    windows = TimelinePlanner(list(durations), TRANSITION, probe=probe).plan(12)
+    assert windows == [ClipWindow('0.mp4', 0.0, 12)]
+    assert probed == ['0.mp4']
+
+
+def test_windows_cover_the_target_with_transitions():
+    windows = planner({'a.mp4': 4, 'b.mp4': 3, 'c.mp4': 10}).plan(9)
+    assert [window.path for window in windows] == ['a.mp4', 'b.mp4', 'c.mp4']
+    assert covered_duration(windows) == pytest.approx(9)
+
+
+def test_short_library_is_cycled_and_too_short_clips_are_skipped():
+    windows = planner({'a.mp4': 3, 'tiny.mp4': 0.4}).plan(7)
+    assert {window.path for window in windows} == {'a.mp4'}
+    assert covered_duration(windows) >= 7
+
+
+def test_randomized_windows_stay_inside_the_clips():
+    durations = {f'{i}.mp4': 8 for i in range(5)}
+    windows = planner(durations, randomize=True, max_window=3, rng=random.Random(7)).plan(20)
+    assert covered_duration(windows) >= 20
+    for window in windows:
+        assert window.duration <= 3
+        assert 0 <= window.start <= durations[window.path] - window.duration
+
+
+def test_clips_shorter_than_a_transition_are_rejected():
+    with pytest.raises(ValueError):
+        planner({'tiny.mp4': 0.5}).plan(5)
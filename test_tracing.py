@@ -0,0 +1,50 @@
+import json
+import os
+
+import pytest
+
+from conftest import requires_ffmpeg
+from core.config import Config
+from core.editor import render_job
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.metrics import measure_stage
+from utils.tracing import trace_span
+
+
+@requires_ffmpeg
+def test_job_trace_is_saved_as_chrome_trace_events(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'TRACE_RENDERS', True)
+    monkeypatch.setattr(Config, 'TRACE_FOLDER', str(tmp_path / 'traces'))
+    monkeypatch.setattr(Config, 'METRICS_FOLDER', '')
+    monkeypatch.setattr(Config, 'TEMP_FOLDER', str(tmp_path / 'temp'))
+    monkeypatch.setattr(Config, 'SCRATCH_FOLDER', '')
+
+    with pytest.raises(ValueError):
+        with render_job('traced') as workspace:
+            job_id = workspace.job_id
+            with measure_stage('effects'):
+                FFmpegUtils.run_pipeline([
+                    ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'testsrc=size=64x36:d=0.5', '-f', 'null', '-'],
+                    ['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', 'sine=d=0.5', '-f', 'null', '-'],
+                ])
+            with trace_span('captions', 'stage'):
+                raise ValueError('no captions')
+
+    # Saved also when the job fails
+    with open(tmp_path / 'traces' / job_id / 'trace.json') as f:
+        trace = json.load(f)
+    assert trace['otherData'] == {'job': job_id} and trace['displayTimeUnit'] == 'ms'
+
+    spans = {event['name']: event for event in trace['traceEvents'] if event['ph'] == 'X'}
+    effects, captions = spans['effects'], spans['captions']
+    assert effects['cat'] == 'stage' and effects['pid'] == os.getpid() and effects['dur'] > 0
+    assert captions['args'] == {'error': "ValueError('no captions')"}
+
+    # Every process of the pipeline has its own named track inside the stage
+    processes = [event for event in trace['traceEvents'] if event['ph'] == 'X' and event['cat'] == 'ffmpeg']
+    assert len(processes) == 2 and len({event['tid'] for event in processes}) == 2
+    for event in processes:
+        assert event['args']['returncode'] == 0
+        assert effects['ts'] <= event['ts'] and event['ts'] + event['dur'] <= effects['ts'] + effects['dur']
+    track_names = {event['tid']: event['args']['name'] for event in trace['traceEvents'] if event['ph'] == 'M'}
+    assert {track_names[event['tid']] for event in processes} == {f'ffmpeg pid {event["tid"]}' for event in processes}
@@ -0,0 +1,72 @@
+import shutil
+import subprocess
+
+import pytest
+
+from conftest import count_frames
+from core.config import Config
+from core.workspace import JobWorkspace
+from database.models import BrandKit
+from database.snapshot import BrandKitSnapshot
+from processors.video_processor import VideoProcessor, transition_overlap, uses_cuts
+from utils.ffmpeg_utils import FFmpegUtils
+from utils.render_profile import RenderProfile, use_render_profile
+
+
+def make_brand_kit(transition_names) -> BrandKitSnapshot:
+    return BrandKitSnapshot(**{field.name: field.default for field in BrandKit._meta.sorted_fields
+                               if not callable(field.default)},
+                            transition_names=tuple(transition_names), source_videos_paths=('clip.mp4',))
+
+
+def test_brand_kits_without_crossfades_use_cuts():
+    assert uses_cuts(make_brand_kit([])) and uses_cuts(make_brand_kit(['cut', 'none']))
+    assert transition_overlap(make_brand_kit(['cut'])) == 0
+    assert not uses_cuts(make_brand_kit(['cut', 'fade']))
+    assert transition_overlap(make_brand_kit(['fade'])) == 0.5
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='FFmpeg is not installed')
+def test_cuts_join_clips_without_re_encoding(tmp_path, monkeypatch):
+    clips = []
+    for i, (source, seconds) in enumerate((('testsrc', 2), ('testsrc2', 1.5), ('smptebars', 1))):
+        clips.append(str(tmp_path / f"clip_{i}.mp4"))
+        # Clips with audio and without, like source clips used as they are next to normalized ones
+        audio = ['-f', 'lavfi', '-i', 'sine', '-c:a', 'aac'] if i != 1 else []
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f'{source}=size=320x180:rate=30', *audio,
+                        '-t', str(seconds), '-pix_fmt', 'yuv420p', '-y', clips[-1]], check=True)
+
+    commands = []
+    run_command = FFmpegUtils.run_command
+    monkeypatch.setattr(FFmpegUtils, 'run_command',
+                        staticmethod(lambda command, stage='encode': commands.append(command)
+                                     or run_command(command, stage)))
+
+    with JobWorkspace('cuts', base_folder=str(tmp_path)) as workspace:
+        output = VideoProcessor(make_brand_kit(['cut']), workspace).join_clips_with_transitions(normalized_clips=clips)
+        assert count_frames(output) == 135
+
+    assert len(commands) == 1 and commands[0][commands[0].index('-c') + 1] == 'copy'
+
+
+@pytest.mark.skipif(shutil.which('ffmpeg') is None, reason='FFmpeg is not installed')
+def test_cuts_join_normalized_clips_and_clips_with_another_time_scale(tmp_path, monkeypatch):
+    monkeypatch.setattr(Config, 'SKIP_CONFORMING_CLIPS', True)
+    clips = []
+    for i, (source, size, timescale) in enumerate((('testsrc2', '640x360', []),
+                                                   # A camera clip already in the output format, 120 kHz
+                                                   ('testsrc', '320x180', ['-video_track_timescale', '120000']),
+                                                   ('smptebars', '640x360', []))):
+        clips.append(str(tmp_path / f'clip_{i}.mp4'))
+        subprocess.run(['ffmpeg', '-v', 'error', '-f', 'lavfi', '-i', f'{source}=size={size}:rate=30', '-t', '2',
+                        '-c:v', 'libx264', '-pix_fmt', 'yuv420p', *timescale, '-y', clips[-1]], check=True)
+    brand_kit = make_brand_kit(['cut']).replace(source_videos_paths=tuple(clips), aspect_ratio='16:9',
+                                                randomize_clips=False)
+
+    with use_render_profile(RenderProfile('cuts', height=180, fps=30)), \
+            JobWorkspace('cuts', base_folder=str(tmp_path)) as workspace:
+        processor = VideoProcessor(brand_kit, workspace)
+        output = processor.join_clips_with_transitions(normalized_clips=processor.normalize_source_clips(6))
+
+        assert count_frames(output) == 180
+        assert FFmpegUtils.get_video_duration(output) == pytest.approx(6, abs=0.1)
@@ -0,0 +1,55 @@
+import os
+import shutil
+from collections import namedtuple
+
+import pytest
+
+from core.config import Config
+from core.workspace import JobWorkspace
+
+DiskUsage = namedtuple('DiskUsage', 'total used free')
+
+
+@pytest.fixture
+def folders(tmp_path, monkeypatch):
+    scratch, temp = tmp_path / 'scratch', tmp_path / 'temp'
+    monkeypatch.setattr(Config, 'SCRATCH_FOLDER', str(scratch))
+    monkeypatch.setattr(Config, 'TEMP_FOLDER', str(temp))
+    return scratch, temp
+
+
+def free_mb(monkeypatch, mb: int):
+    monkeypatch.setattr(shutil, 'disk_usage', lambda path: DiskUsage(mb * 2 ** 21, mb * 2 ** 20, mb * 2 ** 20))
+
+
+def test_workspace_is_created_in_the_scratch_folder(folders, monkeypatch):
+    scratch, _ = folders
+    free_mb(monkeypatch, 8192)
+    with JobWorkspace('My title: part 1', required_mb=4096) as workspace:
+        assert os.path.dirname(workspace.path) == str(scratch)
+        assert workspace.job_name == 'My_title_part_1' and workspace.job_id.startswith('My_title_part_1_')
+        assert workspace.file('clip.mp4') == os.path.join(workspace.path, 'clip.mp4')
+
+
+def test_scratch_folder_without_enough_free_space_falls_back_to_temp(folders, monkeypatch):
+    _, temp = folders
+    free_mb(monkeypatch, 100)
+    with JobWorkspace('job', required_mb=4096) as workspace:
+        assert os.path.dirname(workspace.path) == str(temp)
+
+
+def test_concurrent_workspaces_are_isolated(tmp_path):
+    with JobWorkspace('job', base_folder=str(tmp_path)) as first, \
+            JobWorkspace('job', base_folder=str(tmp_path)) as second:
+        assert first.path != second.path and first.job_id != second.job_id
+
+
+def test_workspace_is_removed_when_the_job_fails(tmp_path):
+    with pytest.raises(RuntimeError):
+        with JobWorkspace('job', base_folder=str(tmp_path)) as workspace:
+            with open(workspace.file('partial.mp4'), 'w') as f:
+                f.write('partial')
+            raise RuntimeError('encode failed')
+    assert not os.path.exists(workspace.path)
+    # A second cleanup is a no-op
+    workspace.cleanup()
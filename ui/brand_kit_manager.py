@@ -1,6 +1,7 @@
+import math
+import threading
 import tkinter as tk
 from tkinter import ttk, filedialog, messagebox, colorchooser
-from services.brand_kit_service import BrandKitService
 
 # --- Constants ---
 POSITION_CHOICES = [
@@ -18,7 +19,7 @@ CAPTION_FONT_CHOICES = [
     'Impact', 'Comic Sans MS', 'Roboto'
 ]
 TRANSITION_TYPE_CHOICES = [
-    'none', 'fade', 'dissolve', 'pixelize', 'radial', 'hblur', 'distance', 'wipeleft', 'wiperight', 'wipeup',
+    'none', 'cut', 'fade', 'dissolve', 'pixelize', 'radial', 'hblur', 'distance', 'wipeleft', 'wiperight', 'wipeup',
     'wipedown', 'slideleft', 'slideright', 'slideup', 'slidedown', 'diagtl', 'diagtr', 'diagbl', 'diagbr',
     'hlslice', 'hrslice', 'vuslice', 'vdslice', 'circlecrop', 'rectcrop', 'circleopen', 'circleclose',
     'fadeblack', 'fadewhite', 'fadegrays'
@@ -34,14 +35,6 @@ JOBS = [
     {'title': 'Short #2', 'status': 'Queued', 'progress': 0},
 ]
 
-try:
-    from tkmacosx import Button as MacButton
-
-    USE_MAC_BUTTON = True
-except ImportError:
-    USE_MAC_BUTTON = False
-
-
 # --- Error Display Widget ---
 class ErrorDisplay(tk.Frame):
     def __init__(self, parent):
@@ -146,7 +139,7 @@ class BrandKitEditor(tk.Toplevel):
     def __init__(self, master, brand_kit_service, brand_kit_name=None):
         super().__init__(master)
         self.title("BrandKit Editor")
-        self.geometry("900x700")
+        self.geometry("1350x700")
         self.resizable(True, True)
         self.brand_kit_service = brand_kit_service
         self.brand_kit_name = brand_kit_name
@@ -161,7 +154,6 @@ class BrandKitEditor(tk.Toplevel):
             self.load_brand_kit_data()
 
         self.notebook = ttk.Notebook(self)
-        self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
 
         self.tab_basic = ScrollableFrame(self.notebook)
         self.tab_effects = ScrollableFrame(self.notebook)
@@ -176,6 +168,10 @@ class BrandKitEditor(tk.Toplevel):
         # Initialize variables
         self.init_variables()
 
+        # The preview panel is packed first, the notebook takes the rest of the window
+        self.build_preview_panel()
+        self.notebook.pack(fill='both', expand=True, padx=10, pady=10)
+
         self.build_basic_tab(self.tab_basic.interior)
         self.build_effects_tab(self.tab_effects.interior)
         self.build_captions_tab(self.tab_captions.interior)
@@ -267,6 +263,7 @@ class BrandKitEditor(tk.Toplevel):
             self.avatar_background_color_var.set(brand_kit.get('avatar_background_color', ''))
 
             self.cta_path_var.set(brand_kit.get('subscribe_cta_path', ''))
+            self.cta_position_var.set(brand_kit.get('cta_position', 'bottom_center'))
             self.cta_interval_var.set(brand_kit.get('subscribe_cta_interval', 120))
 
             self.music_path_var.set(brand_kit.get('music_path', ''))
@@ -391,6 +388,10 @@ class BrandKitEditor(tk.Toplevel):
         ttk.Label(cta, text="Interval (sec):").grid(row=1, column=0, sticky='w', padx=5, pady=6)
         ttk.Entry(cta, textvariable=self.cta_interval_var, width=15).grid(row=1, column=1, padx=5, pady=6)
 
+        ttk.Label(cta, text="Position:").grid(row=2, column=0, sticky='w', padx=5, pady=6)
+        ttk.Combobox(cta, textvariable=self.cta_position_var, values=[p[0] for p in POSITION_CHOICES], width=20,
+                     state='readonly').grid(row=2, column=1, padx=5, pady=6)
+
         # Music
         music = ttk.LabelFrame(f, text="Music")
         music.pack(fill='x', padx=16, pady=8)
@@ -562,6 +563,7 @@ class BrandKitEditor(tk.Toplevel):
                 'avatar_background_color': self.avatar_background_color_var.get(),
                 'cta_path': self.cta_path_var.get() or None,
                 'cta_interval': self.cta_interval_var.get(),
+                'cta_position': self.cta_position_var.get(),
                 'music_path': self.music_path_var.get() or None,
                 'music_volume': self.music_volume_var.get(),
                 'lut_path': self.lut_path_var.get() or None,
@@ -646,6 +648,123 @@ class BrandKitEditor(tk.Toplevel):
         except Exception as e:
             self.error_display.show_error(f"Ошибка сохранения: {str(e)}")
 
+    def build_preview_panel(self):
+        """Frame of the video with the overlays and a caption line, refreshed when their settings change"""
+        panel = ttk.LabelFrame(self, text="Preview")
+        panel.pack(side='right', fill='y', padx=(0, 10), pady=10)
+
+        self.preview_label = ttk.Label(panel, text="Rendering preview...", anchor='center', width=60)
+        self.preview_label.pack(padx=8, pady=8)
+        ttk.Button(panel, text="Refresh", command=self.schedule_preview).pack(pady=(0, 8))
+
+        self.frame_previewer = None
+        self.preview_image = None
+        self._preview_base = None
+        self._preview_after_id = None
+        self._preview_thread = None
+        self._preview_result = None
+
+        preview_vars = (
+            self.aspect_ratio_var,
+            self.watermark_path_var, self.watermark_position_var,
+            self.avatar_path_var, self.avatar_position_var, self.avatar_background_color_var,
+            self.cta_path_var, self.cta_position_var,
+            self.caption_font_var, self.caption_font_size_var, self.caption_font_color_var,
+            self.caption_stroke_width_var, self.caption_stroke_color_var, self.caption_position_var,
+            self.caption_max_words_var,
+        )
+        for var in preview_vars:
+            var.trace_add('write', lambda *args: self.schedule_preview())
+        self.schedule_preview()
+
+    def schedule_preview(self, delay_ms: int = 150):
+        """Renders the preview once the settings stop changing, e.g. while going through the positions"""
+        if self._preview_after_id:
+            self.after_cancel(self._preview_after_id)
+        self._preview_after_id = self.after(delay_ms, self._start_preview)
+
+    def _start_preview(self):
+        self._preview_after_id = None
+        if self._preview_thread and self._preview_thread.is_alive():
+            self.schedule_preview(100)
+            return
+        try:
+            brand_kit = self._preview_brand_kit()
+            caption_text = ' '.join(self.script_var.get().split()[:self.caption_max_words_var.get()]) or None
+        except (tk.TclError, ValueError):
+            # A number field is being edited and is not a number yet
+            return
+        except Exception as e:
+            self.preview_label.config(image='', text=f"Preview is not available: {e}")
+            return
+
+        self._preview_thread = threading.Thread(target=self._render_preview, args=(brand_kit, caption_text),
+                                                daemon=True)
+        self._preview_thread.start()
+        self.after(50, self._show_preview)
+
+    def _render_preview(self, brand_kit, caption_text):
+        # Runs in a background thread, the result is shown by _show_preview in the UI thread
+        from core.frame_preview import FramePreviewer
+        from utils.render_profile import PREVIEW_PROFILE, use_render_profile
+
+        try:
+            self.frame_previewer = self.frame_previewer or FramePreviewer()
+            with use_render_profile(PREVIEW_PROFILE):
+                self._preview_result = ('ok', self.frame_previewer.render(brand_kit, caption_text))
+        except Exception as e:
+            self._preview_result = ('error', str(e))
+
+    def _show_preview(self):
+        if self._preview_thread.is_alive():
+            self.after(50, self._show_preview)
+            return
+        status, value = self._preview_result
+        if status != 'ok':
+            self.preview_label.config(image='', text=f"Preview failed: {value}")
+            return
+        image = tk.PhotoImage(file=value)
+        factor = math.ceil(max(image.width() / 420, image.height() / 560, 1))
+        self.preview_image = image.subsample(factor)
+        self.preview_label.config(image=self.preview_image, text='')
+
+    def _preview_brand_kit(self):
+        """Snapshot of the brand kit with the settings in the editor, also the ones not saved yet"""
+        from database.models import BrandKit, Caption
+        from database.snapshot import BrandKitSnapshot, CaptionSnapshot, load_brand_kit_snapshot
+
+        if self._preview_base is None:
+            if self.is_edit_mode:
+                self._preview_base = load_brand_kit_snapshot(self.brand_kit_name)
+            else:
+                self._preview_base = BrandKitSnapshot(**{field.name: field.default
+                                                         for field in BrandKit._meta.sorted_fields
+                                                         if not callable(field.default)})
+        base = self._preview_base
+
+        caption_defaults = {field.name: field.default for field in Caption._meta.sorted_fields}
+        caption_config = CaptionSnapshot(**{
+            **caption_defaults,
+            'font': self.caption_font_var.get(),
+            'font_size': self.caption_font_size_var.get(),
+            'font_color': self.caption_font_color_var.get(),
+            'stroke_width': self.caption_stroke_width_var.get(),
+            'stroke_color': self.caption_stroke_color_var.get(),
+            'position': self.caption_position_var.get(),
+            'max_words_per_line': self.caption_max_words_var.get(),
+        })
+        return base.replace(
+            aspect_ratio=self.aspect_ratio_var.get(),
+            watermark_path=self.watermark_path_var.get() or None,
+            watermark_position=self.watermark_position_var.get(),
+            avatar_path=self.avatar_path_var.get() or None,
+            avatar_position=self.avatar_position_var.get(),
+            avatar_background_color=self.avatar_background_color_var.get().lstrip('#') or base.avatar_background_color,
+            cta_path=self.cta_path_var.get() or None,
+            cta_position=self.cta_position_var.get(),
+            caption_config=caption_config,
+        )
+
     def browse_file(self, var):
         filename = filedialog.askopenfilename()
         if filename:
@@ -665,9 +784,14 @@ class VideoEditorMaxApp:
         self.root.geometry("1000x700")
         self.root.minsize(800, 600)
 
-        # Initialize services
+        # Initialize services, the database layer is imported once the window exists
         try:
+            from services.brand_kit_service import BrandKitService
             self.brand_kit_service = BrandKitService()
+            # Keeps the metadata of the source clips indexed while the app is open, renders read it instead of probing
+            from database.assets import AssetScanner
+            self.asset_scanner = AssetScanner()
+            self.asset_scanner.start()
         except Exception as e:
             messagebox.showerror("Ошибка", f"Не удалось инициализировать BrandKitService: {str(e)}")
             self.root.destroy()
@@ -0,0 +1,92 @@
+import errno
+import logging
+import os
+import shutil
+
+from utils.metrics import record_promotion
+
+try:
+    import fcntl
+except ImportError:  # Windows
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+# ioctl of Linux cloning the extents of a file: btrfs, XFS, bcachefs, OCFS2
+FICLONE = 0x40049409
+
+
+def promote_artifact(src: str, dst: str, move: bool = False, workspace: str = None) -> str:
+    """
+    Makes a finished file available under another name without copying its bytes when possible:
+    a rename when the source is not needed anymore, otherwise a hardlink or a reflink.
+    The file is copied only across filesystems. dst is replaced atomically, a reader never sees a half written file.
+
+    Args:
+        src: Finished file
+        dst: Path it is promoted to
+        move: The source is not used anymore and may disappear
+        workspace: Job workspace, only files inside it are hardlinked. A hardlink of an input of the user,
+            e.g. a source clip, shares its inode, and a later write to the link would change the original
+
+    Returns:
+        dst
+    """
+    if os.path.abspath(src) == os.path.abspath(dst):
+        return dst
+
+    size = os.path.getsize(src)
+    if move and _try(os.replace, src, dst):
+        method = 'rename'
+    else:
+        partial = f'{dst}.{os.getpid()}.partial'
+        if (workspace is None or is_inside(src, workspace)) and _try(os.link, src, partial):
+            method = 'hardlink'
+        elif _reflink(src, partial):
+            method = 'reflink'
+        else:
+            shutil.copy2(src, partial)
+            method = 'copy'
+        # A hardlink is a new name of the same file, replacing dst never writes into the source
+        os.replace(partial, dst)
+        if move:
+            os.remove(src)
+
+    record_promotion(dst, method, size)
+    logger.debug(f"Promoted {os.path.basename(src)} to {dst} by {method}")
+    return dst
+
+
+def is_inside(path: str, folder: str) -> bool:
+    """True when path is in folder or one of its subfolders, /tmp/job10/clip.mp4 is not inside /tmp/job1"""
+    path, folder = os.path.abspath(path), os.path.abspath(folder)
+    try:
+        return os.path.commonpath([path, folder]) == folder
+    except ValueError:  # Different drives on Windows
+        return False
+
+
+def _try(operation, src: str, dst: str) -> bool:
+    try:
+        operation(src, dst)
+        return True
+    except OSError as e:
+        # Another filesystem or one without links, any other error is real
+        if e.errno in (errno.EXDEV, errno.EPERM, errno.EACCES, errno.EMLINK, errno.ENOTSUP, errno.EOPNOTSUPP):
+            return False
+        raise
+
+
+def _reflink(src: str, dst: str) -> bool:
+    """Copy on write clone of the file, False when the filesystem cannot share extents"""
+    if fcntl is None:
+        return False
+    try:
+        with open(src, 'rb') as source, open(dst, 'wb') as target:
+            fcntl.ioctl(target.fileno(), FICLONE, source.fileno())
+        shutil.copystat(src, dst)
+        return True
+    except OSError:
+        if os.path.exists(dst):
+            os.remove(dst)
+        return False
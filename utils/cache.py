@@ -0,0 +1,236 @@
+import glob
+import hashlib
+import logging
+import os
+import socket
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Any, Callable, Hashable, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+PIN_EXTENSION = '.pin'
+# Pins of processes on other hosts sharing the cache folder can not be checked, they expire instead
+PIN_MAX_AGE = 24 * 3600
+
+_pinned_files: ContextVar[Optional['_Pins']] = ContextVar('pinned_cached_files', default=None)
+
+
+class _Pins:
+    """
+    Pin files of one render: an empty <cached file>.<host>_<pid>_<id>.pin next to every file it uses.
+    Every process pruning the cache folder sees them.
+    """
+
+    def __init__(self):
+        self.token = f"{socket.gethostname().replace('.', '-')}_{os.getpid()}_{uuid.uuid4().hex[:8]}"
+        self.files = set()
+
+    def add(self, path: str):
+        pin = f'{path}.{self.token}{PIN_EXTENSION}'
+        if pin not in self.files:
+            open(pin, 'w').close()
+            self.files.add(pin)
+
+    def release(self):
+        for pin in self.files:
+            try:
+                os.remove(pin)
+            except FileNotFoundError:
+                pass
+        self.files.clear()
+
+
+@contextmanager
+def pin_cached_files():
+    """
+    Keeps every DiskCache file handed out inside the `with` block from being pruned until the block ends,
+    also by other processes sharing the cache folder.
+    A render reads its proxies long after they were looked up, e.g. in the join of all clips.
+    """
+    pins = _Pins()
+    token = _pinned_files.set(pins)
+    try:
+        yield pins
+    finally:
+        _pinned_files.reset(token)
+        pins.release()
+
+
+def _pin_is_live(pin: str, mtime: float) -> bool:
+    """A pin is left behind when its process is gone, or is too old to belong to a render of another host"""
+    host, pid = os.path.basename(pin)[:-len(PIN_EXTENSION)].rsplit('.', 1)[1].rsplit('_', 2)[:2]
+    if os.name != 'posix' or host != socket.gethostname().replace('.', '-') or not pid.isdigit():
+        return time.time() - mtime < PIN_MAX_AGE
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        pass  # Alive, run by another user
+    return True
+
+
+class VersionedLRUCache:
+    """
+    Thread-safe LRU cache whose entries are stored together with the version of the data they were built from.
+    An entry is only returned while the caller still sees the same version, a different version drops it.
+    """
+
+    def __init__(self, maxsize: int = 128):
+        if maxsize < 1:
+            raise ValueError(f'Cache size must be at least 1, got {maxsize}')
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.stale = 0
+        self.evictions = 0
+
+    def get(self, key: Hashable, version: Any) -> Optional[Any]:
+        """Returns the cached value or None when it is missing or was built from another version"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None:
+                self.misses += 1
+                return None
+            if entry[0] != version:
+                del self._entries[key]
+                self.stale += 1
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, version: Any, value: Any):
+        with self._lock:
+            self._entries[key] = (version, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, key: Hashable = None):
+        """Drops one entry or, without a key, all of them"""
+        with self._lock:
+            if key is None:
+                self._entries.clear()
+            else:
+                self._entries.pop(key, None)
+
+    def __len__(self):
+        return len(self._entries)
+
+    def stats(self) -> dict:
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'stale': self.stale,
+                'evictions': self.evictions,
+                'hit_rate': round(self.hits / lookups, 3) if lookups else None,
+            }
+
+
+def file_key(path: str) -> tuple:
+    """Identifies the content of a file without reading it, changes when the file is replaced or edited"""
+    stat = os.stat(path)
+    return os.path.abspath(path), stat.st_size, stat.st_mtime_ns
+
+
+class DiskCache:
+    """
+    Folder with files derived from other files, e.g. proxies of source clips, kept between renders.
+    Files are named by a hash of their key. Above max_mb the least recently used ones are removed.
+    Several processes can share the folder: a file is written under a temporary name and renamed when complete.
+    """
+
+    def __init__(self, folder: str, max_mb: int):
+        self.folder = folder
+        self.max_bytes = max_mb * 1024 * 1024
+        self.hits = 0
+        self.misses = 0
+
+    def path(self, key: tuple, extension: str = '.mp4') -> str:
+        digest = hashlib.sha1(repr(key).encode('utf-8')).hexdigest()
+        return os.path.join(self.folder, f'{digest}{extension}')
+
+    def get_or_create(self, key: tuple, create: Callable[[str], Any], extension: str = '.mp4') -> str:
+        """
+        Returns the cached file for the key, calling create(path) to write it when it is missing.
+        The temporary path keeps the extension, FFmpeg picks the muxer by it.
+        """
+        path = self.path(key, extension)
+        os.makedirs(self.folder, exist_ok=True)
+        # Pinned before the lookup, so another process does not remove the file in between
+        pins = _pinned_files.get()
+        if pins is not None:
+            pins.add(path)
+        if os.path.exists(path):
+            os.utime(path)
+            self.hits += 1
+            return path
+
+        self.misses += 1
+        temp_path = f'{path[:-len(extension)]}.{os.getpid()}_{threading.get_ident()}.tmp{extension}'
+        try:
+            create(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        self.prune(keep=(path,))
+        return path
+
+    def prune(self, keep: Iterable[str] = ()):
+        """
+        Removes the least recently used files until the folder fits into max_mb.
+        The files in keep and the ones pinned by running renders of any process are never removed,
+        pins left behind by killed processes are removed.
+        """
+        keep = set(keep)
+        entries = []
+        for entry in os.scandir(self.folder):
+            try:
+                if not entry.is_file():
+                    continue
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            if entry.name.endswith(PIN_EXTENSION):
+                if _pin_is_live(entry.path, stat.st_mtime):
+                    keep.add(os.path.join(self.folder, entry.name[:-len(PIN_EXTENSION)].rsplit('.', 1)[0]))
+                else:
+                    self._remove_pin(entry.path)
+            elif '.tmp' not in entry.name:
+                entries.append((stat.st_mtime, stat.st_size, entry.path))
+        total = sum(size for _, size, _ in entries)
+        for _, size, path in sorted(entries):
+            if total <= self.max_bytes:
+                break
+            # Pinned since the scan
+            if path in keep or glob.glob(f'{glob.escape(path)}.*{PIN_EXTENSION}'):
+                continue
+            try:
+                os.remove(path)
+                total -= size
+                logger.debug(f"Removed cached file: {path}")
+            except FileNotFoundError:
+                pass
+
+    @staticmethod
+    def _remove_pin(pin: str):
+        try:
+            os.remove(pin)
+            logger.debug(f"Removed pin of a finished process: {pin}")
+        except FileNotFoundError:
+            pass
@@ -1,23 +1,326 @@
+import os
+import re
 import subprocess
 import json
 import logging
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from typing import List
 
 from core.config import Config
+from utils.metrics import measure_ffmpeg
+from utils.profiling import record_ffmpeg_benchmark, with_ffmpeg_benchmark
+from utils.render_profile import current_render_profile
+from utils.tracing import current_tracer, trace_span
 
 logger = logging.getLogger(__name__)
 
 
+class ThreadBudget:
+    """
+    Shares the CPU cores between all FFmpeg processes of the app running on this machine.
+    Every new FFmpeg process gets a part of the cores proportional to the weight of its stage kind,
+    so concurrent renders do not oversubscribe the CPU and a single render uses all of it.
+    Other processes, e.g. several render workers, are seen through the weight files they keep
+    in Config.THREAD_BUDGET_FOLDER (POSIX only).
+    """
+    # Stage kind -> weight, part of the share for the codec threads, part for the filter threads
+    STAGE_KINDS = {
+        'encode': (4, 1.0, 0.5),  # libx264 and other encoders dominate the CPU usage
+        'filter': (2, 0.5, 1.0),  # raw intermediates in streaming mode, the work is in the filtergraph
+        'audio': (1, 1.0, 1.0),
+        'remux': (1, 1.0, 1.0),  # stream copy, one thread is enough
+    }
+    MAX_THREADS = {'audio': 1, 'remux': 1}
+    # FFmpeg options without a value, every other option is followed by its value
+    FLAG_OPTIONS = {'-y', '-n', '-an', '-vn', '-sn', '-dn', '-shortest', '-benchmark', '-copyts', '-nostdin',
+                    '-hide_banner', '-stats', '-nostats'}
+
+    def __init__(self, cores: int = None, shared_folder: str = None):
+        self.cores = cores or self._available_cores()
+        self.shared_folder = Config.THREAD_BUDGET_FOLDER if shared_folder is None else shared_folder
+        if os.name != 'posix':
+            # Liveness of the other processes is checked with signal 0
+            self.shared_folder = ''
+        self._lock = threading.Lock()
+        self._active = {}
+        self._next_id = 0
+
+    @staticmethod
+    def _available_cores() -> int:
+        if Config.FFMPEG_CORES:
+            return Config.FFMPEG_CORES
+        if hasattr(os, 'sched_getaffinity'):
+            return len(os.sched_getaffinity(0))
+        return os.cpu_count() or 1
+
+    @property
+    def active_count(self) -> int:
+        return len(self._active)
+
+    @contextmanager
+    def lease(self, stages: List[str]):
+        """
+        Registers FFmpeg processes for the given stage kinds while they run.
+
+        Yields:
+            List of (threads, filter_threads) for every stage
+        """
+        for stage in stages:
+            if stage not in self.STAGE_KINDS:
+                raise ValueError(f"Unknown FFmpeg stage kind: {stage}. Available: {', '.join(self.STAGE_KINDS)}")
+
+        with self._lock:
+            ids = list(range(self._next_id, self._next_id + len(stages)))
+            self._next_id += len(stages)
+            self._active.update({process_id: stage for process_id, stage in zip(ids, stages)})
+            total_weight = self._publish() + self._other_processes_weight()
+            allocations = [self._allocate(stage, total_weight) for stage in stages]
+        try:
+            yield allocations
+        finally:
+            with self._lock:
+                for process_id in ids:
+                    self._active.pop(process_id, None)
+                self._publish()
+
+    def _publish(self) -> int:
+        """Writes the weight of the running FFmpeg processes of this process for the other ones, returns it"""
+        weight = sum(self.STAGE_KINDS[stage][0] for stage in self._active.values())
+        if not self.shared_folder:
+            return weight
+        path = os.path.join(self.shared_folder, f'{os.getpid()}.weight')
+        try:
+            if weight:
+                os.makedirs(self.shared_folder, exist_ok=True)
+                with open(f'{path}.tmp', 'w') as f:
+                    f.write(str(weight))
+                os.replace(f'{path}.tmp', path)
+            elif os.path.exists(path):
+                os.remove(path)
+        except OSError:
+            # The budget of this process still works, the other ones only see less load
+            logger.debug(f"Failed to publish the FFmpeg thread weight to {self.shared_folder}", exc_info=True)
+        return weight
+
+    def _other_processes_weight(self) -> int:
+        """Weight of the running FFmpeg processes of the other live processes sharing the folder"""
+        if not self.shared_folder:
+            return 0
+        try:
+            entries = list(os.scandir(self.shared_folder))
+        except OSError:
+            return 0
+        weight = 0
+        for entry in entries:
+            pid, _, extension = entry.name.partition('.')
+            if extension != 'weight' or not pid.isdigit() or int(pid) == os.getpid():
+                continue
+            try:
+                os.kill(int(pid), 0)
+            except ProcessLookupError:
+                # Left behind by a killed process
+                self._remove(entry.path)
+                continue
+            except PermissionError:
+                pass  # Alive, run by another user
+            try:
+                with open(entry.path) as f:
+                    weight += int(f.read() or 0)
+            except (OSError, ValueError):
+                continue
+        return weight
+
+    @staticmethod
+    def _remove(path: str):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _allocate(self, stage: str, total_weight: int) -> tuple:
+        weight, codec_part, filter_part = self.STAGE_KINDS[stage]
+        share = self.cores * weight / total_weight
+        max_threads = self.MAX_THREADS.get(stage, self.cores)
+        threads = min(max_threads, max(1, round(share * codec_part)))
+        filter_threads = min(max_threads, max(1, round(share * filter_part)))
+        return threads, filter_threads
+
+    @staticmethod
+    def apply(command: list, threads: int, filter_threads: int) -> list:
+        """Adds thread options to an FFmpeg command unless it already sets them"""
+        if not command or os.path.basename(command[0]) != 'ffmpeg' or '-threads' in command:
+            return command
+        # Filter thread options are global, -threads is an output option and is added before every output
+        outputs = set(ThreadBudget._output_positions(command))
+        threaded = [command[0], '-filter_threads', str(filter_threads), '-filter_complex_threads', str(filter_threads)]
+        for i, arg in enumerate(command[1:], start=1):
+            if i in outputs:
+                threaded += ['-threads', str(threads)]
+            threaded.append(arg)
+        return threaded
+
+    @staticmethod
+    def _output_positions(command: list) -> List[int]:
+        """Positions of the output files: the arguments that are neither an option nor its value"""
+        positions = []
+        i = 1
+        while i < len(command):
+            arg = command[i]
+            if arg.startswith('-') and arg != '-':
+                i += 1 if arg in ThreadBudget.FLAG_OPTIONS else 2
+            else:
+                positions.append(i)
+                i += 1
+        return positions
+
+
+thread_budget = ThreadBudget()
+
+
 class FFmpegUtils:
     @staticmethod
-    def run_command(command: list) -> subprocess.CompletedProcess:
-        """Executes the FFmpeg command"""
-        logger.debug(f"Executing the FFmpeg command: {' '.join(command)}")
+    def stream_output_args() -> list:
+        """
+        Low-overhead intermediate passed between concurrently running stages in streaming mode.
+        The frame rate is fixed explicitly, otherwise the next stage guesses it from the NUT time base
+        """
+        return ['-c:v', 'rawvideo', '-pix_fmt', 'yuv420p', '-r', str(current_render_profile().fps),
+                '-c:a', 'pcm_s16le', '-f', 'nut']
+
+    @staticmethod
+    def run_command(command: list, stage: str = 'encode') -> subprocess.CompletedProcess:
+        """
+        Executes the FFmpeg command.
+        stage is the kind of work the command does, it defines the thread budget of the process.
+        """
+        with thread_budget.lease([stage]) as ((threads, filter_threads),):
+            command = current_render_profile().apply(command)
+            command = with_ffmpeg_benchmark(ThreadBudget.apply(command, threads, filter_threads))
+            logger.debug(f"Executing the FFmpeg command: {' '.join(command)}")
+            with measure_ffmpeg([command], stage) as run, \
+                    trace_span(f'ffmpeg {os.path.basename(command[-1])}', 'ffmpeg', kind=stage, command=command):
+                with tempfile.TemporaryFile() as stderr_file:
+                    process = subprocess.Popen(command, stdin=subprocess.DEVNULL, stdout=subprocess.DEVNULL,
+                                               stderr=stderr_file)
+                    try:
+                        run['usages'].append(FFmpegUtils._wait(process))
+                    except BaseException:
+                        process.kill()
+                        process.wait()
+                        raise
+                    stderr_file.seek(0)
+                    stderr = stderr_file.read().decode(errors='replace')
+                run['stderr'] = stderr
+                if process.returncode:
+                    logger.error(f"FFmpeg command execution error: {stderr}")
+                    raise subprocess.CalledProcessError(process.returncode, command, stderr=stderr)
+                record_ffmpeg_benchmark(command, stderr)
+                return subprocess.CompletedProcess(command, process.returncode, stderr=stderr)
+
+    @staticmethod
+    def _wait(process: subprocess.Popen, block: bool = True):
+        """
+        Reaps the process with its own resource usage, which RUSAGE_CHILDREN only has summed up
+        over all children. Returns None while a non blocking wait finds the process running,
+        or where os.wait4 is not available.
+        """
+        if not hasattr(os, 'wait4'):
+            if block:
+                process.wait()
+            else:
+                process.poll()
+            return None
+        pid, status, usage = os.wait4(process.pid, 0 if block else os.WNOHANG)
+        if not pid:
+            return None
+        process.returncode = os.waitstatus_to_exitcode(status)
+        return usage
+
+    @staticmethod
+    def run_pipeline(commands: List[list], stages: List[str] = None) -> None:
+        """
+        Runs several FFmpeg commands concurrently, e.g. stages connected with named pipes.
+        If any process fails, the others are killed so none of them blocks on a pipe forever.
+        stages holds the kind of every command, all of them are encodes by default.
+        """
+        stages = stages or ['encode'] * len(commands)
+        with thread_budget.lease(stages) as allocations:
+            profile = current_render_profile()
+            commands = [with_ffmpeg_benchmark(ThreadBudget.apply(profile.apply(command), *allocation))
+                        for command, allocation in zip(commands, allocations)]
+            with measure_ffmpeg(commands, 'pipeline') as run:
+                run['stderr'] = FFmpegUtils._run_processes(commands, run['usages'])
+                record_ffmpeg_benchmark(commands[-1], run['stderr'])
+
+    @staticmethod
+    def _run_processes(commands: List[list], usages: list = None) -> str:
+        """Returns the stderr of the last command, the resource usage of every process is added to usages"""
+        usages = [] if usages is None else usages
+        processes = []
+        stderr_files = []
+        tracer = current_tracer()
+        started_at = []
+        finished = set()
         try:
-            result = subprocess.run(command, check=True, capture_output=True, text=True)
-            return result
-        except subprocess.CalledProcessError as e:
-            logger.error(f"FFmpeg command execution error: {e.stderr}")
-            raise
+            for command in commands:
+                logger.debug(f"Starting the FFmpeg pipeline command: {' '.join(command)}")
+                stderr_file = tempfile.TemporaryFile()
+                stderr_files.append(stderr_file)
+                processes.append(subprocess.Popen(command, stdin=subprocess.DEVNULL,
+                                                  stdout=subprocess.DEVNULL, stderr=stderr_file))
+                started_at.append(tracer.timestamp() if tracer else None)
+
+            first = len(usages)
+            usages.extend([None] * len(processes))
+            while True:
+                for i, process in enumerate(processes):
+                    if process.returncode is None:
+                        usages[first + i] = FFmpegUtils._wait(process, block=False)
+                return_codes = [process.returncode for process in processes]
+                if tracer:
+                    # Every process of the pipeline gets its own track, so the overlap is visible
+                    for i, code in enumerate(return_codes):
+                        if code is not None and i not in finished:
+                            finished.add(i)
+                            tracer.add_span(f'ffmpeg {os.path.basename(commands[i][-1])}', 'ffmpeg',
+                                            started_at[i], tracer.timestamp(), track=processes[i].pid,
+                                            track_name=f'ffmpeg pid {processes[i].pid}',
+                                            args={'command': commands[i], 'returncode': code})
+                # Upstream stages fail with a broken pipe once a downstream stage dies,
+                # so the most downstream failure is the one worth reporting
+                failed = next((i for i in reversed(range(len(return_codes))) if return_codes[i] not in (None, 0)), None)
+                if failed is not None:
+                    stderr_files[failed].seek(0)
+                    stderr = stderr_files[failed].read().decode(errors='replace')
+                    logger.error(f"FFmpeg pipeline command execution error: {stderr}")
+                    raise subprocess.CalledProcessError(return_codes[failed], commands[failed], stderr=stderr)
+                if all(code == 0 for code in return_codes):
+                    stderr_files[-1].seek(0)
+                    return stderr_files[-1].read().decode(errors='replace')
+                time.sleep(0.1)
+        finally:
+            for process in processes:
+                if process.poll() is None:
+                    process.kill()
+                    process.wait()
+            for stderr_file in stderr_files:
+                stderr_file.close()
+
+    @staticmethod
+    def create_fifo(path: str) -> str:
+        """Creates a named pipe used to stream an intermediate between two FFmpeg processes"""
+        if os.path.exists(path):
+            os.remove(path)
+        os.mkfifo(path)
+        return path
+
+    @staticmethod
+    def streaming_supported() -> bool:
+        """Named pipes are only available on POSIX systems"""
+        return hasattr(os, 'mkfifo')
 
     @staticmethod
     def get_video_info(video_path: str):
@@ -30,7 +333,8 @@ class FFmpegUtils:
             '-show_streams',
             video_path
         ]
-        result = subprocess.run(cmd, capture_output=True, encoding='utf-8', text=True)
+        with trace_span('ffprobe streams', 'probe', path=video_path):
+            result = subprocess.run(cmd, capture_output=True, encoding='utf-8', text=True)
         info = json.loads(result.stdout)
 
         # Extract video dimensions
@@ -40,22 +344,103 @@ class FFmpegUtils:
 
         return width, height
 
+    @staticmethod
+    def has_audio_stream(video_path: str) -> bool:
+        """Checks whether the file contains at least one audio stream"""
+        with trace_span('ffprobe audio', 'probe', path=video_path):
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-select_streams', 'a', '-show_entries', 'stream=index',
+                 '-of', 'csv=p=0', video_path],
+                capture_output=True, text=True
+            )
+        return bool(result.stdout.strip())
+
     @staticmethod
     def get_video_duration(video_path):
         """Get the duration of the video in seconds."""
-        result = subprocess.run(
-            ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
-             video_path],
-            stdout=subprocess.PIPE,
-            stderr=subprocess.STDOUT
-        )
+        with trace_span('ffprobe duration', 'probe', path=video_path):
+            result = subprocess.run(
+                ['ffprobe', '-v', 'error', '-show_entries', 'format=duration', '-of', 'default=noprint_wrappers=1:nokey=1',
+                 video_path],
+                stdout=subprocess.PIPE,
+                stderr=subprocess.STDOUT
+            )
         return float(result.stdout)
 
+    @staticmethod
+    def probe_media(video_path: str) -> dict:
+        """
+        Reads the metadata of a video with one ffprobe run.
+
+        Returns:
+            Dict with duration, width, height, fps, video_codec, pix_fmt and has_audio
+        """
+        cmd = ['ffprobe', '-v', 'quiet', '-print_format', 'json', '-show_format', '-show_streams', video_path]
+        with trace_span('ffprobe media', 'probe', path=video_path):
+            result = subprocess.run(cmd, capture_output=True, encoding='utf-8', text=True)
+        info = json.loads(result.stdout or '{}')
+
+        video_stream = next((s for s in info.get('streams', []) if s.get('codec_type') == 'video'), None)
+        if video_stream is None:
+            raise ValueError(f"No video stream in: {video_path}")
+        numerator, _, denominator = (video_stream.get('avg_frame_rate') or '0/1').partition('/')
+        fps = float(numerator) / float(denominator) if denominator and float(denominator) else None
+        return {
+            'duration': float(info.get('format', {}).get('duration') or 0),
+            'width': int(video_stream['width']),
+            'height': int(video_stream['height']),
+            'fps': round(fps, 3) if fps else None,
+            'video_codec': video_stream.get('codec_name'),
+            'pix_fmt': video_stream.get('pix_fmt'),
+            'has_audio': any(s.get('codec_type') == 'audio' for s in info.get('streams', [])),
+        }
+
+    @staticmethod
+    def get_keyframes(video_path: str) -> List[float]:
+        """Timestamps of the keyframes of the first video stream, read from the packets without decoding"""
+        cmd = ['ffprobe', '-v', 'error', '-select_streams', 'v:0', '-show_entries', 'packet=pts_time,flags',
+               '-of', 'csv=p=0', video_path]
+        with trace_span('ffprobe keyframes', 'probe', path=video_path):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        keyframes = []
+        for line in result.stdout.splitlines():
+            pts_time, _, flags = line.partition(',')
+            if 'K' in flags and pts_time not in ('', 'N/A'):
+                keyframes.append(round(float(pts_time), 3))
+        return sorted(keyframes)
+
+    @staticmethod
+    def count_frames(video_path: str) -> int:
+        """Number of video frames, counted by decoding the video, e.g. to measure the frame rate of a stage"""
+        cmd = ['ffmpeg', '-nostdin', '-i', video_path, '-map', '0:v:0', '-f', 'null', '-']
+        with trace_span('ffmpeg count frames', 'probe', path=video_path):
+            result = subprocess.run(cmd, capture_output=True, text=True)
+        frames = re.findall(r'frame=\s*(\d+)', result.stderr)
+        if result.returncode or not frames:
+            raise RuntimeError(f"Failed to count the frames of {video_path}: {result.stderr[-500:]}")
+        return int(frames[-1])
+
     def create_transition(self, clip1: str, clip2: str, output: str,
                           transition_type: str = "fade", duration: float = 0.5) -> str:
         """
         Creates a transition between two clips with support for various transition types
 
+        """
+        cmd = self.build_transition_command(clip1, clip2, output, transition_type, duration)
+
+        try:
+            self.run_command(cmd)
+            return output
+        except Exception as e:
+            raise RuntimeError(f"Error creating transition: {str(e)}")
+
+    def build_transition_command(self, clip1: str, clip2: str, output: str,
+                                 transition_type: str = "fade", duration: float = 0.5,
+                                 clip1_duration: float = None, output_args: list = None) -> list:
+        """
+        Builds the FFmpeg command for a transition between two clips.
+        clip1_duration has to be passed when clip1 is a pipe and can not be probed.
+
         """
         supported_transitions = Config.SUPPORTED_TRANSITIONS
         # Check if the transition type is supported
@@ -64,7 +449,8 @@ class FFmpegUtils:
                              f"Available: {', '.join(supported_transitions)}")
 
         # Get the duration of the first clip
-        clip1_duration = self.get_video_duration(clip1)
+        if clip1_duration is None:
+            clip1_duration = self.get_video_duration(clip1)
 
         # Check that the transition duration does not exceed the clip duration
         if duration >= clip1_duration:
@@ -74,7 +460,7 @@ class FFmpegUtils:
         # Use the transition name directly for FFmpeg
         ffmpeg_transition = transition_type
 
-        fps = Config.OUTPUT_PTS
+        fps = current_render_profile().fps
 
         # Create the filter for the transition
         filter_complex = (
@@ -89,27 +475,24 @@ class FFmpegUtils:
         # Combine video filters (audio is not processed in this specific filter_complex)
         full_filter = f"{filter_complex}"
 
-        # Execute the FFmpeg command
-        cmd = [
+        if output_args is None:
+            # Audio codec is specified, though not processed by filter_complex
+            output_args = ["-c:v", Config.VIDEO_CODEC, "-c:a", "aac"]
+
+        return [
             'ffmpeg',
             "-i", clip1,
             "-i", clip2,
             "-filter_complex", full_filter,
             "-map", "[outv]",
-            "-c:v", Config.VIDEO_CODEC,
-            "-c:a", "aac", # Audio codec is specified, though not processed by filter_complex
+            *output_args,
             "-y",
             output
         ]
 
-        try:
-            self.run_command(cmd)
-            return output
-        except Exception as e:
-            raise RuntimeError(f"Error creating transition: {str(e)}")
-
     def normalize_video_resolution(self, input_path: str, output_path: str,
-                                   target_resolution: str = "1080:1920") -> str:
+                                   target_resolution: str = "1080:1920", start: float = None,
+                                   duration: float = None) -> str:
         """
         Нормализует разрешение видео к целевому размеру с сохранением пропорций
 
@@ -117,17 +500,22 @@ class FFmpegUtils:
             input_path: Путь к исходному видео
             output_path: Путь к выходному файлу
             target_resolution: Целевое разрешение в формате "WIDTHxHEIGHT"
+            start: Начало фрагмента в секундах, по умолчанию начало видео
+            duration: Длительность фрагмента в секундах, по умолчанию до конца видео
 
         Returns:
             Путь к нормализованному видео
         """
         cmd = [
             'ffmpeg',
+            *self._seek_args(start, duration),
             '-i', input_path,
             '-vf',
-            f'scale={target_resolution}:force_original_aspect_ratio=decrease,pad={target_resolution}:(ow-iw)/2:(oh-ih)/2',
+            f'scale={target_resolution}:force_original_aspect_ratio=decrease,pad={target_resolution}:(ow-iw)/2:(oh-ih)/2'
+            f'{current_render_profile().frame_rate_filter()}',
             '-c:v', Config.VIDEO_CODEC,
             '-c:a', 'copy',
+            '-video_track_timescale', str(Config.VIDEO_TIMESCALE),
             '-y', output_path
         ]
 
@@ -138,6 +526,104 @@ class FFmpegUtils:
         except Exception as e:
             raise RuntimeError(f"Error normalizing video resolution: {str(e)}")
 
+    def cut_video(self, input_path: str, output_path: str, start: float = None, duration: float = None) -> str:
+        """
+        Cuts a part of the video without re-encoding. The cut starts at the keyframe
+        before start, so start should be a keyframe for an exact cut.
+        The cut gets the time scale of normalized clips, so they can be joined with stream copy.
+        """
+        cmd = [
+            'ffmpeg',
+            *self._seek_args(start, duration),
+            '-i', input_path,
+            '-c', 'copy',
+            '-avoid_negative_ts', 'make_zero',
+            '-video_track_timescale', str(Config.VIDEO_TIMESCALE),
+            '-y', output_path
+        ]
+
+        try:
+            self.run_command(cmd)
+            return output_path
+        except Exception as e:
+            raise RuntimeError(f"Error cutting video: {str(e)}")
+
+    def normalize_video_resolutions(self, input_path: str, outputs: List[tuple], start: float = None,
+                                    duration: float = None) -> List[str]:
+        """
+        Normalizes one video to several resolutions in a single FFmpeg run.
+        The input is decoded once and split into one scale/pad branch per output.
+
+        Args:
+            input_path: Path to the source video
+            outputs: (target resolution "WIDTH:HEIGHT", output path) pairs
+            start: Start of the used part in seconds, the beginning of the video by default
+            duration: Duration of the used part in seconds, up to the end of the video by default
+
+        Returns:
+            Paths to the normalized videos
+        """
+        if len(outputs) == 1:
+            (target_resolution, output_path), = outputs
+            return [self.normalize_video_resolution(input_path, output_path, target_resolution, start, duration)]
+
+        frame_rate_filter = current_render_profile().frame_rate_filter()
+        filter_complex = [f"[0:v]split={len(outputs)}" + "".join(f"[s{i}]" for i in range(len(outputs)))]
+        output_args = []
+        for i, (target_resolution, output_path) in enumerate(outputs):
+            filter_complex.append(f"[s{i}]scale={target_resolution}:force_original_aspect_ratio=decrease,"
+                                  f"pad={target_resolution}:(ow-iw)/2:(oh-ih)/2{frame_rate_filter}[v{i}]")
+            output_args.extend(['-map', f'[v{i}]', '-map', '0:a?', '-c:v', Config.VIDEO_CODEC, '-c:a', 'copy',
+                                '-video_track_timescale', str(Config.VIDEO_TIMESCALE), output_path])
+
+        cmd = [
+            'ffmpeg',
+            *self._seek_args(start, duration),
+            '-i', input_path,
+            '-filter_complex', ';'.join(filter_complex),
+            '-y',
+            *output_args
+        ]
+
+        try:
+            self.run_command(cmd)
+            return [output_path for _, output_path in outputs]
+        except Exception as e:
+            raise RuntimeError(f"Error normalizing video resolution: {str(e)}")
+
+    def extract_frame(self, input_path: str, output_path: str, target_resolution: str = "1920:1080",
+                      at: float = 0) -> str:
+        """
+        Saves one frame of the video as an image, fitted into the target resolution
+        the same way normalize_video_resolution fits the clips.
+        """
+        cmd = [
+            'ffmpeg',
+            *self._seek_args(at),
+            '-i', input_path,
+            '-vf',
+            f'scale={target_resolution}:force_original_aspect_ratio=decrease,pad={target_resolution}:(ow-iw)/2:(oh-ih)/2',
+            '-frames:v', '1',
+            '-update', '1',
+            '-y', output_path
+        ]
+
+        try:
+            self.run_command(cmd, stage='filter')
+            return output_path
+        except Exception as e:
+            raise RuntimeError(f"Error extracting a frame: {str(e)}")
+
+    @staticmethod
+    def _seek_args(start: float = None, duration: float = None) -> list:
+        """Input seeking: FFmpeg jumps to the keyframe before start and decodes only the needed seconds"""
+        seek_args = []
+        if start:
+            seek_args += ['-ss', str(start)]
+        if duration:
+            seek_args += ['-t', str(duration)]
+        return seek_args
+
     @staticmethod
     def copy_file(src: str, dst: str) -> str:
         """Копирует файл из src в dst"""
@@ -0,0 +1,301 @@
+import json
+import logging
+import os
+import re
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import List, Optional
+
+from utils.tracing import trace_span
+
+try:
+    import resource
+except ImportError:  # Windows
+    resource = None
+
+logger = logging.getLogger(__name__)
+
+_current_collector: ContextVar[Optional['MetricsCollector']] = ContextVar('metrics_collector', default=None)
+_current_stage: ContextVar[Optional[str]] = ContextVar('metrics_stage', default=None)
+
+SPEED_PATTERN = re.compile(r'speed=\s*([\d.]+)x')
+
+
+class MetricsCollector:
+    """
+    Collects the metrics of one render job: a record for every pipeline stage and every FFmpeg run.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.records = []
+
+    def add(self, record: dict):
+        record['job'] = self.job_id
+        self.records.append(record)
+
+    def ffmpeg_records(self) -> List[dict]:
+        return [record for record in self.records if record['type'] == 'ffmpeg']
+
+    def stage_records(self) -> List[dict]:
+        return [record for record in self.records if record['type'] == 'stage']
+
+    def clip_records(self) -> List[dict]:
+        return [record for record in self.records if record['type'] == 'clip']
+
+    def promotion_records(self) -> List[dict]:
+        return [record for record in self.records if record['type'] == 'promotion']
+
+    def to_json_lines(self) -> str:
+        return ''.join(json.dumps(record) + '\n' for record in self.records)
+
+    def to_prometheus(self) -> str:
+        """Renders the job metrics in the Prometheus text exposition format, FFmpeg runs are aggregated per stage"""
+        per_stage = {}
+        for record in self.ffmpeg_records():
+            totals = per_stage.setdefault(record['stage'], {
+                'runs': 0, 'wall': 0.0, 'cpu': 0.0, 'rss': 0, 'input': 0, 'output': 0, 'media': 0.0})
+            totals['runs'] += 1
+            totals['wall'] += record['wall_time']
+            totals['cpu'] += (record['cpu_user'] or 0) + (record['cpu_system'] or 0)
+            totals['rss'] = max(totals['rss'], record['peak_rss_bytes'] or 0)
+            totals['input'] += record['input_bytes']
+            totals['output'] += record['output_bytes']
+            if record['speed']:
+                totals['media'] += record['speed'] * record['wall_time']
+
+        metrics = [
+            ('videomaker_ffmpeg_runs_total', 'counter', 'Number of FFmpeg runs', 'runs'),
+            ('videomaker_ffmpeg_wall_seconds_total', 'counter', 'Wall time of FFmpeg runs', 'wall'),
+            ('videomaker_ffmpeg_cpu_seconds_total', 'counter', 'User and system CPU time of FFmpeg runs', 'cpu'),
+            ('videomaker_ffmpeg_peak_rss_bytes', 'gauge', 'Peak RSS of the largest FFmpeg process', 'rss'),
+            ('videomaker_ffmpeg_input_bytes_total', 'counter', 'Size of the FFmpeg input files', 'input'),
+            ('videomaker_ffmpeg_output_bytes_total', 'counter', 'Size of the FFmpeg output files', 'output'),
+            ('videomaker_ffmpeg_media_seconds_total', 'counter',
+             'Media processed by FFmpeg, from the reported speed', 'media'),
+        ]
+        lines = []
+        for name, metric_type, description, key in metrics:
+            lines.append(f'# HELP {name} {description}')
+            lines.append(f'# TYPE {name} {metric_type}')
+            for stage, totals in per_stage.items():
+                lines.append(f'{name}{{job="{self.job_id}",stage="{stage}"}} {round(totals[key], 3)}')
+
+        clip_actions = {}
+        for record in self.clip_records():
+            clip_actions[record['action']] = clip_actions.get(record['action'], 0) + 1
+        if clip_actions:
+            lines.append('# HELP videomaker_source_clips_total Source clip windows by how they were prepared')
+            lines.append('# TYPE videomaker_source_clips_total counter')
+            for action, count in clip_actions.items():
+                lines.append(f'videomaker_source_clips_total{{job="{self.job_id}",action="{action}"}} {count}')
+
+        promotions = {}
+        for record in self.promotion_records():
+            totals = promotions.setdefault(record['method'], [0, 0])
+            totals[0] += 1
+            totals[1] += record['bytes_saved']
+        if promotions:
+            lines.append('# HELP videomaker_artifact_promotions_total Finished files promoted by rename, link or copy')
+            lines.append('# TYPE videomaker_artifact_promotions_total counter')
+            for method, (count, _) in promotions.items():
+                lines.append(f'videomaker_artifact_promotions_total{{job="{self.job_id}",method="{method}"}} {count}')
+            lines.append('# HELP videomaker_artifact_bytes_saved_total Bytes not copied thanks to renames and links')
+            lines.append('# TYPE videomaker_artifact_bytes_saved_total counter')
+            lines.append(f'videomaker_artifact_bytes_saved_total{{job="{self.job_id}"}} '
+                         f'{sum(saved for _, saved in promotions.values())}')
+
+        lines.append('# HELP videomaker_stage_wall_seconds Wall time of pipeline stages')
+        lines.append('# TYPE videomaker_stage_wall_seconds gauge')
+        for record in self.stage_records():
+            lines.append(f'videomaker_stage_wall_seconds{{job="{self.job_id}",stage="{record["stage"]}"}} '
+                         f'{record["wall_time"]}')
+        return '\n'.join(lines) + '\n'
+
+    def save(self, folder: str, metrics_format: str = 'jsonl') -> str:
+        """Writes the job metrics to <folder>/<job_id>.jsonl or .prom"""
+        if metrics_format not in ('jsonl', 'prometheus'):
+            raise ValueError(f"Unsupported metrics format: {metrics_format}. Available: jsonl, prometheus")
+
+        os.makedirs(folder, exist_ok=True)
+        extension = 'jsonl' if metrics_format == 'jsonl' else 'prom'
+        path = os.path.join(folder, f'{self.job_id}.{extension}')
+        with open(path, 'w') as f:
+            f.write(self.to_json_lines() if metrics_format == 'jsonl' else self.to_prometheus())
+        logger.debug(f"Saved job metrics: {path}")
+        return path
+
+
+@contextmanager
+def collect_metrics(job_id: str):
+    """Collects metrics of everything running inside the `with` block into a new MetricsCollector"""
+    collector = MetricsCollector(job_id)
+    token = _current_collector.set(collector)
+    try:
+        yield collector
+    finally:
+        _current_collector.reset(token)
+
+
+@contextmanager
+def measure_stage(name: str):
+    """
+    Records the wall and child CPU time of a pipeline stage and traces it.
+    FFmpeg runs inside the stage are labeled with its name. Can be used as a decorator.
+    """
+    collector = _current_collector.get()
+    token = _current_stage.set(name)
+    usage_before = _children_usage()
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        with trace_span(name, 'stage'):
+            yield
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        _current_stage.reset(token)
+        if collector is not None:
+            wall_time = time.perf_counter() - start
+            cpu_user, cpu_system, _ = _usage_delta(usage_before, _children_usage())
+            collector.add({
+                'type': 'stage',
+                'stage': name,
+                'status': status,
+                'wall_time': round(wall_time, 3),
+                'cpu_user': cpu_user,
+                'cpu_system': cpu_system,
+            })
+
+
+def record_clip(source: str, start: float, duration: Optional[float], action: str, reason: str = None):
+    """
+    Records how a source clip window was prepared for the render:
+    normalize (re-encoded), copy (stream copied cut) or passthrough (used as it is)
+    """
+    collector = _current_collector.get()
+    if collector is not None:
+        collector.add({
+            'type': 'clip',
+            'stage': _current_stage.get(),
+            'source': source,
+            'start': start,
+            'duration': duration,
+            'action': action,
+            'reason': reason,
+        })
+
+
+def record_promotion(destination: str, method: str, size: int):
+    """Records how a finished file was promoted: rename, hardlink, reflink or copy"""
+    collector = _current_collector.get()
+    if collector is not None:
+        collector.add({
+            'type': 'promotion',
+            'stage': _current_stage.get(),
+            'output': os.path.basename(destination),
+            'method': method,
+            'bytes': size,
+            'bytes_saved': 0 if method == 'copy' else size,
+        })
+
+
+@contextmanager
+def measure_ffmpeg(commands: List[list], kind: str):
+    """
+    Records an FFmpeg run: wall time, reported speed, child CPU time, peak RSS and file sizes.
+    Several commands are recorded as one run, e.g. stages of a pipeline connected with named pipes.
+    The caller stores the stderr of the last FFmpeg command in the yielded dictionary to get the speed,
+    and the resource usage of every process from os.wait4 to get their own CPU time and peak RSS.
+    """
+    collector = _current_collector.get()
+    run = {'stderr': None, 'usages': []}
+    if collector is None:
+        yield run
+        return
+
+    usage_before = _children_usage()
+    start = time.perf_counter()
+    status = 'ok'
+    try:
+        yield run
+    except BaseException:
+        status = 'error'
+        raise
+    finally:
+        wall_time = time.perf_counter() - start
+        usages = [usage for usage in run['usages'] if usage is not None]
+        if usages and len(usages) == len(commands):
+            cpu_user = round(sum(usage.ru_utime for usage in usages), 3)
+            cpu_system = round(sum(usage.ru_stime for usage in usages), 3)
+            peak_rss = max(_rss_bytes(usage) for usage in usages)
+        else:
+            cpu_user, cpu_system, peak_rss = _usage_delta(usage_before, _children_usage())
+        collector.add({
+            'type': 'ffmpeg',
+            'stage': _current_stage.get() or kind,
+            'kind': kind,
+            'status': status,
+            'wall_time': round(wall_time, 3),
+            'speed': parse_speed(run['stderr']),
+            'cpu_user': cpu_user,
+            'cpu_system': cpu_system,
+            'peak_rss_bytes': peak_rss,
+            'processes': len(commands),
+            'input_bytes': sum(_input_bytes(command) for command in commands),
+            'output_bytes': sum(_output_bytes(command) for command in commands),
+            'output': os.path.basename(commands[-1][-1]),
+        })
+
+
+def parse_speed(stderr: Optional[str]) -> Optional[float]:
+    """Returns the last speed reported in the FFmpeg progress output"""
+    if not stderr:
+        return None
+    speeds = SPEED_PATTERN.findall(stderr)
+    return float(speeds[-1]) if speeds else None
+
+
+def _children_usage():
+    if resource is None:
+        return None
+    return resource.getrusage(resource.RUSAGE_CHILDREN)
+
+
+def _usage_delta(before, after) -> tuple:
+    """
+    CPU time of the children finished in between and the peak RSS of the largest child so far.
+    With concurrent jobs in one process the CPU time includes the children of the other jobs.
+    """
+    if before is None or after is None:
+        return None, None, None
+    return (round(after.ru_utime - before.ru_utime, 3),
+            round(after.ru_stime - before.ru_stime, 3),
+            _rss_bytes(after))
+
+
+def _rss_bytes(usage) -> int:
+    # ru_maxrss is in kilobytes on Linux and in bytes on macOS
+    return usage.ru_maxrss if sys.platform == 'darwin' else usage.ru_maxrss * 1024
+
+
+def _input_bytes(command: list) -> int:
+    # Named pipes between pipeline stages are not regular files and count as 0
+    return sum(_file_size(command[i + 1]) for i, arg in enumerate(command[:-1]) if arg == '-i')
+
+
+def _output_bytes(command: list) -> int:
+    # Every output of a multi-output command, e.g. one file per resolution or per intro title
+    from utils.ffmpeg_utils import ThreadBudget
+
+    return sum(_file_size(command[i]) for i in ThreadBudget._output_positions(command))
+
+
+def _file_size(path: str) -> int:
+    try:
+        return os.path.getsize(path) if os.path.isfile(path) else 0
+    except (OSError, TypeError):
+        return 0
@@ -0,0 +1,158 @@
+import collections
+import cProfile
+import io
+import logging
+import os
+import pstats
+import sys
+import threading
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODES = ('cprofile', 'sampling', 'all')
+
+_current_session: ContextVar[Optional['ProfileSession']] = ContextVar('profile_session', default=None)
+
+# Only one cProfile profiler can be active in a process (on Python 3.12+ it is a sys.monitoring tool),
+# so concurrently profiled jobs take turns and the others are sampled instead
+_cprofile_lock = threading.Lock()
+
+
+class StackSampler:
+    """
+    Sampling profiler for one thread. Stacks are counted in the collapsed format
+    ("outer;inner;leaf count" per line) used by flamegraph.pl and speedscope.
+    """
+
+    def __init__(self, thread_id: int, interval: float = 0.005):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.stacks = collections.Counter()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            if frame is None:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            self.stacks[';'.join(reversed(stack))] += 1
+
+    def to_collapsed(self) -> str:
+        return ''.join(f'{stack} {count}\n' for stack, count in self.stacks.most_common())
+
+
+class ProfileSession:
+    """Profilers of one render job and the FFmpeg -benchmark reports collected during it"""
+
+    def __init__(self, mode: str, output_dir: str, sampling_interval: float):
+        if mode not in PROFILE_MODES:
+            raise ValueError(f"Unsupported profile mode: {mode}. Available: {', '.join(PROFILE_MODES)}")
+        self.output_dir = output_dir
+        self.sampling_interval = sampling_interval
+        self.profiler = cProfile.Profile() if mode in ('cprofile', 'all') else None
+        self.sampler = StackSampler(threading.get_ident(), sampling_interval) if mode in ('sampling', 'all') else None
+        self.ffmpeg_reports = []
+
+    def start(self):
+        if self.profiler and not self._enable_profiler():
+            logger.warning("Another job is profiled with cProfile, this one is sampled instead")
+            self.profiler = None
+            self.sampler = self.sampler or StackSampler(threading.get_ident(), self.sampling_interval)
+        if self.sampler:
+            self.sampler.start()
+
+    def stop(self):
+        if self.profiler:
+            self.profiler.disable()
+            _cprofile_lock.release()
+        if self.sampler:
+            self.sampler.stop()
+
+    def _enable_profiler(self) -> bool:
+        if not _cprofile_lock.acquire(blocking=False):
+            return False
+        try:
+            self.profiler.enable()
+        except ValueError:  # Another profiling tool, e.g. a debugger or coverage, is active
+            _cprofile_lock.release()
+            return False
+        return True
+
+    def save(self) -> list:
+        """Writes profile.pstats, profile.txt, profile.collapsed and ffmpeg_benchmark.log"""
+        os.makedirs(self.output_dir, exist_ok=True)
+        files = []
+        if self.profiler:
+            files.append(os.path.join(self.output_dir, 'profile.pstats'))
+            self.profiler.dump_stats(files[-1])
+
+            summary = io.StringIO()
+            pstats.Stats(self.profiler, stream=summary).sort_stats('cumulative').print_stats(60)
+            files.append(self._write('profile.txt', summary.getvalue()))
+        if self.sampler:
+            files.append(self._write('profile.collapsed', self.sampler.to_collapsed()))
+        if self.ffmpeg_reports:
+            files.append(self._write('ffmpeg_benchmark.log', '\n'.join(self.ffmpeg_reports) + '\n'))
+        logger.info(f"Saved job profile: {self.output_dir}")
+        return files
+
+    def _write(self, name: str, content: str) -> str:
+        path = os.path.join(self.output_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+
+@contextmanager
+def profile_job(mode: str, output_dir: str, sampling_interval: float = 0.005):
+    """
+    Profiles the Python code running inside the `with` block and turns on -benchmark for FFmpeg.
+    The reports are written to output_dir when the block is left.
+
+    Args:
+        mode: cprofile (pstats), sampling (collapsed stacks) or all
+        output_dir: Folder for the reports
+        sampling_interval: Seconds between two samples of the sampling profiler
+    """
+    session = ProfileSession(mode, output_dir, sampling_interval)
+    token = _current_session.set(session)
+    session.start()
+    try:
+        yield session
+    finally:
+        session.stop()
+        _current_session.reset(token)
+        session.save()
+
+
+def with_ffmpeg_benchmark(command: list) -> list:
+    """Adds -benchmark to an FFmpeg command while a job is profiled"""
+    if _current_session.get() is None or not command or os.path.basename(command[0]) != 'ffmpeg':
+        return command
+    return [command[0], '-benchmark', *command[1:]]
+
+
+def record_ffmpeg_benchmark(command: list, stderr: Optional[str]):
+    """Keeps the -benchmark report of an FFmpeg run for the job profile"""
+    session = _current_session.get()
+    if session is None or not stderr:
+        return
+    bench_lines = [line.strip() for line in stderr.splitlines() if line.startswith('bench:')]
+    if bench_lines:
+        session.ffmpeg_reports.append(f"{' '.join(command)}\n  " + '\n  '.join(bench_lines))
@@ -0,0 +1,68 @@
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Dict, NamedTuple
+
+from core.config import Config
+
+
+class RenderProfile(NamedTuple):
+    """
+    Quality settings of a render. The stages are the same for every profile,
+    only the resolution, the frame rate and the encoder options change.
+    """
+    name: str
+    # Short side of the video in pixels, 0 keeps the full resolution
+    height: int = 0
+    fps: int = Config.OUTPUT_PTS
+    # Video codec -> options added after every `-c:v <codec>`
+    encoder_args: Dict[str, tuple] = {}
+    # Normalized clip windows are kept in Config.PROXY_CACHE_FOLDER between renders
+    cache_proxies: bool = False
+
+    def resolution(self, width: int, height: int) -> tuple:
+        """Scales a full resolution down to the profile one, both sides stay even for yuv420p"""
+        if not self.height or self.height >= min(width, height):
+            return width, height
+        factor = self.height / min(width, height)
+        return int(round(width * factor / 2)) * 2, int(round(height * factor / 2)) * 2
+
+    def frame_rate_filter(self) -> str:
+        """Filter suffix bringing normalized clips to the profile frame rate, empty for the full one"""
+        return f',fps={self.fps}' if self.fps != Config.OUTPUT_PTS else ''
+
+    def apply(self, command: list) -> list:
+        """Adds the encoder options of the profile to an FFmpeg command"""
+        if not self.encoder_args or '-c:v' not in command:
+            return command
+        result = []
+        for i, arg in enumerate(command):
+            result.append(arg)
+            if i > 0 and command[i - 1] == '-c:v':
+                result.extend(self.encoder_args.get(arg, ()))
+        return result
+
+
+FINAL_PROFILE = RenderProfile('final')
+PREVIEW_PROFILE = RenderProfile(
+    'preview',
+    height=Config.PREVIEW_HEIGHT,
+    fps=Config.PREVIEW_FPS,
+    encoder_args={'libx264': ('-preset', Config.PREVIEW_PRESET, '-crf', str(Config.PREVIEW_CRF))},
+    cache_proxies=True,
+)
+
+_current_profile: ContextVar[RenderProfile] = ContextVar('render_profile', default=FINAL_PROFILE)
+
+
+def current_render_profile() -> RenderProfile:
+    return _current_profile.get()
+
+
+@contextmanager
+def use_render_profile(profile: RenderProfile):
+    """Renders everything inside the `with` block with the given profile"""
+    token = _current_profile.set(profile)
+    try:
+        yield profile
+    finally:
+        _current_profile.reset(token)
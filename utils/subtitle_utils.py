@@ -2,8 +2,9 @@ import os
 import re
 from typing import List
 
-import assemblyai as aai
+from utils.tracing import trace_span
 
+@trace_span('assemblyai.transcribe', 'network')
 def generate_subtitles(
     audio_file_path: str,
     language_code: str,
@@ -13,6 +14,9 @@ def generate_subtitles(
     """
     Transcribes audio to SRT subtitles using AssemblyAI.
     """
+    # assemblyai pulls in aiohttp and httpx, it is imported only when something is transcribed
+    import assemblyai as aai
+
     aai.settings.api_key = assemblyai_api_key
     aai.settings.base_url = "https://api.eu.assemblyai.com"
     if not aai.settings.api_key:
@@ -0,0 +1,103 @@
+import json
+import logging
+import os
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from typing import Optional
+
+logger = logging.getLogger(__name__)
+
+_current_tracer: ContextVar[Optional['Tracer']] = ContextVar('tracer', default=None)
+
+
+class Tracer:
+    """
+    Records spans of a render job in the Chrome trace-event format.
+    The saved trace.json opens in Perfetto (ui.perfetto.dev) or chrome://tracing.
+    """
+
+    def __init__(self, job_id: str):
+        self.job_id = job_id
+        self.events = []
+        self._lock = threading.Lock()
+        self._start = time.perf_counter()
+        self._pid = os.getpid()
+        self._named_tracks = set()
+
+    def timestamp(self) -> float:
+        """Microseconds since the start of the trace"""
+        return (time.perf_counter() - self._start) * 1_000_000
+
+    def add_span(self, name: str, category: str, start: float, end: float, track: int = None,
+                 track_name: str = None, args: dict = None):
+        """Adds a complete event, by default on the track of the current thread"""
+        track = track if track is not None else threading.get_ident()
+        event = {
+            'name': name,
+            'cat': category,
+            'ph': 'X',
+            'ts': round(start, 1),
+            'dur': round(end - start, 1),
+            'pid': self._pid,
+            'tid': track,
+        }
+        if args:
+            event['args'] = args
+        with self._lock:
+            if track not in self._named_tracks:
+                self._named_tracks.add(track)
+                self.events.append({
+                    'name': 'thread_name', 'ph': 'M', 'pid': self._pid, 'tid': track,
+                    'args': {'name': track_name or threading.current_thread().name},
+                })
+            self.events.append(event)
+
+    def save(self, path: str) -> str:
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with self._lock:
+            trace = {
+                'traceEvents': list(self.events),
+                'displayTimeUnit': 'ms',
+                'otherData': {'job': self.job_id},
+            }
+        with open(path, 'w') as f:
+            json.dump(trace, f)
+        logger.debug(f"Saved job trace: {path}")
+        return path
+
+
+def current_tracer() -> Optional[Tracer]:
+    return _current_tracer.get()
+
+
+@contextmanager
+def start_tracing(job_id: str):
+    """Traces everything running inside the `with` block into a new Tracer"""
+    tracer = Tracer(job_id)
+    token = _current_tracer.set(tracer)
+    try:
+        yield tracer
+    finally:
+        _current_tracer.reset(token)
+
+
+@contextmanager
+def trace_span(name: str, category: str, **args):
+    """
+    Records a span when tracing is on, otherwise does nothing. Can be used as a decorator.
+    """
+    tracer = _current_tracer.get()
+    if tracer is None:
+        yield
+        return
+
+    start = tracer.timestamp()
+    try:
+        yield
+    except BaseException as e:
+        args['error'] = repr(e)
+        raise
+    finally:
+        tracer.add_span(name, category, start, tracer.timestamp(), args=args or None)
@@ -0,0 +1 @@
+"""Headless command line interface of VideoMaker Pro, usable without a display."""
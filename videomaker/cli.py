@@ -0,0 +1,500 @@
+"""
+Batch rendering from the command line.
+
+    python -m videomaker render "My Brand Kit" videos.csv --jobs 2 --summary summary.json
+    python -m videomaker fanout "Brand A" "Brand B" --title "My title" --script-file script.txt -o result
+    python -m videomaker preview "My Brand Kit" --title "My title" -o preview.mp4
+    python -m videomaker finalize preview.plan.json -o final.mp4
+    python -m videomaker scan --watch
+    python -m videomaker segment-worker /mnt/shared/segments
+    python -m videomaker enqueue "My Brand Kit" videos.csv
+    python -m videomaker worker
+    python -m videomaker coordinator --port 8765
+    python -m videomaker worker --coordinator http://db-host:8765
+
+The input is a CSV with `title` and `script` columns or a JSONL file with the same keys,
+an optional `output` column/key sets the path of the rendered video.
+`fanout` renders one script for several brand kits sharing the narration, captions and clips.
+`preview` renders a fast low resolution preview and saves its plan, `finalize` renders the plan in full quality.
+`scan` indexes the durations, resolutions and keyframes of the source clips, so renders do not probe them.
+`enqueue` queues the jobs in the database instead of rendering them, `worker` renders queued jobs,
+any number of workers can run. Workers on other machines lease the jobs from `coordinator` running
+on the machine holding the database, SQLite locks do not work over network filesystems like NFS or SMB.
+`segment-worker` encodes segments of long videos published to SEGMENT_SHARED_FOLDER by renders on other nodes.
+Only the modules needed for rendering are imported, tkinter and the UI are never loaded.
+"""
+import argparse
+import csv
+import json
+import logging
+import os
+import re
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+logger = logging.getLogger('videomaker')
+
+
+def read_jobs(path: str) -> list:
+    """
+    Reads render jobs from a CSV or JSONL file.
+
+    Returns:
+        List of dicts with title, script and output (None when not set)
+    """
+    if not os.path.exists(path):
+        raise FileNotFoundError(f'Input file: {path} does not exist')
+
+    if path.lower().endswith(('.jsonl', '.ndjson')):
+        with open(path, encoding='utf-8') as f:
+            rows = [json.loads(line) for line in f if line.strip()]
+    elif path.lower().endswith('.csv'):
+        with open(path, encoding='utf-8', newline='') as f:
+            rows = list(csv.DictReader(f))
+    else:
+        raise ValueError(f'Unsupported input file: {path}. Use .csv or .jsonl')
+
+    jobs = []
+    for line_number, row in enumerate(rows, start=1):
+        title = (row.get('title') or '').strip()
+        if not title:
+            raise ValueError(f'Row {line_number} of {path} has no title')
+        jobs.append({
+            'title': title,
+            'script': (row.get('script') or '').strip() or None,
+            'output': (row.get('output') or '').strip() or None,
+        })
+    return jobs
+
+
+def render_jobs(brand_kit_name: str, jobs: list, parallel: int = 1, output_dir: str = None,
+                aspect_ratios: list = None) -> dict:
+    """
+    Renders the jobs with up to `parallel` videos at the same time.
+    With aspect_ratios every job is rendered in all of them at once and its output is
+    a {aspect ratio: path} dictionary.
+
+    Returns:
+        Summary with the result of every job
+    """
+    # The render pipeline is imported only when there is something to render
+    from core.editor import VideoEditor
+    from database.job_queue import ensure_job_queue, worker_name
+    from database.models import BrandKit, RenderJob, db
+    from database.progress import ProgressBatcher
+
+    try:
+        editor = VideoEditor(brand_kit_name)
+    except BrandKit.DoesNotExist:
+        raise ValueError(f'Brand kit: {brand_kit_name} does not exist')
+
+    # Progress of every job is tracked in the render_jobs table, the jobs belong to this process
+    # and are never leased by render workers
+    ensure_job_queue()
+    render_jobs = [RenderJob.create(brand_kit=editor.brandkit.id, title=job['title'], worker=worker_name())
+                   for job in jobs]
+
+    def render(index_job):
+        index, job = index_job
+        job_id = render_jobs[index].id
+        output_file = job['output']
+        if not output_file and output_dir:
+            slug = re.sub(r'[^\w-]+', '_', job['title'])[:40].strip('_') or 'video'
+            output_file = os.path.join(output_dir, f'{index:04d}_{slug}.mp4')
+
+        result = {'index': index, 'job_id': job_id, 'title': job['title'], 'status': 'ok', 'output': None,
+                  'error': None}
+        start = time.perf_counter()
+        progress.update(job_id, status='running', progress=0)
+        # Every worker thread has its own database connection, closed when the job is finished
+        with db.connection_context():
+            try:
+                callback = lambda stage, percent: progress.update(job_id, stage=stage, progress=percent)
+                if aspect_ratios:
+                    output_files = {}
+                    if output_file:
+                        root, extension = os.path.splitext(output_file)
+                        output_files = {aspect_ratio: f"{root}_{aspect_ratio.replace(':', 'x')}{extension}"
+                                        for aspect_ratio in aspect_ratios}
+                    result['output'] = editor.create_videos(job['title'], aspect_ratios, job['script'],
+                                                            output_files, callback=callback)
+                    output_path = ', '.join(result['output'].values())
+                else:
+                    result['output'] = output_path = editor.create_video(job['title'], job['script'], output_file,
+                                                                         callback=callback)
+                progress.update(job_id, status='done', progress=100, output_path=output_path)
+            except Exception as e:
+                logger.exception(f"Job {index} '{job['title']}' failed")
+                result['status'] = 'failed'
+                result['error'] = str(e)
+                progress.update(job_id, status='failed', error=str(e))
+        result['wall_time'] = round(time.perf_counter() - start, 3)
+        logger.info(f"Job {index} '{job['title']}': {result['status']} in {result['wall_time']}s")
+        return result
+
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+
+    start = time.perf_counter()
+    with ProgressBatcher() as progress, ThreadPoolExecutor(max_workers=max(1, parallel)) as executor:
+        results = list(executor.map(render, enumerate(jobs)))
+
+    return {
+        'brand_kit': brand_kit_name,
+        'parallel': parallel,
+        'aspect_ratios': aspect_ratios,
+        'total': len(results),
+        'succeeded': sum(result['status'] == 'ok' for result in results),
+        'failed': sum(result['status'] != 'ok' for result in results),
+        'wall_time': round(time.perf_counter() - start, 3),
+        'jobs': results,
+    }
+
+
+def fanout_job(brand_kit_names: list, title: str, script: str = None, output_dir: str = None) -> dict:
+    """
+    Renders one title and script for every brand kit, see FanOutRenderer.
+
+    Returns:
+        Summary with the video of every brand kit
+    """
+    from core.fanout import FanOutRenderer
+    from database.models import BrandKit
+
+    try:
+        renderer = FanOutRenderer(brand_kit_names)
+    except BrandKit.DoesNotExist as e:
+        raise ValueError(str(e))
+
+    output_files = {}
+    if output_dir:
+        os.makedirs(output_dir, exist_ok=True)
+        slug = re.sub(r'[^\w-]+', '_', title)[:40].strip('_') or 'video'
+        for brand_kit in renderer.brand_kits:
+            brand_slug = re.sub(r'[^\w-]+', '_', brand_kit.name).strip('_') or str(brand_kit.id)
+            output_files[brand_kit.name] = os.path.join(output_dir, f'{slug}_{brand_slug}.mp4')
+
+    result = {'brand_kits': [brand_kit.name for brand_kit in renderer.brand_kits], 'title': title, 'status': 'ok',
+              'outputs': None, 'error': None}
+    start = time.perf_counter()
+    try:
+        result['outputs'] = renderer.render(title, script, output_files)
+    except Exception as e:
+        logger.exception(f"Fan-out of '{title}' failed")
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['wall_time'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def preview_job(brand_kit_name: str, title: str, script: str = None, output_file: str = None,
+                plan_file: str = None) -> dict:
+    """
+    Renders a preview of one video, or with plan_file the final video of a previewed plan.
+
+    Returns:
+        Summary with the output path and the plan path
+    """
+    from core.editor import VideoEditor, plan_path
+    from core.timeline import RenderPlan
+    from database.models import BrandKit
+
+    plan = None
+    if plan_file:
+        try:
+            plan = RenderPlan.load(plan_file)
+        except (OSError, ValueError, TypeError) as e:
+            raise ValueError(f'Invalid plan file: {plan_file}: {e}')
+        brand_kit_name, title = plan.brand_kit, plan.title
+
+    try:
+        editor = VideoEditor(brand_kit_name)
+    except BrandKit.DoesNotExist:
+        raise ValueError(f'Brand kit: {brand_kit_name} does not exist')
+
+    result = {'brand_kit': brand_kit_name, 'title': title, 'status': 'ok', 'output': None, 'plan': plan_file,
+              'error': None}
+    start = time.perf_counter()
+    try:
+        if plan:
+            result['output'] = editor.create_video(title, output_file=output_file, plan=plan)
+        else:
+            result['output'], _ = editor.create_preview(title, script, output_file)
+            result['plan'] = plan_path(result['output'])
+    except Exception as e:
+        logger.exception(f"Render of '{title}' failed")
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    result['wall_time'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def enqueue_jobs(brand_kit_name: str, jobs: list, output_dir: str = None) -> dict:
+    """
+    Queues the jobs for render workers instead of rendering them here.
+
+    Returns:
+        Summary with the id of every queued job
+    """
+    from database.job_queue import enqueue_job, ensure_job_queue
+    from database.models import BrandKit
+
+    try:
+        brand_kit = BrandKit.get(BrandKit.name == brand_kit_name)
+    except BrandKit.DoesNotExist:
+        raise ValueError(f'Brand kit: {brand_kit_name} does not exist')
+
+    ensure_job_queue()
+    queued = []
+    for index, job in enumerate(jobs):
+        output_file = job['output']
+        if not output_file and output_dir:
+            slug = re.sub(r'[^\w-]+', '_', job['title'])[:40].strip('_') or 'video'
+            output_file = os.path.join(os.path.abspath(output_dir), f'{index:04d}_{slug}.mp4')
+        render_job = enqueue_job(brand_kit.id, job['title'], job['script'], output_file)
+        queued.append({'index': index, 'job_id': render_job.id, 'title': job['title'], 'output': output_file})
+    return {'brand_kit': brand_kit_name, 'status': 'ok', 'total': len(queued), 'jobs': queued}
+
+
+def worker_job(max_jobs: int = None, drain: bool = False, lease_seconds: float = None,
+               coordinator_url: str = None) -> dict:
+    """
+    Renders queued jobs until stopped with Ctrl+C or SIGTERM, the job being rendered is finished first.
+    With coordinator_url the jobs are leased from a coordinator instead of the database of this machine.
+
+    Returns:
+        Summary with the numbers of done, failed and lost jobs
+    """
+    import signal
+
+    from core.worker import RenderWorker
+    from database.job_coordinator import RemoteJobQueue
+
+    worker = RenderWorker(lease_seconds=lease_seconds,
+                          queue=RemoteJobQueue(coordinator_url) if coordinator_url else None)
+    signal.signal(signal.SIGTERM, lambda signum, frame: worker.stop())
+    start = time.perf_counter()
+    try:
+        stats = worker.run(max_jobs, drain)
+    except KeyboardInterrupt:
+        stats = worker.stats
+    return {'worker': worker.name, 'status': 'ok' if not stats['failed'] else 'failed', **stats,
+            'wall_time': round(time.perf_counter() - start, 3)}
+
+
+def coordinator_job(host: str, port: int) -> dict:
+    """
+    Serves the job queue of this machine to workers on other machines until stopped with Ctrl+C or SIGTERM.
+
+    Returns:
+        Summary with the address the coordinator listened on
+    """
+    import signal
+
+    from database.job_coordinator import JobCoordinator
+    from database.job_queue import ensure_job_queue
+    from database.models import db
+
+    with db.connection_context():
+        ensure_job_queue()
+    coordinator = JobCoordinator(host, port)
+    if not coordinator.token:
+        logger.warning('JOB_COORDINATOR_TOKEN is not set, any client reaching the port can lease jobs')
+    # SIGTERM stops it like Ctrl+C
+    signal.signal(signal.SIGTERM, signal.default_int_handler)
+    logger.info(f"Job coordinator listening on {coordinator.url}")
+    start = time.perf_counter()
+    try:
+        coordinator.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        coordinator.server_close()
+    return {'status': 'ok', 'url': coordinator.url, 'wall_time': round(time.perf_counter() - start, 3)}
+
+
+def scan_job(paths: list = None, watch: bool = False, interval: float = None) -> dict:
+    """
+    Updates the asset index of the source clips, by default of every brand kit.
+    With watch the scan repeats every interval seconds until interrupted.
+
+    Returns:
+        Summary with the numbers of the last scan
+    """
+    from database.assets import AssetScanner
+
+    scanner = AssetScanner(interval)
+    result = {'status': 'ok', 'scans': 0, 'error': None}
+    start = time.perf_counter()
+    try:
+        while True:
+            result.update(scanner.scan(paths or None))
+            result['scans'] += 1
+            if not watch:
+                break
+            time.sleep(scanner.interval)
+    except KeyboardInterrupt:
+        pass
+    except Exception as e:
+        logger.exception('Scan of the source clips failed')
+        result['status'] = 'failed'
+        result['error'] = str(e)
+    if result.get('failed'):
+        result['status'] = 'failed'
+    result['wall_time'] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def read_script(args, parser) -> str:
+    """Script from --script or --script-file, None for the script of the brand kit"""
+    if not args.script_file:
+        return args.script
+    try:
+        with open(args.script_file, encoding='utf-8') as f:
+            return f.read().strip() or None
+    except OSError as e:
+        parser.error(str(e))
+
+
+def main(argv=None) -> int:
+    parser = argparse.ArgumentParser(prog='videomaker', description='VideoMaker Pro headless renderer')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    render_parser = subparsers.add_parser('render', help='Render videos for a list of titles and scripts')
+    render_parser.add_argument('brand_kit', help='Name of the brand kit')
+    render_parser.add_argument('input', help='CSV or JSONL file with title, script and optional output')
+    render_parser.add_argument('-j', '--jobs', type=int, default=int(os.getenv('RENDER_JOBS', 1)),
+                               help='Number of videos rendered at the same time (default: RENDER_JOBS or 1)')
+    render_parser.add_argument('-o', '--output-dir', help='Folder for videos without an explicit output path')
+    render_parser.add_argument('--aspect-ratios', nargs='+', choices=['16:9', '9:16'],
+                               help='Render every video in these aspect ratios at once instead of the brand kit one')
+    render_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    render_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    fanout_parser = subparsers.add_parser('fanout', help='Render one script for several brand kits')
+    fanout_parser.add_argument('brand_kits', nargs='+', help='Names of the brand kits')
+    fanout_parser.add_argument('--title', required=True, help='Title of the video')
+    script_group = fanout_parser.add_mutually_exclusive_group()
+    script_group.add_argument('--script', help='Script to voice over (default: the script of every brand kit)')
+    script_group.add_argument('--script-file', help='Read the script from this file')
+    fanout_parser.add_argument('-o', '--output-dir', help='Folder for the videos')
+    fanout_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    fanout_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    preview_parser = subparsers.add_parser('preview', help='Render a fast low resolution preview of one video')
+    preview_parser.add_argument('brand_kit', help='Name of the brand kit')
+    preview_parser.add_argument('--title', required=True, help='Title of the video')
+    script_group = preview_parser.add_mutually_exclusive_group()
+    script_group.add_argument('--script', help='Script to voice over (default: the brand kit script)')
+    script_group.add_argument('--script-file', help='Read the script from this file')
+    preview_parser.add_argument('-o', '--output', help='Path of the preview, its plan is saved next to it')
+    preview_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    preview_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    finalize_parser = subparsers.add_parser('finalize', help='Render the final video of a previewed plan')
+    finalize_parser.add_argument('plan', help='Plan file saved next to the preview')
+    finalize_parser.add_argument('-o', '--output', help='Path of the final video')
+    finalize_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    finalize_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    scan_parser = subparsers.add_parser('scan', help='Index the metadata of the source clips')
+    scan_parser.add_argument('paths', nargs='*', help='Clips to scan (default: the source videos of every brand kit)')
+    scan_parser.add_argument('--watch', action='store_true', help='Keep scanning until interrupted')
+    scan_parser.add_argument('--interval', type=float,
+                             help='Seconds between two scans with --watch (default: ASSET_SCAN_INTERVAL)')
+    scan_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    scan_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    enqueue_parser = subparsers.add_parser('enqueue', help='Queue videos for render workers')
+    enqueue_parser.add_argument('brand_kit', help='Name of the brand kit')
+    enqueue_parser.add_argument('input', help='CSV or JSONL file with title, script and optional output')
+    enqueue_parser.add_argument('-o', '--output-dir', help='Folder for videos without an explicit output path')
+    enqueue_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    enqueue_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    render_worker_parser = subparsers.add_parser(
+        'worker', help='Render queued videos, on other machines through a coordinator (not over NFS or SMB)')
+    render_worker_parser.add_argument('--coordinator', default=os.getenv('JOB_COORDINATOR_URL'),
+                                      help='URL of the coordinator on the machine holding the database, '
+                                           'the database of this machine when not set (default: JOB_COORDINATOR_URL)')
+    render_worker_parser.add_argument('--max-jobs', type=int, help='Stop after this many jobs')
+    render_worker_parser.add_argument('--drain', action='store_true',
+                                      help='Stop when the queue is empty instead of waiting for new jobs')
+    render_worker_parser.add_argument('--lease', type=float,
+                                      help='Seconds a job is leased for, renewed while rendering '
+                                           '(default: JOB_LEASE_SECONDS)')
+    render_worker_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    render_worker_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    coordinator_parser = subparsers.add_parser(
+        'coordinator', help='Serve the job queue of this machine to workers on other machines')
+    coordinator_parser.add_argument('--host', default='0.0.0.0', help='Address to listen on (default: all)')
+    coordinator_parser.add_argument('--port', type=int, default=8765, help='Port to listen on (default: 8765)')
+    coordinator_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    coordinator_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    worker_parser = subparsers.add_parser('segment-worker',
+                                          help='Encode video segments published to a shared folder by other nodes')
+    worker_parser.add_argument('shared_folder', nargs='?', default=os.getenv('SEGMENT_SHARED_FOLDER'),
+                               help='Shared folder of the segments (default: SEGMENT_SHARED_FOLDER)')
+    worker_parser.add_argument('--once', action='store_true', help='Exit when no segment is left')
+    worker_parser.add_argument('--summary', help='Write the JSON summary to this file instead of stdout')
+    worker_parser.add_argument('-v', '--verbose', action='store_true', help='Debug logging')
+
+    args = parser.parse_args(argv)
+    # Logs go to stderr, stdout is reserved for the summary
+    logging.basicConfig(level=logging.DEBUG if args.verbose else logging.INFO,
+                        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s', stream=sys.stderr)
+
+    if args.command == 'scan':
+        summary = scan_job(args.paths, args.watch, args.interval)
+        failed = summary['status'] != 'ok'
+    elif args.command == 'worker':
+        summary = worker_job(args.max_jobs, args.drain, args.lease, args.coordinator)
+        failed = summary['status'] != 'ok'
+    elif args.command == 'coordinator':
+        summary = coordinator_job(args.host, args.port)
+        failed = False
+    elif args.command == 'enqueue':
+        try:
+            summary = enqueue_jobs(args.brand_kit, read_jobs(args.input), args.output_dir)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+        failed = False
+    elif args.command == 'segment-worker':
+        if not args.shared_folder:
+            parser.error('the shared folder is required when SEGMENT_SHARED_FOLDER is not set')
+        from core.segmented_encode import run_segment_worker
+        summary = {'status': 'ok', 'encoded': run_segment_worker(args.shared_folder, once=args.once)}
+        failed = False
+    elif args.command in ('fanout', 'preview', 'finalize'):
+        try:
+            if args.command == 'fanout':
+                summary = fanout_job(args.brand_kits, args.title, read_script(args, parser), args.output_dir)
+            elif args.command == 'preview':
+                summary = preview_job(args.brand_kit, args.title, read_script(args, parser), args.output)
+            else:
+                summary = preview_job(None, None, output_file=args.output, plan_file=args.plan)
+        except ValueError as e:
+            parser.error(str(e))
+        failed = summary['status'] != 'ok'
+    else:
+        try:
+            jobs = read_jobs(args.input)
+        except (OSError, ValueError) as e:
+            parser.error(str(e))
+
+        try:
+            summary = render_jobs(args.brand_kit, jobs, args.jobs, args.output_dir, args.aspect_ratios)
+        except ValueError as e:
+            parser.error(str(e))
+        failed = summary['failed'] != 0
+
+    if args.summary:
+        with open(args.summary, 'w') as f:
+            json.dump(summary, f, indent=2)
+    else:
+        json.dump(summary, sys.stdout, indent=2)
+        sys.stdout.write('\n')
+    return 1 if failed else 0